@@ -0,0 +1,333 @@
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import platform
+import queue as queue_module
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from file_organizer import DEFAULT_FILE_TYPES, FileService, HASH_CHUNK_SIZES, available_hash_algorithms
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+EXTENSION_MIXES = {
+    "default": [ext for exts in DEFAULT_FILE_TYPES.values() for ext in exts] + [".dat", ".log", ""],
+    "media": ['.jpg', '.png', '.mp4', '.mov', '.mp3', '.flac'],
+    "documents": ['.pdf', '.docx', '.txt', '.xlsx', '.pptx'],
+    "bin": [".bin"],
+}
+
+
+def parse_size(text):
+    units = {"k": 1024, "m": 1024 ** 2, "g": 1024 ** 3}
+    text = str(text).strip().lower().rstrip("b")
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def random_bytes(rng, size):
+    # Random.randbytes is 3.9+; this is how it is defined, so seeded trees match across versions.
+    if hasattr(rng, "randbytes"):
+        return rng.randbytes(size)
+    return rng.getrandbits(size * 8).to_bytes(size, "little") if size else b""
+
+
+def sample_size(rng, distribution, mean_size):
+    if distribution == "fixed":
+        return mean_size
+    if distribution == "uniform":
+        return rng.randint(0, 2 * mean_size)
+    # Log-normal with sigma=1 gives the long tail typical of real file shares.
+    sigma = 1.0
+    return int(rng.lognormvariate(math.log(max(mean_size, 1)) - sigma ** 2 / 2, sigma))
+
+
+def generate_tree(root, file_count, file_size, duplicate_ratio, seed=0,
+                  size_distribution="fixed", extensions=(".bin",), subdirs=0):
+    rng = random.Random(seed)
+    os.makedirs(root, exist_ok=True)
+    folders = [root] + [os.path.join(root, f"dir_{i:04d}") for i in range(subdirs)]
+    for folder in folders[1:]:
+        os.makedirs(folder, exist_ok=True)
+    originals = []
+    total_bytes = 0
+    for i in range(file_count):
+        ext = rng.choice(extensions)
+        path = os.path.join(rng.choice(folders), f"file_{i:07d}{ext}")
+        if originals and rng.random() < duplicate_ratio:
+            source = rng.choice(originals)
+            shutil.copyfile(source, path)
+            total_bytes += os.path.getsize(source)
+        else:
+            size = sample_size(rng, size_distribution, file_size)
+            with open(path, "wb") as f:
+                f.write(random_bytes(rng, size))
+            originals.append(path)
+            total_bytes += size
+    return total_bytes
+
+
+def peak_rss_kb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux reports kilobytes.
+    return rss // 1024 if sys.platform == "darwin" else rss
+
+
+def _run_case(case, root, dest, config, queue):
+    service = FileService(DEFAULT_FILE_TYPES, hash_cache=None, max_workers=config["workers"])
+    service.max_depth = None
+    if config["memory_budget"]:
+        service.memory_budget = config["memory_budget"]
+    rules = DEFAULT_FILE_TYPES
+    start = time.perf_counter()
+    if case == "scan_name":
+        service.find_duplicates(root, "name")
+    elif case == "scan_content":
+        service.find_duplicates(root, "content")
+    elif case == "preview":
+        for _ in service.plan_moves(root, dest, rules):
+            pass
+    elif case == "organize":
+        service.organize_files(root, dest, rules)
+    queue.put((time.perf_counter() - start, peak_rss_kb()))
+
+
+CASE_POLL_INTERVAL = 1.0
+
+
+def run_case(case, root, dest, config):
+    # Each case runs in a fresh interpreter so peak RSS belongs to that case alone.
+    # Raises RuntimeError if the child dies (crash, OOM kill) or exceeds config["timeout"].
+    ctx = multiprocessing.get_context("spawn")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_run_case, args=(case, root, dest, config, queue))
+    process.start()
+    deadline = time.monotonic() + config["timeout"] if config.get("timeout") else None
+    try:
+        while True:
+            try:
+                return queue.get(timeout=CASE_POLL_INTERVAL)
+            except queue_module.Empty:
+                pass
+            if not process.is_alive():
+                # The result may have arrived just before the child exited.
+                try:
+                    return queue.get(timeout=CASE_POLL_INTERVAL)
+                except queue_module.Empty:
+                    raise RuntimeError(f"worker exited with code {process.exitcode}") from None
+            if deadline is not None and time.monotonic() > deadline:
+                process.terminate()
+                raise RuntimeError(f"timed out after {config['timeout']:g}s")
+    finally:
+        process.join()
+
+
+def run_suite(config, work_dir=None):
+    base = tempfile.mkdtemp(prefix="fo-bench-", dir=work_dir)
+    root = os.path.join(base, "source")
+    dest = os.path.join(base, "dest")
+    generate = lambda: generate_tree(
+        root, config["files"], config["mean_size"], config["duplicate_ratio"], config["seed"],
+        config["size_distribution"], EXTENSION_MIXES[config["extensions"]], config["subdirs"]
+    )
+    results = {}
+    try:
+        total_bytes = generate()
+        for case in config["cases"]:
+            if case == "organize" and os.path.exists(dest):
+                shutil.rmtree(root)
+                shutil.rmtree(dest)
+                generate()
+            try:
+                elapsed, rss = run_case(case, root, dest, config)
+            except RuntimeError as e:
+                results[case] = {"error": str(e)}
+                continue
+            results[case] = {
+                "seconds": round(elapsed, 4),
+                "files_per_sec": round(config["files"] / elapsed, 1) if elapsed else None,
+                "mb_per_sec": round(total_bytes / elapsed / (1024 * 1024), 1) if elapsed else None,
+                "peak_rss_kb": rss,
+            }
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+    return {
+        "config": config,
+        "host": {"platform": platform.platform(), "python": platform.python_version(),
+                 "cpus": os.cpu_count(), "work_dir": work_dir or tempfile.gettempdir()},
+        "total_bytes": total_bytes,
+        "results": results,
+    }
+
+
+def compare(report, baseline, tolerance):
+    regressions = []
+    for case, result in report["results"].items():
+        previous = baseline.get("results", {}).get(case)
+        if not previous:
+            continue
+        if "error" in result:
+            regressions.append(f"{case}: failed ({result['error']})")
+            continue
+        if previous.get("files_per_sec") and result["files_per_sec"] is not None \
+                and result["files_per_sec"] < previous["files_per_sec"] * (1 - tolerance):
+            regressions.append(f"{case}: {result['files_per_sec']} files/s vs baseline {previous['files_per_sec']}")
+        if previous.get("peak_rss_kb") and result["peak_rss_kb"] \
+                and result["peak_rss_kb"] > previous["peak_rss_kb"] * (1 + tolerance):
+            regressions.append(f"{case}: peak RSS {result['peak_rss_kb']} KB vs baseline {previous['peak_rss_kb']} KB")
+    return regressions
+
+
+def bench_hash_workers(root, max_workers):
+    results = []
+    worker_counts = sorted({1, max_workers} | {2 ** n for n in range(max_workers.bit_length()) if 2 ** n <= max_workers})
+    for workers in worker_counts:
+        service = FileService({}, hash_cache=None, max_workers=workers)
+        start = time.perf_counter()
+        service.find_duplicates(root, "content")
+        elapsed = time.perf_counter() - start
+        read = service.scan_stats["partial"]["bytes_read"] + service.scan_stats["full"]["bytes_read"]
+        results.append((workers, elapsed, read / elapsed / (1024 * 1024), service.scan_stats["files"] / elapsed))
+    return results
+
+
+def bench_hash_algorithms(path, chunk_size=None, repeat=3):
+    size = os.path.getsize(path)
+    results = []
+    for algorithm in available_hash_algorithms():
+        chunk = chunk_size or HASH_CHUNK_SIZES.get(algorithm)
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            FileService.calculate_file_hash(path, algorithm, chunk)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results.append((algorithm, chunk, best, size / best / (1024 ** 3)))
+    return results
+
+
+def run_suite_command(args):
+    config = {
+        "files": args.files,
+        "mean_size": parse_size(args.mean_size),
+        "size_distribution": args.size_distribution,
+        "duplicate_ratio": args.duplicate_ratio,
+        "extensions": args.extensions,
+        "subdirs": args.subdirs,
+        "workers": args.workers,
+        "memory_budget": parse_size(args.memory_budget) if args.memory_budget else None,
+        "seed": args.seed,
+        "cases": args.cases,
+        "timeout": args.timeout,
+    }
+    report = run_suite(config, args.dir)
+    print(f"{'case':>14} {'seconds':>10} {'files/s':>12} {'MB/s':>10} {'peak RSS':>12}")
+    failed = False
+    for case, result in report["results"].items():
+        if "error" in result:
+            print(f"{case:>14} FAILED: {result['error']}")
+            failed = True
+            continue
+        rss = f"{result['peak_rss_kb'] / 1024:.1f} MB" if result["peak_rss_kb"] else "n/a"
+        print(f"{case:>14} {result['seconds']:>10.3f} {result['files_per_sec']:>12.1f} "
+              f"{result['mb_per_sec']:>10.1f} {rss:>12}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"No regressions against {args.baseline} (tolerance {args.tolerance:.0%}).")
+    return 1 if failed else 0
+
+
+def run_workers(args):
+    root = tempfile.mkdtemp(prefix="fo-bench-", dir=args.dir)
+    try:
+        total_bytes = generate_tree(root, args.files, args.size, args.duplicate_ratio)
+        print(f"Generated {args.files} files ({total_bytes / (1024 * 1024):.1f} MB) in {root}")
+        print(f"{'workers':>8} {'seconds':>10} {'MB/s':>10} {'files/s':>10}")
+        for workers, elapsed, mb_per_sec, files_per_sec in bench_hash_workers(root, args.max_workers):
+            print(f"{workers:>8} {elapsed:>10.3f} {mb_per_sec:>10.1f} {files_per_sec:>10.1f}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return 0
+
+
+def run_hashes(args):
+    root = tempfile.mkdtemp(prefix="fo-bench-", dir=args.dir)
+    try:
+        path = os.path.join(root, "sample.bin")
+        with open(path, "wb") as f:
+            for _ in range(args.size_mb):
+                f.write(os.urandom(1024 * 1024))
+        # The first read warms the page cache so the numbers reflect hashing speed, not the disk.
+        FileService.calculate_file_hash(path, "md5")
+        print(f"Hashing a {args.size_mb} MB file (best of {args.repeat})")
+        print(f"{'algorithm':>10} {'chunk':>10} {'seconds':>10} {'GB/s':>8}")
+        for algorithm, chunk, elapsed, gb_per_sec in bench_hash_algorithms(path, args.chunk_size, args.repeat):
+            print(f"{algorithm:>10} {chunk:>10} {elapsed:>10.3f} {gb_per_sec:>8.2f}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark File Organizer Pro.")
+    parser.add_argument("--dir", help="Directory to generate benchmark data in, e.g. /dev/shm (default: a temp dir)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    suite = subparsers.add_parser("suite", help="Time scan, preview and organize on a synthetic tree")
+    suite.add_argument("--files", type=int, default=5000)
+    suite.add_argument("--mean-size", default="64K", help="Mean file size, e.g. 4096, 64K, 2M")
+    suite.add_argument("--size-distribution", choices=("fixed", "uniform", "lognormal"), default="lognormal")
+    suite.add_argument("--duplicate-ratio", type=float, default=0.2)
+    suite.add_argument("--extensions", choices=sorted(EXTENSION_MIXES), default="default")
+    suite.add_argument("--subdirs", type=int, default=20)
+    suite.add_argument("--workers", type=int, default=FileService.DEFAULT_MAX_WORKERS)
+    suite.add_argument("--memory-budget", help="Duplicate index budget before spilling to disk, e.g. 64M "
+                                                "(default: the service default)")
+    suite.add_argument("--seed", type=int, default=0)
+    suite.add_argument("--cases", nargs="+", default=["scan_name", "scan_content", "preview", "organize"],
+                       choices=["scan_name", "scan_content", "preview", "organize"])
+    suite.add_argument("--output", help="Write results as JSON (use as a baseline for later runs)")
+    suite.add_argument("--baseline", help="Compare against a previous JSON result; exit 1 on regression")
+    suite.add_argument("--timeout", type=float, help="Fail a case that runs longer than this many seconds")
+    suite.add_argument("--tolerance", type=float, default=0.15, help="Allowed slowdown/RSS growth (default 0.15)")
+    suite.set_defaults(func=run_suite_command)
+
+    workers = subparsers.add_parser("workers", help="Content-scan throughput from 1 to N hash workers")
+    workers.add_argument("--files", type=int, default=2000)
+    workers.add_argument("--size", type=int, default=512 * 1024, help="Size of each file in bytes")
+    workers.add_argument("--duplicate-ratio", type=float, default=0.3)
+    workers.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    workers.set_defaults(func=run_workers)
+
+    hashes = subparsers.add_parser("hashes", help="Single-file hashing speed per algorithm")
+    hashes.add_argument("--size-mb", type=int, default=256)
+    hashes.add_argument("--chunk-size", type=int, help="Override the per-algorithm read size")
+    hashes.add_argument("--repeat", type=int, default=3)
+    hashes.set_defaults(func=run_hashes)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
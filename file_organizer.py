@@ -1,700 +1,3818 @@
+import contextlib
+import json
 import os
 import sys
+import errno
+import fnmatch
 import hashlib
+import mmap
+import re
+import select
 import shutil
+import stat
+import struct
+import threading
 import time
-from PyQt5.QtWidgets import (
-    QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, 
-    QLineEdit, QPushButton, QTreeWidget, QTreeWidgetItem, QProgressBar,
-    QCheckBox, QRadioButton, QButtonGroup, QTabWidget, QFileDialog,
-    QMessageBox, QGroupBox, QScrollArea, QSizePolicy
-)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
-from PyQt5.QtGui import QFont, QIcon, QPalette, QColor
+from array import array
+from collections import deque
+from itertools import islice
+
+# argparse, sqlite3 and concurrent.futures are imported where they are used so
+# that importing FileService for headless/batch use stays cheap.
+
+DEFAULT_FILE_TYPES = {
+    "Images": ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp'],
+    "Documents": ['.pdf', '.doc', '.docx', '.txt', '.rtf', '.odt', '.xls', '.xlsx', '.ppt', '.pptx'],
+    "Audio": ['.mp3', '.wav', '.ogg', '.flac', '.aac'],
+    "Video": ['.mp4', '.avi', '.mkv', '.mov', '.wmv'],
+    "Archives": ['.zip', '.rar', '.7z', '.tar', '.gz'],
+    "Executables": ['.exe', '.msi', '.dmg', '.pkg', '.deb'],
+    "Code": ['.py', '.js', '.html', '.css', '.cpp', '.java', '.php', '.json', '.xml']
+}
+
+
+HASH_ALGORITHMS = {
+    "blake2b": lambda: hashlib.blake2b(digest_size=16),
+    "md5": hashlib.md5,
+    "sha1": hashlib.sha1,
+    "sha256": hashlib.sha256,
+}
+HASH_CHUNK_SIZES = {
+    "blake2b": 1024 * 1024,
+    "md5": 1024 * 1024,
+    "sha1": 1024 * 1024,
+    "sha256": 1024 * 1024,
+}
+DEFAULT_HASH_ALGORITHM = "blake2b"
+MMAP_THRESHOLD = 64 * 1024 * 1024
+
+
+def _register_optional_hashes():
+    try:
+        import xxhash
+    except ImportError:
+        pass
+    else:
+        HASH_ALGORITHMS["xxh3_128"] = xxhash.xxh3_128
+        HASH_ALGORITHMS["xxh64"] = xxhash.xxh64
+        HASH_CHUNK_SIZES.setdefault("xxh3_128", 4 * 1024 * 1024)
+        HASH_CHUNK_SIZES.setdefault("xxh64", 4 * 1024 * 1024)
+    try:
+        import blake3
+    except ImportError:
+        pass
+    else:
+        HASH_ALGORITHMS["blake3"] = blake3.blake3
+        HASH_CHUNK_SIZES.setdefault("blake3", 4 * 1024 * 1024)
+
+
+_optional_hashes_loaded = False
+
+
+def available_hash_algorithms():
+    global _optional_hashes_loaded
+    if not _optional_hashes_loaded:
+        _register_optional_hashes()
+        _optional_hashes_loaded = True
+    return list(HASH_ALGORITHMS)
+
+
+def new_hasher(algorithm):
+    if algorithm not in HASH_ALGORITHMS:
+        available_hash_algorithms()
+    try:
+        return HASH_ALGORITHMS[algorithm]()
+    except KeyError:
+        raise ValueError(f"unknown hash algorithm {algorithm!r}") from None
+
+
+# Perceptual ("perceptual" method) matching needs Pillow and NumPy; both are optional.
+PHASH_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tif', '.tiff', '.webp'}
+PHASH_KIND = "phash:dhash64"
+DEFAULT_PHASH_DISTANCE = 6
+# Beyond this, unrelated images start to match and the block index stops paying off.
+MAX_PHASH_DISTANCE = 10
+_POPCOUNT8 = None
+
+
+def perceptual_hash_available():
+    # find_spec avoids paying for the NumPy import just to grey out an option.
+    from importlib.util import find_spec
+    return find_spec("numpy") is not None and find_spec("PIL") is not None
+
+
+def _popcount64(values):
+    import numpy as np
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    global _POPCOUNT8
+    if _POPCOUNT8 is None:
+        _POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+    return _POPCOUNT8[values.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def _pairs_by_comparison(values, max_distance, max_candidates):
+    # Pair codes (left * n + right, left < right) for every pair within max_distance.
+    import numpy as np
+    n = len(values)
+    rows = max(1, max_candidates // max(n, 1))
+    found = []
+    for start in range(0, n - 1, rows):
+        left = values[start:start + rows]
+        close = _popcount64((left[:, None] ^ values[None, :]).reshape(-1)) <= max_distance
+        hits = np.flatnonzero(close)
+        i, j = hits // n + start, hits % n
+        keep = i < j
+        found.append(i[keep] * n + j[keep])
+    return found
+
+
+def _pairs_by_block_index(values, max_distance, radius, max_candidates):
+    import numpy as np
+    from itertools import combinations
+    n = len(values)
+    masks = [0] + [sum(1 << b for b in bits) for r in range(1, radius + 1) for bits in combinations(range(16), r)]
+
+    found = []
+    for block in range(4):
+        chunk = ((values >> np.uint64(16 * block)) & np.uint64(0xFFFF)).astype(np.intp)
+        order = np.argsort(chunk, kind="stable")
+        sorted_values = values[order]
+        bucket_size = np.bincount(chunk, minlength=1 << 16)
+        bucket_start = np.cumsum(bucket_size) - bucket_size
+        for mask in masks:
+            keys = chunk ^ mask
+            counts = bucket_size[keys]
+            lo = bucket_start[keys]
+            ends = np.cumsum(counts)
+            start = 0
+            while start < n:
+                base = ends[start - 1] if start else 0
+                stop = max(int(np.searchsorted(ends, base + max_candidates, "right")), start + 1)
+                total = int(ends[stop - 1] - base)
+                if total:
+                    cnt = counts[start:stop]
+                    first = np.cumsum(cnt) - cnt
+                    pos = np.repeat(lo[start:stop] - first, cnt) + np.arange(total)
+                    close = _popcount64(np.repeat(values[start:stop], cnt) ^ sorted_values[pos]) <= max_distance
+                    hits = np.flatnonzero(close)
+                    if len(hits):
+                        left = np.searchsorted(first, hits, "right") - 1 + start
+                        right = order[pos[hits]]
+                        keep = left < right
+                        found.append(left[keep] * n + right[keep])
+                start = stop
+    return found
+
+
+def group_near_duplicates(hashes, max_distance=DEFAULT_PHASH_DISTANCE, max_candidates=1 << 22):
+    """Group indices of 64-bit hashes that lie within max_distance bits of each other.
+
+    Multi-index hashing: the hashes are split into four 16-bit blocks. Two hashes
+    within max_distance bits agree on at least one block to within
+    max_distance // 4 bits. So each block is bucketed once and only those neighbour
+    buckets are probed. Candidate pairs are checked with a vectorized popcount in
+    slices of at most max_candidates, and groups are the connected components.
+    The probes grow combinatorially with the distance (radius 2 is 137 per block,
+    radius 8 about 39,000), so when they would outnumber the other hashes every
+    pair is compared directly instead.
+    """
+    import numpy as np
+    from math import factorial
+
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    # Identical hashes are grouped directly; the search runs on the distinct values only.
+    values, inverse = np.unique(hashes, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    n = len(values)
+    radius = min(max_distance // 4, 16)
+    # Each probe passes over all n hashes, as does comparing one hash against the rest.
+    probes = 4 * sum(factorial(16) // (factorial(r) * factorial(16 - r)) for r in range(radius + 1))
+    if probes >= n:
+        found = _pairs_by_comparison(values, max_distance, max_candidates)
+    else:
+        found = _pairs_by_block_index(values, max_distance, radius, max_candidates)
+
+    parent = list(range(n))
+
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    if found:
+        for pair in np.unique(np.concatenate(found)).tolist():
+            a, b = root(pair // n), root(pair % n)
+            if a != b:
+                parent[max(a, b)] = min(a, b)
+
+    groups = {}
+    for index, value_index in enumerate(inverse.tolist()):
+        groups.setdefault(root(value_index), []).append(index)
+    return [members for members in groups.values() if len(members) > 1]
+
+
+def default_cache_dir():
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA") or os.path.expanduser("~\\AppData\\Local")
+    elif sys.platform == "darwin":
+        base = os.path.expanduser("~/Library/Caches")
+    else:
+        base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(base, "file-organizer")
+
+
+def compile_globs(patterns):
+    patterns = [p for p in (patterns or []) if p]
+    if not patterns:
+        return None
+    return re.compile("|".join(fnmatch.translate(os.path.normcase(p)) for p in patterns)).match
+
+
+class DirLister:
+    """Lists one directory at a time with the walker's filters applied.
+
+    walk_files() drives it depth-first; the pipelined engine lists several
+    directories at once, so the followed-symlink cycle check is locked.
+    """
+
+    def __init__(self, root, max_depth=0, exclude=None, symlinks="files", skip_dirs=()):
+        self.root = root
+        self.max_depth = max_depth
+        self.symlinks = symlinks
+        self.exclude_match = compile_globs(exclude)
+        self.skip = set()
+        for path in skip_dirs:
+            try:
+                st = os.stat(path)
+                self.skip.add((st.st_dev, st.st_ino))
+            except OSError:
+                pass
+        self.visited = set()
+        self._lock = threading.Lock()
+        if symlinks == "follow":
+            st = os.stat(root)
+            self.visited.add((st.st_dev, st.st_ino))
+
+    def scan(self, rel_dir, depth, subdirs):
+        """Yield (relpath, DirEntry) for the files in rel_dir; append descendable subfolders to subdirs."""
+        root = self.root
+        exclude_match = self.exclude_match
+        symlinks = self.symlinks
+        try:
+            it = os.scandir(os.path.join(root, rel_dir) if rel_dir else root)
+        except OSError as e:
+            print(f"Error reading {rel_dir or root}: {e}")
+            return
+
+        with it:
+            for entry in it:
+                relpath = os.path.join(rel_dir, entry.name) if rel_dir else entry.name
+                if exclude_match and (exclude_match(os.path.normcase(entry.name))
+                                      or exclude_match(os.path.normcase(relpath))):
+                    continue
+                try:
+                    is_link = entry.is_symlink()
+                    if is_link and symlinks == "skip":
+                        continue
+                    if entry.is_file():
+                        yield relpath, entry
+                    elif entry.is_dir() and (self.max_depth is None or depth < self.max_depth):
+                        if is_link and symlinks != "follow":
+                            continue
+                        if self.skip or symlinks == "follow":
+                            st = entry.stat()
+                            key = (st.st_dev, st.st_ino)
+                            with self._lock:
+                                if key in self.skip or key in self.visited:
+                                    continue
+                                self.visited.add(key)
+                        subdirs.append(relpath)
+                except OSError:
+                    continue
+
+    def list_dir(self, rel_dir, depth):
+        subdirs = []
+        files = list(self.scan(rel_dir, depth, subdirs))
+        return files, subdirs
+
+
+# Lazily yields (relpath, DirEntry) for every file under root, reusing the
+# DirEntry type/stat data. max_depth: subfolder levels to descend (None = no
+# limit). symlinks: "skip", "files" (don't enter linked folders) or "follow".
+def walk_files(root, max_depth=0, exclude=None, symlinks="files", skip_dirs=()):
+    lister = DirLister(root, max_depth, exclude, symlinks, skip_dirs)
+    stack = [("", 0)]
+    while stack:
+        rel_dir, depth = stack.pop()
+        subdirs = []
+        yield from lister.scan(rel_dir, depth, subdirs)
+        stack.extend((d, depth + 1) for d in reversed(subdirs))
+
+
+_RULE_PREDICATE = re.compile(r"(size|age)(<=|>=|<|>|=)(\d+(?:\.\d+)?)([a-z]*)\Z", re.IGNORECASE)
+_SIZE_UNITS = {"": 1, "b": 1, "k": 1024, "kb": 1024, "m": 1024 ** 2, "mb": 1024 ** 2,
+               "g": 1024 ** 3, "gb": 1024 ** 3, "t": 1024 ** 4, "tb": 1024 ** 4}
+_COUNT_UNITS = {"": 1, "k": 1000}
+_AGE_UNITS = {"": 86400, "s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+_LEADING_FLAGS = re.compile(r"\(\?([aiLmsux]+)\)")
+
+
+def split_patterns(text):
+    """Split comma-separated rule patterns, keeping commas inside (), [] and {} (regex quantifiers)."""
+    patterns, depth, start = [], 0, 0
+    for i, char in enumerate(text):
+        if char in "([{":
+            depth += 1
+        elif char in ")]}":
+            depth = max(depth - 1, 0)
+        elif char == "," and depth == 0:
+            patterns.append(text[start:i].strip())
+            start = i + 1
+    patterns.append(text[start:].strip())
+    return [p for p in patterns if p]
+
+
+class RuleSet:
+    """Organize rules compiled into one matcher; compile once, then classify() each file.
+
+    Rules map a category to a list of patterns, and a file goes to the first
+    category (in rule order) with a matching pattern. A pattern is one or more
+    space-separated terms that must all hold:
+    - ".ext" or "ext": the extension, case-insensitive (the original rule form);
+    - a glob containing * ? or [: matched case-insensitively against the name;
+    - "re:REGEX": searched in the name; everything after "re:" is the regex;
+    - "size>10M", "size<=1G", "age>30d", "age<2h": interval checks on the stat
+      data (units B/K/M/G/T and s/m/h/d/w; a bare age is in days).
+    Plain extensions cost one dict lookup. Every other name pattern is a branch of
+    one regex alternation, whose first matching branch names the rule; branches
+    that end in a literal extension are only compiled into that extension's
+    alternation. Stat data is only requested when a rule with size or age terms
+    is reached.
+    """
+    __slots__ = ("categories", "rules", "extensions", "_by_ext", "_generic", "_full", "_sequential")
+
+    def __init__(self, active_rules):
+        self.categories = list(active_rules)
+        self.rules = []          # (category, name regex or None, (size_lo, size_hi, age_lo, age_hi) or None)
+        self.extensions = {}     # extension -> index of the first plain-extension rule
+        branches = []            # (required extension or None, branch source)
+        combinable = True
+        for category, patterns in active_rules.items():
+            for pattern in patterns:
+                index = len(self.rules)
+                body, ext, bounds, is_regex = self._parse(category, pattern)
+                if body is None:
+                    self.extensions.setdefault(ext, index)
+                    self.rules.append((category, None, None))
+                    continue
+                try:
+                    matcher = re.compile(body)
+                except re.error as e:
+                    raise ValueError(f"invalid pattern {pattern!r} in rule {category!r}: {e}") from None
+                # Numbered or named back-references would point at the wrong group once
+                # the branches are joined; such rule sets are matched rule by rule.
+                if is_regex and (matcher.groupindex or re.search(r"\\[1-9]", body)):
+                    combinable = False
+                self.rules.append((category, matcher, bounds))
+                branches.append((ext, f"(?P<r{index}>{body})"))
+        self._sequential = bool(branches) and not combinable
+        self._by_ext = {}
+        self._generic = self._full = None
+        if branches and combinable:
+            join = lambda selected: re.compile("|".join(selected)) if selected else None
+            self._full = join([branch for _, branch in branches])
+            self._generic = join([branch for ext, branch in branches if ext is None])
+            for ext in {ext for ext, _ in branches if ext is not None}:
+                self._by_ext[ext] = join([branch for e, branch in branches if e is None or e == ext])
+
+    @staticmethod
+    def _parse(category, pattern):
+        # Returns (regex body, or None for a plain extension; the extension a match
+        # requires, or None; bounds; whether the body came from a user regex).
+        rest = pattern.strip()
+        if not rest:
+            return None, "", None, False
+        body = None
+        is_regex = False
+        ext = None
+        bounds = [0, float("inf"), 0, float("inf")]
+        has_bounds = False
+        while rest:
+            if rest[:3].lower() == "re:":
+                regex = rest[3:]
+                try:
+                    re.compile(regex)
+                except re.error as e:
+                    raise ValueError(f"invalid regex {regex!r} in rule {category!r}: {e}") from None
+                flags = _LEADING_FLAGS.match(regex)
+                anchored = regex[flags.end() if flags else 0:].startswith("^")
+                if flags:
+                    regex = f"(?{flags.group(1)}:{regex[flags.end():]})"
+                body = f"(?:{regex})" if anchored else f"(?s:.*?)(?:{regex})"
+                is_regex, rest = True, ""
+                break
+            token, _, rest = rest.partition(" ")
+            rest = rest.lstrip()
+            predicate = _RULE_PREDICATE.match(token)
+            if predicate:
+                field, op, number, unit = predicate.groups()
+                units = _SIZE_UNITS if field.lower() == "size" else _AGE_UNITS
+                if unit.lower() not in units:
+                    raise ValueError(f"unknown unit {unit!r} in rule {category!r}: {pattern!r}")
+                value = int(float(number) * units[unit.lower()])
+                if field.lower() == "age":
+                    value *= 1_000_000_000
+                lo = 0 if field.lower() == "size" else 2
+                if op in (">", ">=", "="):
+                    bounds[lo] = max(bounds[lo], value + (op == ">"))
+                if op in ("<", "<=", "="):
+                    bounds[lo + 1] = min(bounds[lo + 1], value - (op == "<"))
+                has_bounds = True
+            elif body is not None or ext is not None:
+                raise ValueError(f"rule {category!r} has more than one name pattern in {pattern!r}")
+            elif any(char in token for char in "*?["):
+                body = f"(?i:{fnmatch.translate(token)})"
+                # A literal tail such as "*.tar.gz" means a match has that extension.
+                tail = re.split(r"[*?\]]", token)[-1]
+                if "." in tail:
+                    ext = tail[tail.rindex("."):].lower()
+            else:
+                ext = token.lower() if token.startswith(".") else "." + token.lower()
+        if body is None and ext is not None:
+            if not has_bounds:
+                return None, ext, None, False
+            body = f"(?s:.*)(?i:{re.escape(ext)})\\Z"
+        return body or "", ext, tuple(bounds) if has_bounds else None, is_regex
+
+    def classify(self, name, stat=None):
+        """Return the category for a file name, or None.
+
+        stat is a stat result or a callable returning one (e.g. DirEntry.stat,
+        which caches); it is only used when a rule with size or age terms is reached.
+        """
+        rules = self.rules
+        ext = os.path.splitext(name)[1].lower()
+        ext_rule = self.extensions.get(ext)
+        limit = len(rules) if ext_rule is None else ext_rule
+        # Names without an extension (including dotfiles) can match any branch.
+        combined = self._full if not ext else self._by_ext.get(ext, self._generic)
+        matched = -1
+        if combined is not None:
+            match = combined.match(name)
+            i = matched = int(match.lastgroup[1:]) if match else limit
+        else:
+            i = 0 if self._sequential else limit
+        st = None
+        while i < limit:
+            category, matcher, bounds = rules[i]
+            if matcher is not None and (i == matched or matcher.match(name)):
+                if bounds is None:
+                    return category
+                if st is None:
+                    st = (stat() if callable(stat) else stat) or False
+                if st:
+                    size_lo, size_hi, age_lo, age_hi = bounds
+                    if size_lo <= st.st_size <= size_hi and (
+                            (age_lo == 0 and age_hi == float("inf"))
+                            or age_lo <= time.time_ns() - st.st_mtime_ns <= age_hi):
+                        return category
+            i += 1
+        return None if ext_rule is None else rules[ext_rule][0]
+
+class HashCache:
+    # The bound is an entry count, not a byte size: at roughly 150 bytes per row
+    # the default keeps the database around 300 MB.
+    DEFAULT_MAX_ENTRIES = 2_000_000
+
+    def __init__(self, path=None, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path or os.path.join(default_cache_dir(), "hashes.sqlite3")
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._pending = []
+        self._touched = []
+        self._clock = int(time.time())
+        self._conn = None
+        import sqlite3
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS hashes ("
+                "dev INTEGER, ino INTEGER, size INTEGER, mtime_ns INTEGER, kind TEXT, "
+                "digest TEXT, last_used INTEGER, "
+                "PRIMARY KEY (dev, ino, size, mtime_ns, kind)) WITHOUT ROWID"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS hashes_last_used ON hashes (last_used)")
+            self._conn.commit()
+        except sqlite3.Error as e:
+            print(f"Hash cache disabled ({self.path}): {e}")
+            self._conn = None
+
+    @property
+    def enabled(self):
+        return self._conn is not None
+
+    @staticmethod
+    def _key(st, kind):
+        return (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns, kind)
+
+    def get(self, st, kind):
+        if self._conn is None:
+            return None
+        key = self._key(st, kind)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT digest FROM hashes WHERE dev=? AND ino=? AND size=? AND mtime_ns=? AND kind=?", key
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touched.append(key)
+        return row[0]
+
+    def put(self, st, kind, digest):
+        if self._conn is None or digest is None:
+            return
+        with self._lock:
+            self._pending.append(self._key(st, kind) + (digest, self._clock))
+            if len(self._pending) >= 10000:
+                self._write_pending()
+
+    def _write_pending(self):
+        if self._pending:
+            self._conn.executemany("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?, ?)", self._pending)
+            self._pending = []
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE hashes SET last_used=? WHERE dev=? AND ino=? AND size=? AND mtime_ns=? AND kind=?",
+                [(self._clock,) + key for key in self._touched]
+            )
+            self._touched = []
+
+    def flush(self):
+        if self._conn is None:
+            return
+        import sqlite3
+        with self._lock:
+            try:
+                self._write_pending()
+                count = self._conn.execute("SELECT COUNT(*) FROM hashes").fetchone()[0]
+                if count > self.max_entries:
+                    self._conn.execute(
+                        "DELETE FROM hashes WHERE (dev, ino, size, mtime_ns, kind) IN ("
+                        "SELECT dev, ino, size, mtime_ns, kind FROM hashes ORDER BY last_used LIMIT ?)",
+                        (count - self.max_entries,)
+                    )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"Failed to write hash cache: {e}")
+            self._clock = int(time.time())
+
+    def clear(self):
+        if self._conn is None:
+            return
+        with self._lock:
+            self._pending = []
+            self._touched = []
+            self._conn.execute("DELETE FROM hashes")
+            self._conn.commit()
+            self._conn.execute("VACUUM")
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        entries = 0
+        if self._conn is not None:
+            with self._lock:
+                entries = self._conn.execute("SELECT COUNT(*) FROM hashes").fetchone()[0] + len(self._pending)
+        return {
+            "path": self.path,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        if self._conn is not None:
+            self.flush()
+            self._conn.close()
+            self._conn = None
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def format_size(nbytes):
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if nbytes < 1024 or unit == "TB":
+            return f"{nbytes:.0f} {unit}" if unit == "B" else f"{nbytes:.1f} {unit}"
+        nbytes /= 1024
+
+
+class ProgressReporter:
+    DEFAULT_INTERVAL = 0.05
+    # Per-file loops read the clock once per batch of FILE_BATCH files (or MIN_BYTES
+    # bytes, so a few large files never hold the display back) rather than per file.
+    FILE_BATCH = 64
+    MIN_BYTES = 8 * 1024 * 1024
+
+    def __init__(self, callback, interval=DEFAULT_INTERVAL, min_items=1, min_bytes=MIN_BYTES):
+        self.callback = callback
+        self.interval = interval
+        self.min_items = min_items
+        self.min_bytes = min_bytes
+        self.start_phase("")
+
+    def start_phase(self, label, total=0, total_bytes=0):
+        self.label = label
+        self.total = total
+        self.total_bytes = total_bytes
+        self.done = 0
+        self.bytes_done = 0
+        self._started = self._last_emit = time.monotonic()
+        self._batch_items = self._batch_bytes = 0
+        self._emit(self._started)
+
+    def update(self, nbytes=0, count=1):
+        self.done += count
+        self.bytes_done += nbytes
+        if self.callback is None:
+            return
+        self._batch_items += count
+        self._batch_bytes += nbytes
+        if self._batch_items < self.min_items and self._batch_bytes < self.min_bytes:
+            return
+        self._batch_items = self._batch_bytes = 0
+        now = time.monotonic()
+        if now - self._last_emit >= self.interval:
+            self._emit(now)
+
+    def finish(self, message, done=None, total=None):
+        if self.callback is not None:
+            done = self.done if done is None else done
+            self.callback(message, done, done if total is None else total)
+
+    def rates(self, now=None):
+        elapsed = (now or time.monotonic()) - self._started
+        if elapsed <= 0:
+            return 0.0, 0.0, None
+        files_per_sec = self.done / elapsed
+        bytes_per_sec = self.bytes_done / elapsed
+        eta = None
+        if self.total_bytes and bytes_per_sec:
+            eta = max(0, self.total_bytes - self.bytes_done) / bytes_per_sec
+        elif self.total and files_per_sec:
+            eta = max(0, self.total - self.done) / files_per_sec
+        return files_per_sec, bytes_per_sec, eta
+
+    def _emit(self, now):
+        self._last_emit = now
+        if self.callback is None or not self.label:
+            return
+        count = f"{self.done}/{self.total}" if self.total else f"{self.done}"
+        parts = [f"{self.label} ({count})"]
+        files_per_sec, bytes_per_sec, eta = self.rates(now)
+        if bytes_per_sec:
+            parts.append(f"{bytes_per_sec / (1024 * 1024):.1f} MB/s")
+        if files_per_sec:
+            parts.append(f"{files_per_sec:.0f} files/s")
+        if eta is not None:
+            parts.append(f"ETA {format_duration(eta)}")
+        self.callback(" - ".join(parts), self.done, self.total)
+
+
+class RunMetrics:
+    """Per-run timings and counters, filled in by FileService as it works.
+
+    Phases accumulate wall-clock seconds (listing, stat, hashing, classification,
+    move, delete, link, throttled); counters are plain integers such as files_listed,
+    bytes_hashed, cache_hits or errors. snapshot() is safe to call from another
+    thread while a run is in progress.
+    """
+    PROMETHEUS_PREFIX = "file_organizer"
+    # HELP text for the Prometheus export; every counter only grows during a run.
+    COUNTER_HELP = {
+        "files_listed": "Files found by the directory walk.",
+        "files_stat": "Files whose metadata was read.",
+        "files_hashed": "Files whose content was hashed.",
+        "bytes_hashed": "Bytes read for hashing.",
+        "cache_hits": "Digests served from the hash cache.",
+        "cache_misses": "Digest lookups that missed the hash cache.",
+        "files_planned": "Files in the plan being applied.",
+        "files_moved": "Files moved or copied into the destination.",
+        "bytes_moved": "Bytes moved or copied into the destination.",
+        "files_deduplicated": "Files removed because an identical copy was already in the destination.",
+        "bytes_deduplicated": "Bytes not copied because an identical copy was already in the destination.",
+        "files_skipped": "Files left in place on a name collision.",
+        "files_stale": "Plan entries skipped because the file changed after planning.",
+        "files_deleted": "Duplicate files deleted.",
+        "files_linked": "Duplicate files replaced with hardlinks or reflinks.",
+        "bytes_saved": "Bytes reclaimed by replacing duplicates with links.",
+        "manifest_records": "Files written to a scan manifest.",
+        "index_spilled": "Duplicate indexes spilled to disk after exceeding the memory budget.",
+        "errors": "Files that could not be processed.",
+    }
+
+    def __init__(self, operation=""):
+        self.operation = operation
+        self.started = time.time()
+        self.duration = None
+        self.phases = {}
+        self.counters = {}
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add_time(self, phase, seconds):
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def timed(self, phase, iterable, counter=None):
+        # Charges only the time spent producing items, not the consumer's work.
+        clock = time.perf_counter
+        spent = 0.0
+        produced = 0
+        it = iter(iterable)
+        try:
+            while True:
+                start = clock()
+                try:
+                    item = next(it)
+                except StopIteration:
+                    spent += clock() - start
+                    return
+                spent += clock() - start
+                produced += 1
+                yield item
+        finally:
+            self.add_time(phase, spent)
+            if counter:
+                self.count(counter, produced)
+
+    def finish(self):
+        if self.duration is None:
+            self.duration = time.perf_counter() - self._t0
+
+    def snapshot(self):
+        with self._lock:
+            phases = dict(self.phases)
+            counters = dict(self.counters)
+        duration = self.duration if self.duration is not None else time.perf_counter() - self._t0
+        lookups = counters.get("cache_hits", 0) + counters.get("cache_misses", 0)
+        return {
+            "operation": self.operation,
+            "started": self.started,
+            "duration": duration,
+            "running": self.duration is None,
+            "phases": phases,
+            "counters": counters,
+            "cache_hit_rate": counters.get("cache_hits", 0) / lookups if lookups else None,
+        }
+
+    def summary(self):
+        snap = self.snapshot()
+        counters = snap["counters"]
+        parts = [f"{snap['operation'] or 'run'} {snap['duration']:.2f}s"]
+        phases = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in
+                           sorted(snap["phases"].items(), key=lambda item: -item[1]) if seconds >= 0.005)
+        if phases:
+            parts.append(phases)
+        nbytes = counters.get("bytes_hashed", 0) + counters.get("bytes_moved", 0)
+        parts.append(f"{counters.get('files_listed', 0)} files listed, {format_size(nbytes)} processed")
+        if snap["cache_hit_rate"] is not None:
+            parts.append(f"cache {snap['cache_hit_rate']:.0%} hits")
+        parts.append(f"{counters.get('errors', 0)} errors")
+        return " | ".join(parts)
+
+    def to_prometheus(self):
+        snap = self.snapshot()
+        prefix = self.PROMETHEUS_PREFIX
+        op = snap["operation"].replace("\\", "\\\\").replace('"', '\\"')
+        lines = [
+            f"# HELP {prefix}_run_duration_seconds Wall-clock duration of the last run.",
+            f"# TYPE {prefix}_run_duration_seconds gauge",
+            f'{prefix}_run_duration_seconds{{operation="{op}"}} {snap["duration"]:.6f}',
+            f"# HELP {prefix}_run_timestamp_seconds Start time of the last run.",
+            f"# TYPE {prefix}_run_timestamp_seconds gauge",
+            f'{prefix}_run_timestamp_seconds{{operation="{op}"}} {snap["started"]:.3f}',
+            f"# HELP {prefix}_phase_seconds_total Time spent in each phase of the last run.",
+            f"# TYPE {prefix}_phase_seconds_total counter",
+        ]
+        lines.extend(f'{prefix}_phase_seconds_total{{operation="{op}",phase="{name}"}} {seconds:.6f}'
+                     for name, seconds in sorted(snap["phases"].items()))
+        if snap["cache_hit_rate"] is not None:
+            lines += [
+                f"# HELP {prefix}_cache_hit_ratio Share of digest lookups served from the hash cache.",
+                f"# TYPE {prefix}_cache_hit_ratio gauge",
+                f'{prefix}_cache_hit_ratio{{operation="{op}"}} {snap["cache_hit_rate"]:.6f}',
+            ]
+        # Counters start from zero with each run, which Prometheus treats as a counter reset.
+        for name, value in sorted(snap["counters"].items()):
+            help_text = self.COUNTER_HELP.get(name, f"{name.replace('_', ' ').capitalize()} in the last run.")
+            lines.append(f"# HELP {prefix}_{name}_total {help_text}")
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f'{prefix}_{name}_total{{operation="{op}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Write a snapshot to path: Prometheus text format for *.prom, JSON otherwise.
+
+        The file is replaced atomically, as the node_exporter textfile collector expects.
+        """
+        if path.endswith(".prom"):
+            data = self.to_prometheus()
+        else:
+            data = json.dumps(self.snapshot(), indent=2) + "\n"
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+
+class OperationCancelled(Exception):
+    pass
+
+
+class RunJournal:
+    SYNC_EVERY = 256
+    SYNC_INTERVAL = 1.0
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    @classmethod
+    def for_run(cls, kind, *roots):
+        key = hashlib.sha1("\0".join(os.path.abspath(r) for r in roots).encode("utf-8", "surrogateescape")).hexdigest()
+        return cls(os.path.join(default_cache_dir(), "journals", f"{kind}-{key[:16]}.jsonl"))
+
+    def load(self):
+        records = []
+        try:
+            with open(self.path, encoding="utf-8", errors="surrogateescape") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        # A crash can leave the last line half written.
+                        break
+        except FileNotFoundError:
+            pass
+        return records
+
+    def record(self, **entry):
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8", errors="surrogateescape")
+            self._file.write(line)
+            self._unsynced += 1
+            if self._unsynced >= self.SYNC_EVERY or time.monotonic() - self._last_sync >= self.SYNC_INTERVAL:
+                self._sync()
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._sync()
+                self._file.close()
+                self._file = None
+
+    def complete(self):
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def parse_rate(text, units=None):
+    """Parse a limit such as "50M", "1.5g" or "200"; "0", "off" and "none" mean no limit."""
+    text = str(text).strip().lower()
+    if text in ("", "0", "off", "none"):
+        return None
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([a-z]*)(?:/s)?", text)
+    units = _SIZE_UNITS if units is None else units
+    if not match or match.group(2) not in units:
+        raise ValueError(f"invalid rate {text!r}")
+    rate = float(match.group(1)) * units[match.group(2)]
+    return rate or None
+
+
+def drop_page_cache(fd):
+    # Tells the kernel the pages just read (or written) will not be needed again,
+    # so a large scan does not push other services' data out of the page cache.
+    if hasattr(os, "posix_fadvise"):
+        with contextlib.suppress(OSError):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+
+
+# ioprio_set(2) has no libc wrapper; syscall numbers per architecture.
+_IOPRIO_SET_SYSCALLS = {"x86_64": 251, "amd64": 251, "i386": 289, "i686": 289, "aarch64": 30,
+                        "arm64": 30, "riscv64": 30, "armv7l": 314, "ppc64le": 273, "ppc64": 273, "s390x": 282}
+IOPRIO_CLASS_IDLE = 3
+IOPRIO_CLASS_SHIFT = 13
+IOPRIO_WHO_PROCESS = 1
+_lowered = threading.local()
+
+
+def lower_priority(nice=10):
+    """Lower the CPU (nice) and disk (idle ioprio class) priority of the calling thread.
+
+    On Linux both are per thread and inherited by threads started afterwards, so
+    this runs at the start of each operation, before its worker pools exist.
+    Returns what was applied, e.g. ["nice +10", "ioprio idle"]; repeated calls on
+    the same thread do nothing.
+    """
+    if getattr(_lowered, "done", False):
+        return []
+    _lowered.done = True
+    applied = []
+    if hasattr(os, "nice"):
+        try:
+            os.nice(nice)
+            applied.append(f"nice +{nice}")
+        except OSError:
+            pass
+    if sys.platform.startswith("linux"):
+        import ctypes
+        import platform
+        number = _IOPRIO_SET_SYSCALLS.get(platform.machine().lower())
+        if number is not None:
+            libc = ctypes.CDLL(None, use_errno=True)
+            if libc.syscall(number, IOPRIO_WHO_PROCESS, 0, IOPRIO_CLASS_IDLE << IOPRIO_CLASS_SHIFT) == 0:
+                applied.append("ioprio idle")
+    return applied
+
+
+class IOThrottle:
+    """Token buckets for bytes/s and operations/s shared by all readers and movers.
+
+    Every read chunk, copy chunk and rename asks acquire() first. A request is
+    granted whenever a bucket is not in debt and may take it below zero, so a
+    chunk larger than one second's budget still goes through and later callers
+    wait it off. Limits can be changed from any thread while a run is going on;
+    with a control file, changes written to it by another process (the
+    ``throttle`` command) are picked up within CONTROL_CHECK_INTERVAL seconds.
+    """
+    CHUNK_SIZE = 1024 * 1024
+    CONTROL_CHECK_INTERVAL = 1.0
+    MAX_WAIT = 0.25
+
+    def __init__(self, bytes_per_sec=None, ops_per_sec=None, drop_cache=False):
+        self._cond = threading.Condition()
+        self._rates = {"bytes": None, "ops": None}
+        self._tokens = {"bytes": 0.0, "ops": 0.0}
+        self._last = time.monotonic()
+        self._limited = False
+        self.drop_cache = drop_cache
+        self.waited = 0.0
+        self.cancel_event = None
+        self.control_path = None
+        self._control_mtime = None
+        self._control_settings = {}
+        self._next_check = 0.0
+        self.set_limits(bytes_per_sec, ops_per_sec)
+
+    @property
+    def limited(self):
+        return self._limited
+
+    def limits(self):
+        with self._cond:
+            return {"bytes_per_sec": self._rates["bytes"], "ops_per_sec": self._rates["ops"],
+                    "drop_cache": self.drop_cache}
+
+    def set_limits(self, bytes_per_sec=None, ops_per_sec=None):
+        """Replace both limits; None or 0 removes one. Waiting callers re-check at once."""
+        with self._cond:
+            self._refill(time.monotonic())
+            for bucket, rate in (("bytes", bytes_per_sec), ("ops", ops_per_sec)):
+                rate = float(rate) if rate else None
+                if rate != self._rates[bucket]:
+                    # Start a new limit with a full second of budget.
+                    self._tokens[bucket] = rate or 0.0
+                self._rates[bucket] = rate
+            self._limited = any(self._rates.values())
+            self._cond.notify_all()
+
+    def watch_control(self, path):
+        """Follow a JSON control file written by write_throttle_control().
+
+        Whatever the file holds now is only remembered, never applied: the run
+        keeps the limits it was started with until a setting in the file changes,
+        and then takes just the settings that changed.
+        """
+        self._control_mtime, self._control_settings = self._read_control(path)
+        self._next_check = time.monotonic() + self.CONTROL_CHECK_INTERVAL
+        self.control_path = path
+
+    @staticmethod
+    def _read_control(path):
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            with open(path, encoding="utf-8") as f:
+                settings = json.load(f)
+        except (OSError, ValueError):
+            return None, {}
+        return mtime, settings if isinstance(settings, dict) else {}
+
+    def _check_control(self, now):
+        with self._cond:
+            if now < self._next_check:
+                return
+            self._next_check = now + self.CONTROL_CHECK_INTERVAL
+        try:
+            if os.stat(self.control_path).st_mtime_ns == self._control_mtime:
+                return
+        except OSError:
+            return
+        mtime, settings = self._read_control(self.control_path)
+        if mtime is None:
+            return
+        self._control_mtime = mtime
+        changed = {key: value for key, value in settings.items() if self._control_settings.get(key, 0) != value}
+        self._control_settings = settings
+        if not changed:
+            return
+        limits = self.limits()
+        for key in ("bytes_per_sec", "ops_per_sec"):
+            if key in changed:
+                limits[key] = changed[key]
+        self.set_limits(limits["bytes_per_sec"], limits["ops_per_sec"])
+        if "drop_cache" in changed:
+            self.drop_cache = bool(changed["drop_cache"])
+
+    def _refill(self, now):
+        elapsed = now - self._last
+        self._last = now
+        for bucket, rate in self._rates.items():
+            if rate:
+                # Burst capacity is one second's worth.
+                self._tokens[bucket] = min(rate, self._tokens[bucket] + rate * elapsed)
+
+    def acquire(self, nbytes=0, ops=1):
+        """Block until nbytes and ops fit the limits; returns at once when cancelled."""
+        if self.control_path is not None and time.monotonic() >= self._next_check:
+            self._check_control(time.monotonic())
+        if not self._limited:
+            return
+        waited = 0.0
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                debt = [(-self._tokens[bucket] / rate) for bucket, rate in self._rates.items()
+                        if rate and self._tokens[bucket] < 0]
+                if not debt or (self.cancel_event is not None and self.cancel_event.is_set()):
+                    break
+                self._cond.wait(min(max(debt), self.MAX_WAIT))
+                waited += time.monotonic() - now
+            if self._rates["bytes"]:
+                self._tokens["bytes"] -= nbytes
+            if self._rates["ops"]:
+                self._tokens["ops"] -= ops
+            self.waited += waited
+
+
+def write_throttle_control(path, **settings):
+    """Merge settings (bytes_per_sec, ops_per_sec, drop_cache) into a control file and replace it atomically."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            current = json.load(f)
+    except (OSError, ValueError):
+        current = {}
+    current.update(settings)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(current, f)
+    os.replace(tmp, path)
+    return current
+
+
+def copy_file_fast(src, dst, throttle=None):
+    # Throttled copies go in CHUNK_SIZE steps so the token bucket sees every one.
+    limited = throttle is not None and throttle.limited
+    step = throttle.CHUNK_SIZE if limited else 1 << 30
+    if hasattr(os, "copy_file_range"):
+        try:
+            with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+                size = os.fstat(fsrc.fileno()).st_size
+                copied = 0
+                while copied < size:
+                    if limited:
+                        throttle.acquire(min(size - copied, step))
+                    n = os.copy_file_range(fsrc.fileno(), fdst.fileno(), min(size - copied, step))
+                    if n == 0:
+                        break
+                    copied += n
+                if throttle is not None and throttle.drop_cache:
+                    drop_page_cache(fsrc.fileno())
+                    drop_page_cache(fdst.fileno())
+            if copied == size:
+                shutil.copystat(src, dst)
+                return
+        except OSError as e:
+            if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF):
+                raise
+    if limited or (throttle is not None and throttle.drop_cache):
+        with open(src, "rb", buffering=0) as fsrc, open(dst, "wb") as fdst:
+            buf = bytearray(throttle.CHUNK_SIZE)
+            view = memoryview(buf)
+            while True:
+                if limited:
+                    throttle.acquire(len(buf))
+                n = fsrc.readinto(buf)
+                if not n:
+                    break
+                fdst.write(view[:n])
+            if throttle.drop_cache:
+                fdst.flush()
+                drop_page_cache(fsrc.fileno())
+                drop_page_cache(fdst.fileno())
+    else:
+        # shutil.copyfile uses sendfile on Linux and fcopyfile on macOS.
+        shutil.copyfile(src, dst)
+    shutil.copystat(src, dst)
+
+
+LINK_MODES = ("auto", "hardlink", "reflink")
+FICLONE = 0x40049409
+
+
+def reflink_file(src, dst):
+    """Create dst as a copy-on-write clone of src (Linux FICLONE: btrfs, XFS, bcachefs)."""
+    try:
+        import fcntl
+    except ImportError:
+        raise OSError(errno.EOPNOTSUPP, "reflinks are not supported on this platform", dst)
+    with open(src, "rb") as fsrc, open(dst, "xb") as fdst:
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+
+
+def replace_with_link(src, dst, mode="auto"):
+    # Build the link beside dst and rename it over dst, so the path never goes missing.
+    tmp = os.path.join(os.path.dirname(dst), f".{os.path.basename(dst)}.link-tmp")
+    try:
+        if mode != "hardlink":
+            try:
+                reflink_file(src, tmp)
+                shutil.copystat(dst, tmp)
+                os.replace(tmp, dst)
+                return "reflink"
+            except OSError as e:
+                if mode == "reflink" or e.errno not in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.ENOSYS):
+                    raise
+                if os.path.lexists(tmp):
+                    os.remove(tmp)
+        os.link(src, tmp)
+        os.replace(tmp, dst)
+        return "hardlink"
+    finally:
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+
+
+# What MoveEngine does when the destination name is taken. An identical file
+# (same size, then same cached digest) is never copied again under any policy but
+# "overwrite": the source is dropped, since the result equals a completed move.
+# rename: move to "name (1).ext"; skip: leave the source where it is;
+# newest: replace the destination only if the source is newer, else skip.
+COLLISION_POLICIES = ("rename", "skip", "newest", "overwrite")
+
+# How a cross-device copy is checked before the source is deleted: hash compares
+# full digests, sample the head/tail digests, size only the length.
+VERIFY_MODES = ("hash", "sample", "size")
+
+
+class MoveEngine:
+    DEFAULT_COPY_WORKERS = 4
+    TMP_SUFFIX = ".organizer-tmp"
+
+    def __init__(self, max_workers=DEFAULT_COPY_WORKERS, verify="hash", collisions="rename"):
+        if collisions not in COLLISION_POLICIES:
+            raise ValueError(f"unknown collision policy {collisions!r}")
+        if verify not in VERIFY_MODES:
+            raise ValueError(f"unknown verify mode {verify!r}")
+        self.max_workers = max_workers
+        self.verify = verify
+        self.collisions = collisions
+        self.same_device = False
+        self._pool = None
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._claimed = set()
+        self.journal = None
+        self.throttle = None
+        self.stats = {}
+        # same_content(src, src_st, dst, dst_st); FileService plugs in its cached digests.
+        self.same_content = lambda src, src_st, dst, dst_st: (
+            FileService.calculate_file_hash(src) == FileService.calculate_file_hash(dst))
+
+    def start(self, source_dir, dest_dir, journal=None):
+        self.journal = journal
+        try:
+            self.same_device = os.stat(source_dir).st_dev == os.stat(dest_dir).st_dev
+        except OSError:
+            self.same_device = False
+        self.stats = {"renamed": 0, "copied": 0, "failed": 0, "resumed": 0, "files": 0, "bytes": 0,
+                      "deduplicated": 0, "bytes_deduplicated": 0, "skipped": 0, "conflicts_renamed": 0,
+                      "replaced": 0, "seconds": 0.0, "files_per_sec": 0.0, "mb_per_sec": 0.0}
+        self._claimed = set()
+        self._started = time.perf_counter()
+
+    def move(self, src, dst, size, inline=False):
+        """Move src to dst under the collision policy.
+
+        Returns "renamed", "copied", "queued" (copy still running on the pool),
+        "deduplicated", "skipped" or "failed". inline copies on the calling thread;
+        the pipelined engine brings its own workers.
+        """
+        if self.collisions != "overwrite":
+            try:
+                outcome, dst = self._resolve(src, dst)
+            except OSError as e:
+                print(f"Error moving {src}: {e}")
+                self._record("failed", 0)
+                return "failed"
+            if outcome != "move":
+                return outcome
+        if self.same_device:
+            if self.throttle is not None:
+                self.throttle.acquire()
+            try:
+                os.rename(src, dst)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    self._release(dst)
+                    print(f"Error moving {src}: {e}")
+                    self._record("failed", 0)
+                    return "failed"
+            else:
+                self._release(dst)
+                self._record("renamed", size)
+                if self.journal is not None:
+                    self.journal.record(op="move", src=src, dst=dst)
+                return "renamed"
+
+        if inline or self.max_workers <= 1:
+            return self._copy_and_unlink(src, dst, size)
+        if self._pool is None:
+            from concurrent.futures import ThreadPoolExecutor
+            self._pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        while len(self._pending) >= self.max_workers * 4:
+            self._pending.popleft().result()
+        self._pending.append(self._pool.submit(self._copy_and_unlink, src, dst, size))
+        return "queued"
+
+    def _resolve(self, src, dst):
+        # Returns ("move", path) with path claimed until the move ends, or
+        # ("deduplicated" | "skipped", None). A name claimed by an in-flight move
+        # counts as taken with unknown content.
+        with self._lock:
+            taken = dst in self._claimed
+            if not taken and not os.path.lexists(dst):
+                self._claimed.add(dst)
+                return "move", dst
+        src_st = os.stat(src)
+        dst_st = None if taken else os.stat(dst)
+        regular = dst_st is not None and stat.S_ISREG(dst_st.st_mode)
+        if regular and src_st.st_size == dst_st.st_size and self.same_content(src, src_st, dst, dst_st):
+            os.remove(src)
+            with self._lock:
+                self.stats["deduplicated"] += 1
+                self.stats["bytes_deduplicated"] += src_st.st_size
+            if self.journal is not None:
+                self.journal.record(op="move", src=src, dst=dst)
+            return "deduplicated", None
+        policy = self.collisions
+        with self._lock:
+            if policy == "newest" and regular and src_st.st_mtime_ns > dst_st.st_mtime_ns \
+                    and dst not in self._claimed:
+                self._claimed.add(dst)
+                self.stats["replaced"] += 1
+                return "move", dst
+            if policy != "rename":
+                self.stats["skipped"] += 1
+                return "skipped", None
+            base, ext = os.path.splitext(dst)
+            n = 1
+            while True:
+                candidate = f"{base} ({n}){ext}"
+                if candidate not in self._claimed and not os.path.lexists(candidate):
+                    self._claimed.add(candidate)
+                    self.stats["conflicts_renamed"] += 1
+                    return "move", candidate
+                n += 1
+
+    def _release(self, dst):
+        with self._lock:
+            self._claimed.discard(dst)
+
+    def _copy_and_unlink(self, src, dst, size):
+        # Replacing an existing file copies to a temporary name first, so a failed
+        # copy never leaves the destination truncated. The journal names the path
+        # actually written, which is what recover() may delete.
+        target = dst + self.TMP_SUFFIX if os.path.lexists(dst) else dst
+        if self.journal is not None:
+            self.journal.record(op="copy", src=src, dst=target)
+        try:
+            if os.path.islink(src):
+                os.symlink(os.readlink(src), target)
+                os.replace(target, dst)
+                os.unlink(src)
+                self._record("copied", 0)
+                if self.journal is not None:
+                    self.journal.record(op="move", src=src, dst=dst)
+                return "copied"
+            copy_file_fast(src, target, self.throttle)
+            if not self._verify_copy(src, target, size):
+                os.remove(target)
+                raise OSError(f"verification failed for {dst}")
+            if target != dst:
+                os.replace(target, dst)
+            os.remove(src)
+            self._record("copied", size)
+            if self.journal is not None:
+                self.journal.record(op="move", src=src, dst=dst)
+            return "copied"
+        except Exception as e:
+            print(f"Error moving {src}: {e}")
+            if target != dst:
+                with contextlib.suppress(OSError):
+                    os.remove(target)
+            self._record("failed", 0)
+            return "failed"
+        finally:
+            self._release(dst)
+
+    def _verify_copy(self, src, dst, size):
+        if os.stat(dst).st_size != size:
+            return False
+        if self.verify == "hash":
+            digest = FileService.calculate_file_hash(src, throttle=self.throttle)
+            return digest is not None and digest == FileService.calculate_file_hash(dst, throttle=self.throttle)
+        if self.verify == "sample":
+            digest = FileService.calculate_partial_hash(src, size, throttle=self.throttle)
+            return digest is not None and digest == FileService.calculate_partial_hash(
+                dst, size, throttle=self.throttle)
+        return True
+
+    def _record(self, outcome, size):
+        with self._lock:
+            self.stats[outcome] += 1
+            if outcome != "failed":
+                self.stats["files"] += 1
+                self.stats["bytes"] += size
+
+    @staticmethod
+    def recover(records):
+        # A copy that was started but never recorded as a move left a partial
+        # destination behind while the source is still intact. A copy into a
+        # temporary name is always debris: either it never got renamed over the
+        # destination, or it did and the name is gone.
+        moved = set()
+        copies = []
+        for record in records:
+            if record.get("op") == "move":
+                moved.add(record["src"])
+            elif record.get("op") == "copy":
+                copies.append(record)
+        for record in copies:
+            if record["dst"].endswith(MoveEngine.TMP_SUFFIX):
+                stale = os.path.lexists(record["dst"])
+            else:
+                stale = record["src"] not in moved and os.path.lexists(record["src"]) \
+                    and os.path.lexists(record["dst"])
+            if stale:
+                try:
+                    os.remove(record["dst"])
+                except OSError as e:
+                    print(f"Failed to remove partial copy {record['dst']}: {e}")
+        return len(moved)
+
+    def finish(self):
+        while self._pending:
+            self._pending.popleft().result()
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        self.journal = None
+        elapsed = time.perf_counter() - self._started
+        self.stats["seconds"] = elapsed
+        if elapsed > 0:
+            self.stats["files_per_sec"] = self.stats["files"] / elapsed
+            self.stats["mb_per_sec"] = self.stats["bytes"] / elapsed / (1024 * 1024)
+        return self.stats
+
+
+_FS_ENCODING = sys.getfilesystemencoding()
+_FS_ERRORS = sys.getfilesystemencodeerrors()
+
+
+class FileRecord:
+    """One indexed file. Carries the stat fields HashCache keys on, so it stands in for a stat result."""
+    __slots__ = ("relpath", "st_size", "st_dev", "st_ino", "st_mtime_ns")
+
+    def __init__(self, relpath, st_size, st_dev, st_ino, st_mtime_ns):
+        self.relpath = relpath
+        self.st_size = st_size
+        self.st_dev = st_dev
+        self.st_ino = st_ino
+        self.st_mtime_ns = st_mtime_ns
+
+
+class DuplicateIndex:
+    """Groups files by size or by lower-cased name using flat columns.
+
+    Each file costs about 50 bytes plus its name:
+    - stat fields live in array columns (omitted for name scans, which never stat);
+    - directories are interned, and names are packed into one bytearray.
+    Once the estimate passes memory_budget, rows are moved to a temporary on-disk
+    SQLite database and grouped there. colliding() yields only keys shared by at
+    least two files, one group at a time. A size index needs st for every add().
+    """
+    __slots__ = ("by", "memory_budget", "sizes", "devs", "inos", "mtimes", "dir_ids", "name_ends",
+                 "names", "dirs", "_dir_ids", "_nbytes", "_db", "spilled", "count", "total_bytes")
+    ROW_BYTES = 8 * 5 + 4
+
+    def __init__(self, by="size", memory_budget=None):
+        if by not in ("size", "name"):
+            raise ValueError(f"cannot index by {by!r}")
+        self.by = by
+        self.memory_budget = memory_budget
+        self.spilled = 0
+        self.count = 0
+        self.total_bytes = 0
+        self._db = None
+        self._reset()
+
+    def _reset(self):
+        self.sizes = array("q")
+        self.devs = array("Q")
+        self.inos = array("Q")
+        self.mtimes = array("q")
+        self.dir_ids = array("L")
+        self.name_ends = array("Q")
+        self.names = bytearray()
+        self.dirs = []
+        self._dir_ids = {}
+        self._nbytes = 0
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def nbytes(self):
+        return self._nbytes
+
+    def add(self, relpath, st=None, name=None):
+        # Callers that already have the base name (DirEntry.name) pass it to skip a split.
+        if name is None:
+            directory, name = os.path.split(relpath)
+        else:
+            directory = relpath[:-len(name) - 1] if len(relpath) > len(name) else ""
+        dir_id = self._dir_ids.get(directory)
+        if dir_id is None:
+            dir_id = self._dir_ids[directory] = len(self.dirs)
+            self.dirs.append(directory)
+            self._nbytes += len(directory) + 120
+        encoded = self._encode(name)
+        if st is not None:
+            self.sizes.append(st.st_size)
+            self.devs.append(st.st_dev)
+            self.inos.append(st.st_ino)
+            self.mtimes.append(st.st_mtime_ns)
+            self.total_bytes += st.st_size
+        self.dir_ids.append(dir_id)
+        self.names += encoded
+        self.name_ends.append(len(self.names))
+        self._nbytes += self.ROW_BYTES + len(encoded)
+        self.count += 1
+        if self.memory_budget and self._nbytes > self.memory_budget:
+            self._spill()
+
+    def _name(self, i):
+        start = self.name_ends[i - 1] if i else 0
+        return self.names[start:self.name_ends[i]].decode(_FS_ENCODING, _FS_ERRORS)
+
+    def _relpath(self, i):
+        directory = self.dirs[self.dir_ids[i]]
+        return os.path.join(directory, self._name(i)) if directory else self._name(i)
+
+    def _record(self, i):
+        if not self.sizes:
+            return FileRecord(self._relpath(i), 0, 0, 0, 0)
+        return FileRecord(self._relpath(i), self.sizes[i], self.devs[i], self.inos[i], self.mtimes[i])
+
+    def _spill(self):
+        if self._db is None:
+            import sqlite3
+            # An empty name gives a private temporary database that lives on disk.
+            self._db = sqlite3.connect("")
+            self._db.execute("PRAGMA journal_mode=OFF")
+            self._db.execute("PRAGMA synchronous=OFF")
+            self._db.execute("CREATE TABLE files (key, size INTEGER, dev INTEGER, ino INTEGER, mtime_ns INTEGER, path TEXT)")
+        # Paths (and name keys) are stored as bytes: undecodable names carry lone
+        # surrogates, which SQLite's text columns reject.
+        records = (self._record(i) for i in range(len(self.dir_ids)))
+        rows = ((record.st_size if self.by == "size" else self._encode(os.path.basename(record.relpath).lower()),
+                 record.st_size, record.st_dev, record.st_ino, record.st_mtime_ns, self._encode(record.relpath))
+                for record in records)
+        self._db.executemany("INSERT INTO files VALUES (?, ?, ?, ?, ?, ?)", rows)
+        self.spilled += len(self.dir_ids)
+        self._reset()
+
+    @staticmethod
+    def _encode(text):
+        return text.encode(_FS_ENCODING, _FS_ERRORS)
+
+    def _decode_key(self, key):
+        return key if self.by == "size" else key.decode(_FS_ENCODING, _FS_ERRORS)
+
+    def colliding_counts(self):
+        """Return {key: count} for keys shared by two or more files."""
+        if self._db is not None:
+            if self.dir_ids:
+                self._spill()
+            rows = self._db.execute("SELECT key, COUNT(*) FROM files GROUP BY key HAVING COUNT(*) > 1")
+            return {self._decode_key(key): n for key, n in rows}
+        counts = {}
+        for key in self._keys():
+            counts[key] = counts.get(key, 0) + 1
+        return {key: n for key, n in counts.items() if n > 1}
+
+    def _keys(self):
+        return self.sizes if self.by == "size" else [self._name(i).lower() for i in range(len(self.dir_ids))]
+
+    def colliding(self):
+        """Yield (key, [FileRecord, ...]) for every key shared by two or more files."""
+        if self._db is not None:
+            if self.dir_ids:
+                self._spill()
+            yield from self._colliding_on_disk()
+            return
+        keys = self._keys()
+        counts = {}
+        for key in keys:
+            counts[key] = counts.get(key, 0) + 1
+        groups = {}
+        for i, key in enumerate(keys):
+            if counts[key] > 1:
+                groups.setdefault(key, []).append(i)
+        del counts, keys
+        for key, members in groups.items():
+            yield key, [self._record(i) for i in members]
+
+    def records(self):
+        """Yield every FileRecord in ascending size order (size indexes only)."""
+        if self._db is not None:
+            if self.dir_ids:
+                self._spill()
+            cursor = self._db.execute("SELECT size, dev, ino, mtime_ns, path FROM files ORDER BY size")
+            for size, dev, ino, mtime_ns, path in cursor:
+                yield FileRecord(path.decode(_FS_ENCODING, _FS_ERRORS), size, dev, ino, mtime_ns)
+            return
+        for i in sorted(range(len(self.dir_ids)), key=self.sizes.__getitem__):
+            yield self._record(i)
+
+    def _colliding_on_disk(self):
+        db = self._db
+        db.execute("CREATE INDEX IF NOT EXISTS files_key ON files (key)")
+        cursor = db.execute(
+            "SELECT key, size, dev, ino, mtime_ns, path FROM files "
+            "WHERE key IN (SELECT key FROM files GROUP BY key HAVING COUNT(*) > 1) ORDER BY key"
+        )
+        current, group = None, []
+        for key, size, dev, ino, mtime_ns, path in cursor:
+            if key != current and group:
+                yield self._decode_key(current), group
+                group = []
+            current = key
+            group.append(FileRecord(path.decode(_FS_ENCODING, _FS_ERRORS), size, dev, ino, mtime_ns))
+        if group:
+            yield self._decode_key(current), group
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+        self._reset()
+
+
+# Scan manifests: a fixed header, JSON metadata, then fixed-width big-endian
+# records (size, digest, mtime_ns, path offset, path length) sorted by
+# (size, digest), then the packed paths. Because the sort key is the leading
+# bytes of each record, a mapped manifest can be binary-searched and several
+# manifests can be merged by comparing raw bytes.
+MANIFEST_MAGIC = b"FOMANIF\0"
+MANIFEST_VERSION = 1
+MANIFEST_HEADER = struct.Struct(">8sHHIQQQ")
+
+
+def _manifest_record(digest_size):
+    return struct.Struct(f">Q{digest_size}sqQI")
+
+
+class ManifestWriter:
+    """Writes a scan manifest atomically. Entries must be added in (size, digest) order."""
+
+    def __init__(self, path, algorithm, root):
+        import socket
+        import tempfile
+        self.path = path
+        self.digest_size = new_hasher(algorithm).digest_size
+        self.record = _manifest_record(self.digest_size)
+        self.count = 0
+        meta = json.dumps({"host": socket.gethostname(), "root": os.path.abspath(root),
+                           "algorithm": algorithm, "created": time.time()}).encode()
+        meta += b"\0" * (-(MANIFEST_HEADER.size + len(meta)) % 8)
+        self._meta_len = len(meta)
+        self._last = b""
+        self._names_len = 0
+        self._tmp = f"{path}.tmp"
+        self._file = open(self._tmp, "wb")
+        self._file.write(b"\0" * MANIFEST_HEADER.size + meta)
+        self._names = tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(path)))
+
+    def add(self, size, digest, mtime_ns, relpath):
+        digest = bytes.fromhex(digest)
+        if len(digest) != self.digest_size:
+            raise ValueError(f"digest of {relpath!r} has {len(digest)} bytes, expected {self.digest_size}")
+        key = size.to_bytes(8, "big") + digest
+        if key < self._last:
+            raise ValueError("manifest entries must be added in (size, digest) order")
+        self._last = key
+        encoded = relpath.encode(_FS_ENCODING, _FS_ERRORS)
+        self._file.write(self.record.pack(size, digest, mtime_ns, self._names_len, len(encoded)))
+        self._names.write(encoded)
+        self._names_len += len(encoded)
+        self.count += 1
+
+    def commit(self):
+        records_offset = MANIFEST_HEADER.size + self._meta_len
+        names_offset = records_offset + self.count * self.record.size
+        self._names.seek(0)
+        shutil.copyfileobj(self._names, self._file, 1024 * 1024)
+        self._names.close()
+        self._file.seek(0)
+        self._file.write(MANIFEST_HEADER.pack(MANIFEST_MAGIC, MANIFEST_VERSION, self.digest_size,
+                                              self._meta_len, self.count, records_offset, names_offset))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._tmp, self.path)
+
+    def abort(self):
+        self._names.close()
+        self._file.close()
+        with contextlib.suppress(OSError):
+            os.remove(self._tmp)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+
+class ScanManifest:
+    """Read-only, memory-mapped view of a manifest written by FileService.write_manifest()."""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            header = f.read(MANIFEST_HEADER.size)
+            if len(header) < MANIFEST_HEADER.size or not header.startswith(MANIFEST_MAGIC):
+                raise ValueError(f"{path} is not a scan manifest")
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (_, version, digest_size, meta_len, self.count,
+         self._records, self._names) = MANIFEST_HEADER.unpack(header)
+        if version > MANIFEST_VERSION:
+            self.close()
+            raise ValueError(f"{path} has manifest version {version}, this build reads up to {MANIFEST_VERSION}")
+        meta = json.loads(self._mm[MANIFEST_HEADER.size:MANIFEST_HEADER.size + meta_len].rstrip(b"\0"))
+        self.host = meta.get("host", "")
+        self.root = meta.get("root", "")
+        self.algorithm = meta.get("algorithm", "")
+        self.created = meta.get("created")
+        self.record = _manifest_record(digest_size)
+        self.key_size = 8 + digest_size
+
+    def __len__(self):
+        return self.count
+
+    def key(self, i):
+        offset = self._records + i * self.record.size
+        return self._mm[offset:offset + self.key_size]
+
+    def entry(self, i):
+        """Return (size, hex digest, mtime_ns, relpath) for record i."""
+        size, digest, mtime_ns, name_offset, name_len = self.record.unpack_from(
+            self._mm, self._records + i * self.record.size)
+        start = self._names + name_offset
+        return size, digest.hex(), mtime_ns, self._mm[start:start + name_len].decode(_FS_ENCODING, _FS_ERRORS)
+
+    def __iter__(self):
+        return (self.entry(i) for i in range(self.count))
+
+    def lookup(self, size, digest):
+        """Return the relpaths of files with this size and hex digest (binary search)."""
+        key = size.to_bytes(8, "big") + bytes.fromhex(digest)
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        found = []
+        while lo < self.count and self.key(lo) == key:
+            found.append(self.entry(lo)[3])
+            lo += 1
+        return found
+
+    def close(self):
+        self._mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _manifest_keys(manifest, n):
+    return ((manifest.key(i), n, i) for i in range(len(manifest)))
+
+
+def merge_manifests(manifests, cross_only=False):
+    """Stream duplicate groups across several ScanManifests without rehashing.
+
+    Yields (size, digest, [(manifest index, relpath), ...]) in (size, digest)
+    order. With cross_only, groups confined to a single manifest are skipped.
+    """
+    import heapq
+    from itertools import groupby
+    algorithms = {m.algorithm for m in manifests}
+    if len(algorithms) > 1:
+        raise ValueError("manifests were hashed with different algorithms: " + ", ".join(sorted(algorithms)))
+    streams = [_manifest_keys(m, n) for n, m in enumerate(manifests)]
+    for key, members in groupby(heapq.merge(*streams), key=lambda item: item[0]):
+        members = list(members)
+        if len(members) < 2 or (cross_only and len({n for _, n, _ in members}) < 2):
+            continue
+        yield (int.from_bytes(key[:8], "big"), key[8:].hex(),
+               [(n, manifests[n].entry(i)[3]) for _, n, i in members])
+
+
+PLAN_FORMAT = "file-organizer-plan"
+PLAN_VERSION = 1
+
+
+class OrganizePlan:
+    """The moves an organize run would make, to be saved, reviewed and applied later.
+
+    Saved as JSON lines: a header with the source and destination roots and
+    totals, then one {"src", "dst", "size", "mtime_ns"} line per file with both
+    paths relative to their root. Lines are sorted by destination, so moves
+    into one directory sit together and two plans diff line by line. size and
+    mtime_ns let apply_plan() leave files that changed since planning alone.
+    """
+
+    def __init__(self, source, dest, moves=(), unmatched=0):
+        self.source = os.path.abspath(source)
+        self.dest = os.path.abspath(dest)
+        self.moves = list(moves)
+        self.unmatched = unmatched
+        self._sorted = False
+
+    def __len__(self):
+        return len(self.moves)
+
+    @property
+    def total_bytes(self):
+        return sum(move[2] for move in self.moves)
+
+    def add(self, src, dst, size, mtime_ns):
+        self.moves.append((src, dst, size, mtime_ns))
+        self._sorted = False
+
+    def sorted_moves(self):
+        if not self._sorted:
+            self.moves.sort(key=lambda move: (os.path.dirname(move[1]), move[1], move[0]))
+            self._sorted = True
+        return self.moves
+
+    def by_directory(self):
+        """Yields (destination directory relative to dest, [moves into it])."""
+        from itertools import groupby
+        for directory, moves in groupby(self.sorted_moves(), key=lambda move: os.path.dirname(move[1])):
+            yield directory, list(moves)
+
+    def save(self, path):
+        header = {"format": PLAN_FORMAT, "version": PLAN_VERSION, "source": self.source, "dest": self.dest,
+                  "files": len(self.moves), "bytes": self.total_bytes, "unmatched": self.unmatched}
+        tmp = f"{path}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8", errors="surrogateescape") as f:
+                f.write(json.dumps(header, ensure_ascii=False) + "\n")
+                for src, dst, size, mtime_ns in self.sorted_moves():
+                    f.write(json.dumps({"src": src, "dst": dst, "size": size, "mtime_ns": mtime_ns},
+                                       ensure_ascii=False) + "\n")
+            os.replace(tmp, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(tmp)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8", errors="surrogateescape") as f:
+            try:
+                header = json.loads(f.readline())
+            except ValueError:
+                header = {}
+            if not isinstance(header, dict) or header.get("format") != PLAN_FORMAT:
+                raise ValueError(f"{path} is not an organize plan")
+            if header.get("version") != PLAN_VERSION:
+                raise ValueError(f"{path}: unsupported plan version {header.get('version')}")
+            plan = cls(header["source"], header["dest"], unmatched=header.get("unmatched", 0))
+            for number, line in enumerate(f, 2):
+                if not line.strip():
+                    continue
+                try:
+                    move = json.loads(line)
+                    plan.add(move["src"], move["dst"], int(move["size"]), int(move["mtime_ns"]))
+                except (ValueError, KeyError, TypeError):
+                    raise ValueError(f"{path}:{number}: malformed plan entry") from None
+        for src, dst, size, mtime_ns in plan.moves:
+            # A hand-edited plan must not reach outside its roots.
+            if os.path.isabs(dst) or os.pardir in dst.split(os.sep) or os.path.isabs(src) \
+                    or os.pardir in src.split(os.sep):
+                raise ValueError(f"{path}: plan entry {src!r} -> {dst!r} leaves the source or destination")
+        return plan
+
+
+def shutdown_pool(pool, futures=()):
+    """Shut a ThreadPoolExecutor down without starting work still queued.
+
+    cancel_futures needs Python 3.9; before that the given futures are cancelled
+    one by one, which is all a caller holding its futures needs.
+    """
+    if sys.version_info >= (3, 9):
+        pool.shutdown(wait=True, cancel_futures=True)
+    else:
+        for future in futures:
+            future.cancel()
+        pool.shutdown(wait=True)
+
+
+class Pipeline:
+    """Runs a walk and a chain of stages as asyncio tasks joined by bounded queues.
+
+    Blocking calls (scandir, stat, reads, renames) run on a thread pool, and each
+    stage has its own number of workers, so listing, stat, hashing and moving
+    overlap instead of taking turns; that hides most of the per-call latency of
+    network mounts. Results are handled on the event-loop thread, so on_result
+    callbacks need no locking. A full queue makes its producers wait, which bounds
+    how far the walk can run ahead of the slowest stage. Items travel in small
+    batches so that one pool hand-off covers several files.
+    """
+    DEFAULT_LIMITS = {"walk": 4, "stat": 16, "hash": 4, "move": 4}
+    DEFAULT_QUEUE_SIZE = 64
+    DEFAULT_BATCH_SIZE = 32
+    _DONE = object()
+
+    def __init__(self, cancel_event, metrics, limits=None, queue_size=DEFAULT_QUEUE_SIZE,
+                 batch_size=DEFAULT_BATCH_SIZE):
+        self.cancel_event = cancel_event
+        self.metrics = metrics
+        self.limits = dict(self.DEFAULT_LIMITS, **(limits or {}))
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.stages = []
+
+    def add_stage(self, phase, func, on_result=None, limit=None):
+        """Add a stage running func(item) on the pool, timed under the metrics phase.
+
+        on_result(item, result) runs on the loop and returns the items for the next
+        stage; without it, a result other than None is passed on as is. With func
+        None the stage only runs on_result(item, item) on the loop.
+        """
+        workers = max(1, self.limits.get(limit or phase, 1))
+        self.stages.append((phase, func, on_result, workers))
+        return self
+
+    def run(self, lister):
+        """Walk lister's tree and push every (relpath, DirEntry) through the stages."""
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+        workers = max(1, self.limits["walk"]) + sum(stage[3] for stage in self.stages if stage[1] is not None)
+        pool = ThreadPoolExecutor(max_workers=workers)
+        try:
+            asyncio.run(self._run(lister, pool))
+        finally:
+            shutdown_pool(pool)
+
+    async def _run(self, lister, pool):
+        import asyncio
+        queues = [asyncio.Queue(self.queue_size) for _ in self.stages]
+        tasks = [asyncio.ensure_future(self._walk(lister, pool, queues[0] if queues else None))]
+        for n, stage in enumerate(self.stages):
+            downstream = (queues[n + 1], self.stages[n + 1][3]) if n + 1 < len(self.stages) else None
+            tasks.append(asyncio.ensure_future(self._stage(stage, pool, queues[n], downstream)))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise OperationCancelled()
+
+    @staticmethod
+    def _timed(func, items):
+        start = time.perf_counter()
+        results = [func(item) for item in items]
+        return results, time.perf_counter() - start
+
+    async def _put_batches(self, queue, items):
+        size = self.batch_size
+        for i in range(0, len(items), size):
+            await queue.put(items[i:i + size])
+
+    async def _walk(self, lister, pool, out):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        dirs = asyncio.Queue()
+        dirs.put_nowait(("", 0))
+        workers = max(1, self.limits["walk"])
+        pending = [1]
+
+        async def worker():
+            while True:
+                item = await dirs.get()
+                if item is self._DONE:
+                    return
+                self._check_cancelled()
+                rel_dir, depth = item
+                start = time.perf_counter()
+                files, subdirs = await loop.run_in_executor(pool, lister.list_dir, rel_dir, depth)
+                self.metrics.add_time("listing", time.perf_counter() - start)
+                self.metrics.count("files_listed", len(files))
+                for subdir in subdirs:
+                    dirs.put_nowait((subdir, depth + 1))
+                pending[0] += len(subdirs) - 1
+                if out is not None:
+                    await self._put_batches(out, files)
+                if not pending[0]:
+                    for _ in range(workers):
+                        dirs.put_nowait(self._DONE)
+
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        if out is not None:
+            for _ in range(self.stages[0][3]):
+                await out.put(self._DONE)
+
+    async def _stage(self, stage, pool, inbox, downstream):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        phase, func, on_result, workers = stage
+        metrics = self.metrics
+
+        async def worker():
+            while True:
+                batch = await inbox.get()
+                if batch is self._DONE:
+                    return
+                self._check_cancelled()
+                if func is None:
+                    results = batch
+                else:
+                    results, elapsed = await loop.run_in_executor(pool, self._timed, func, batch)
+                    metrics.add_time(phase, elapsed)
+                produced = []
+                for item, result in zip(batch, results):
+                    if on_result is not None:
+                        produced.extend(on_result(item, result))
+                    elif result is not None:
+                        produced.append(result)
+                if downstream is not None and produced:
+                    await self._put_batches(downstream[0], produced)
+
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        if downstream is not None:
+            for _ in range(downstream[1]):
+                await downstream[0].put(self._DONE)
+
 
 class FileService:
+    DEFAULT_MEMORY_BUDGET = 512 * 1024 * 1024
+    PARTIAL_HASH_SAMPLE = 64 * 1024
+    APPLY_BATCH = 256
+    DEFAULT_MAX_WORKERS = min(8, os.cpu_count() or 1)
     
-    def __init__(self, file_types):
+    def __init__(self, file_types, hash_cache=None, max_workers=DEFAULT_MAX_WORKERS):
         self.file_types = file_types
+        self.hash_cache = hash_cache
+        self.max_workers = max_workers
+        self.hash_algorithm = DEFAULT_HASH_ALGORITHM
+        self.hash_chunk_size = None
+        self.max_depth = 0
+        self.exclude_patterns = []
+        self.symlink_policy = "files"
+        self.move_engine = MoveEngine()
+        self.move_engine.same_content = self.same_content
+        self.use_journal = True
+        self.cancel_event = threading.Event()
+        self.throttle = IOThrottle()
+        self.throttle.cancel_event = self.cancel_event
+        self.move_engine.throttle = self.throttle
+        self.low_priority = False
+        self._journal = None
+        self._journal_hashes = {}
+        self.scan_stats = self._new_scan_stats()
+        self.duplicate_sizes = {}
+        self.hardlink_aliases = {}
+        self.phash_distance = DEFAULT_PHASH_DISTANCE
+        self.memory_budget = self.DEFAULT_MEMORY_BUDGET
+        self.pipelined = False
+        self.pipeline_limits = {}
+        self.metrics = RunMetrics()
+        self.metrics_path = None
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise OperationCancelled()
+
+    def _open_journal(self, kind, *roots):
+        if not self.use_journal:
+            return None, []
+        journal = RunJournal.for_run(kind, *roots)
+        return journal, journal.load()
+
+    def _close_journal(self, journal, completed):
+        if journal is None:
+            return
+        if completed:
+            journal.complete()
+        else:
+            journal.close()
+
+    @contextlib.contextmanager
+    def run_metrics(self, operation):
+        """Start a fresh RunMetrics for one operation; exported to metrics_path when it ends.
+
+        Also applies low_priority to the calling thread, before the operation
+        starts any workers, and books the time spent waiting on the I/O throttle.
+        """
+        self.metrics = RunMetrics(operation)
+        if self.low_priority:
+            lower_priority()
+        waited = self.throttle.waited
+        try:
+            yield self.metrics
+        finally:
+            if self.throttle.waited > waited:
+                self.metrics.add_time("throttled", self.throttle.waited - waited)
+            self.metrics.finish()
+            self.export_metrics()
+
+    def export_metrics(self, metrics=None):
+        if not self.metrics_path:
+            return
+        try:
+            (metrics or self.metrics).write(self.metrics_path)
+        except OSError as e:
+            print(f"Could not write metrics to {self.metrics_path}: {e}")
+
+    def new_pipeline(self):
+        # Hash workers follow max_workers unless pipeline_limits says otherwise.
+        limits = dict(Pipeline.DEFAULT_LIMITS, hash=self.max_workers)
+        limits.update(self.pipeline_limits)
+        return Pipeline(self.cancel_event, self.metrics, limits)
+
+    def dir_lister(self, source_dir, skip_dirs=()):
+        return DirLister(source_dir, self.max_depth, self.exclude_patterns, self.symlink_policy, skip_dirs)
+
+    def iter_files(self, source_dir, skip_dirs=()):
+        return self.metrics.timed(
+            "listing",
+            walk_files(source_dir, self.max_depth, self.exclude_patterns, self.symlink_policy, skip_dirs),
+            counter="files_listed"
+        )
+
+    @staticmethod
+    def calculate_file_hash(filepath, algorithm=DEFAULT_HASH_ALGORITHM, chunk_size=None, throttle=None):
+        hasher = new_hasher(algorithm)
+        chunk_size = chunk_size or HASH_CHUNK_SIZES.get(algorithm, 1024 * 1024)
+        acquire = throttle.acquire if throttle is not None else None
+        try:
+            with open(filepath, "rb", buffering=0) as f:
+                size = os.fstat(f.fileno()).st_size
+                if size >= MMAP_THRESHOLD:
+                    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+                        # The mapping, not the earlier fstat, bounds the reads.
+                        size = len(mm)
+                        for offset in range(0, size, chunk_size):
+                            end = min(offset + chunk_size, size)
+                            if acquire:
+                                acquire(end - offset)
+                            # Touching mapped pages past a truncated end raises SIGBUS; a file
+                            # that shrank while being hashed has no stable digest anyway.
+                            if os.fstat(f.fileno()).st_size < end:
+                                return None
+                            hasher.update(view[offset:end])
+                else:
+                    buf = bytearray(min(chunk_size, max(size, 1)))
+                    view = memoryview(buf)
+                    while True:
+                        if acquire:
+                            acquire(len(buf))
+                        n = f.readinto(buf)
+                        if not n:
+                            break
+                        hasher.update(view[:n])
+                if throttle is not None and throttle.drop_cache:
+                    drop_page_cache(f.fileno())
+            return hasher.hexdigest()
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def calculate_partial_hash(filepath, size, sample_size=None, algorithm=DEFAULT_HASH_ALGORITHM, throttle=None):
+        sample_size = sample_size or FileService.PARTIAL_HASH_SAMPLE
+        hasher = new_hasher(algorithm)
+        try:
+            with open(filepath, "rb", buffering=0) as f:
+                buf = bytearray(sample_size)
+                view = memoryview(buf)
+                if throttle is not None:
+                    throttle.acquire(min(size, 2 * sample_size), 2 if size > sample_size else 1)
+                n = f.readinto(buf)
+                hasher.update(view[:n])
+                if size > sample_size:
+                    f.seek(max(sample_size, size - sample_size))
+                    n = f.readinto(buf)
+                    hasher.update(view[:n])
+                if throttle is not None and throttle.drop_cache:
+                    drop_page_cache(f.fileno())
+            return hasher.hexdigest()
+        except OSError:
+            return None
+
+    @staticmethod
+    def calculate_perceptual_hash(filepath, hash_size=8):
+        """64-bit difference hash (dHash) of an image as 16 hex digits, or None if unreadable."""
+        import numpy as np
+        from PIL import Image
+        resample = getattr(Image, "Resampling", Image).BILINEAR
+        try:
+            with Image.open(filepath) as img:
+                # Lets the JPEG decoder downscale while decoding instead of producing full size.
+                img.draft("L", (hash_size * 8, hash_size * 8))
+                pixels = np.asarray(img.convert("L").resize((hash_size + 1, hash_size), resample), dtype=np.int16)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            return None
+        bits = pixels[:, 1:] > pixels[:, :-1]
+        return np.packbits(bits).tobytes().hex()
+
+    def _cached_hash(self, filepath, st, kind):
+        cache = self.hash_cache
+        cache_kind = PHASH_KIND if kind == "phash" else f"{kind}:{self.hash_algorithm}"
+        journal_key = (filepath, cache_kind, st.st_size, st.st_mtime_ns)
+        digest = self._journal_hashes.get(journal_key)
+        if digest is not None:
+            return digest, True
+        if cache is not None:
+            digest = cache.get(st, cache_kind)
+            if digest is not None:
+                return digest, True
+
+        throttle = self.throttle
+        if kind == "full":
+            digest = self.calculate_file_hash(filepath, self.hash_algorithm, self.hash_chunk_size, throttle)
+        elif kind == "phash":
+            # The image decoder does its own reads; charge the whole file up front.
+            throttle.acquire(st.st_size)
+            digest = self.calculate_perceptual_hash(filepath)
+        else:
+            digest = self.calculate_partial_hash(filepath, st.st_size, self.PARTIAL_HASH_SAMPLE,
+                                                 self.hash_algorithm, throttle)
+        if cache is not None:
+            cache.put(st, cache_kind, digest)
+        if self._journal is not None and digest is not None:
+            self._journal.record(op="hash", path=filepath, kind=cache_kind, size=st.st_size,
+                                 mtime_ns=st.st_mtime_ns, digest=digest)
+        return digest, False
+
+    def same_content(self, src, src_st, dst, dst_st):
+        """Whether two files hold the same bytes: size, shared inode, then cached digests.
+
+        Large files compare their head/tail samples first, so most differing pairs
+        are told apart without a full read.
+        """
+        if src_st.st_size != dst_st.st_size:
+            return False
+        if (src_st.st_dev, src_st.st_ino) == (dst_st.st_dev, dst_st.st_ino):
+            return True
+        kinds = ("partial", "full") if src_st.st_size > 2 * self.PARTIAL_HASH_SAMPLE else ("full",)
+        for kind in kinds:
+            digest = self._cached_hash(src, src_st, kind)[0]
+            if digest is None or digest != self._cached_hash(dst, dst_st, kind)[0]:
+                return False
+        return True
+
+    def _hash_stage(self, source_dir, items, kind_for, progress):
+        def work(item):
+            st, filename = item
+            return self._cached_hash(os.path.join(source_dir, filename), st, kind_for(st))
+
+        if self.max_workers > 1:
+            # Keep a bounded window of reads in flight and yield results in submission order.
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                items_iter = iter(items)
+                # islice, not zip with a range: zip would pull and drop one extra item.
+                pending = deque(
+                    (item, pool.submit(work, item))
+                    for item in islice(items_iter, self.max_workers * 4)
+                )
+                while pending:
+                    if self.cancel_event.is_set():
+                        shutdown_pool(pool, [future for _, future in pending])
+                        raise OperationCancelled()
+                    item, future = pending.popleft()
+                    next_item = next(items_iter, None)
+                    if next_item is not None:
+                        pending.append((next_item, pool.submit(work, next_item)))
+                    yield self._count_hash(item, future.result(), kind_for, progress)
+        else:
+            for item in items:
+                self.check_cancelled()
+                yield self._count_hash(item, work(item), kind_for, progress)
+
+    def _count_hash(self, item, result, kind_for, progress, count=1):
+        digest, cached = result
+        metrics = self.metrics
+        if self.hash_cache is not None:
+            self.scan_stats["cache_hits" if cached else "cache_misses"] += 1
+            metrics.count("cache_hits" if cached else "cache_misses")
+        nbytes = 0 if cached else self._hash_read_size(item[0], kind_for(item[0]))
+        if digest is None:
+            metrics.count("errors")
+        elif not cached:
+            metrics.count("files_hashed")
+            metrics.count("bytes_hashed", nbytes)
+        progress.update(nbytes, count)
+        return item, digest, cached
+
+    def _hash_read_size(self, st, kind):
+        return st.st_size if kind in ("full", "phash") else min(st.st_size, 2 * self.PARTIAL_HASH_SAMPLE)
+
+    @staticmethod
+    def _new_scan_stats():
+        return {
+            "files": 0,
+            "total_bytes": 0,
+            "duplicate_files": 0,
+            "hardlinks": 0,
+            "index_spilled": 0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "size": {"files_in": 0, "files_out": 0, "bytes_read": 0, "bytes_avoided": 0},
+            "partial": {"files_in": 0, "files_out": 0, "bytes_read": 0, "bytes_avoided": 0},
+            "full": {"files_in": 0, "files_out": 0, "bytes_read": 0, "bytes_avoided": 0},
+        }
+
+    @contextlib.contextmanager
+    def _resumable_hashing(self, kind, source_dir):
+        # Digests computed under this context are journaled, and a journal left by a
+        # cancelled run of the same kind over the same folder is replayed.
+        journal, records = self._open_journal(kind, source_dir)
+        self._journal = journal
+        self._journal_hashes = {
+            (r["path"], r["kind"], r["size"], r["mtime_ns"]): r["digest"]
+            for r in records if r.get("op") == "hash"
+        }
+        completed = False
+        try:
+            yield
+            completed = True
+        finally:
+            self._journal = None
+            self._journal_hashes = {}
+            self._close_journal(journal, completed)
+            if self.hash_cache is not None:
+                self.hash_cache.flush()
+
+    def find_duplicates(self, source_dir, method, progress_callback=None):
+        with self.run_metrics("scan"):
+            return self._find_duplicates(source_dir, method, progress_callback)
+
+    def _find_duplicates(self, source_dir, method, progress_callback):
+        self.scan_stats = self._new_scan_stats()
+        self.duplicate_sizes = {}
+        self.hardlink_aliases = {}
+        progress = ProgressReporter(progress_callback, min_items=ProgressReporter.FILE_BATCH)
+        if method == 'perceptual' and not perceptual_hash_available():
+            raise ValueError("the perceptual method needs Pillow and NumPy (pip install pillow numpy)")
+
+        if method in ('content', 'perceptual'):
+            if method == 'perceptual':
+                find = self._find_similar_images
+            else:
+                find = self._find_content_duplicates_pipelined if self.pipelined else self._find_content_duplicates
+            with self._resumable_hashing("scan", source_dir):
+                return find(source_dir, progress)
+
+        index = DuplicateIndex("name", self.memory_budget)
+        progress.start_phase("Scanning...")
+        try:
+            if self.pipelined:
+                def add(item, _):
+                    index.add(item[0], name=item[1].name)
+                    progress.update()
+                    return ()
+                self.new_pipeline().add_stage("index", None, add).run(self.dir_lister(source_dir))
+            else:
+                for relpath, entry in self.iter_files(source_dir):
+                    self.check_cancelled()
+                    index.add(relpath, name=entry.name)
+                    progress.update()
+            duplicates = {key: [record.relpath for record in group] for key, group in index.colliding()}
+            self.scan_stats["index_spilled"] = index.spilled
+        finally:
+            index.close()
+        progress.finish("Scan complete!")
+
+        return duplicates
+
+    def _find_similar_images(self, source_dir, progress):
+        # Groups are keyed by the first member's dHash; sizes differ, so duplicate_sizes stays empty.
+        import numpy as np
+        stats = self.scan_stats
+        metrics = self.metrics
+        candidates = []
+        inodes = set()
+        progress.start_phase("Finding images...")
+        for relpath, entry in self.iter_files(source_dir):
+            self.check_cancelled()
+            progress.update()
+            if os.path.splitext(entry.name)[1].lower() not in PHASH_EXTENSIONS:
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                metrics.count("errors")
+                continue
+            if (st.st_dev, st.st_ino) in inodes:
+                stats["hardlinks"] += 1
+                continue
+            inodes.add((st.st_dev, st.st_ino))
+            candidates.append((st, relpath))
+            stats["files"] += 1
+            stats["total_bytes"] += st.st_size
+
+        stage = stats["full"]
+        stage["files_in"] = len(candidates)
+        hashed = []
+        progress.start_phase("Hashing images...", len(candidates), sum(st.st_size for st, _ in candidates))
+        for (st, relpath), digest, cached in metrics.timed(
+                "hashing", self._hash_stage(source_dir, candidates, lambda st: "phash", progress)):
+            if digest is None:
+                continue
+            if cached:
+                stage["bytes_avoided"] += st.st_size
+            else:
+                stage["bytes_read"] += st.st_size
+            hashed.append((int(digest, 16), relpath))
+
+        progress.start_phase("Matching...")
+        self.check_cancelled()
+        with metrics.phase("matching"):
+            values = np.array([value for value, _ in hashed], dtype=np.uint64)
+            groups = group_near_duplicates(values, self.phash_distance) if len(hashed) > 1 else []
+
+        duplicates = {}
+        for members in groups:
+            members.sort(key=lambda i: hashed[i][1])
+            duplicates[f"{hashed[members[0]][0]:016x}"] = [hashed[i][1] for i in members]
+        stage["files_out"] = stats["duplicate_files"] = sum(len(g) for g in duplicates.values())
+        progress.finish("Scan complete!", len(candidates), len(candidates))
+        return duplicates
+
+    def delete_files(self, source_dir, relpaths, progress_callback=None):
+        # Stops early on cancel instead of raising so the caller still learns what is gone.
+        progress = ProgressReporter(progress_callback)
+        progress.start_phase("Deleting...", len(relpaths))
+        deleted = []
+        with self.run_metrics("delete") as metrics, metrics.phase("delete"):
+            for relpath in relpaths:
+                if self.cancel_event.is_set():
+                    break
+                filepath = os.path.join(source_dir, relpath)
+                try:
+                    os.remove(filepath)
+                    deleted.append(relpath)
+                except FileNotFoundError:
+                    deleted.append(relpath)
+                except OSError as e:
+                    print(f"Failed to delete {filepath}: {e}")
+                    metrics.count("errors")
+                progress.update()
+            metrics.count("files_deleted", len(deleted))
+        progress.finish(f"Deleted {len(deleted)} files.", len(deleted), len(relpaths))
+        return deleted
+
+    def prune_duplicates(self, duplicates, removed):
+        """Drop removed paths ({key: relpaths}) from a duplicates dict in place.
+
+        Only the touched groups are visited; groups left with fewer than two
+        files are dissolved and their keys returned.
+        """
+        dissolved = []
+        for key, relpaths in removed.items():
+            files = duplicates.get(key)
+            if files is None:
+                continue
+            gone = set(relpaths)
+            files[:] = [f for f in files if f not in gone]
+            if len(files) < 2:
+                del duplicates[key]
+                self.duplicate_sizes.pop(key, None)
+                dissolved.append(key)
+        return dissolved
+
+    def _index_by_size(self, source_dir, progress):
+        # Paths sharing an inode (hardlinks, or a followed symlink and its target) are
+        # the same data, so only the first one is indexed; the rest are kept as aliases.
+        stats = self.scan_stats
+        index = DuplicateIndex("size", self.memory_budget)
+        inodes = {}
+        metrics = self.metrics
+        clock = time.perf_counter
+        stat_time = 0.0
+        progress.start_phase("Grouping by size...")
+        try:
+            for relpath, entry in self.iter_files(source_dir):
+                self.check_cancelled()
+                start = clock()
+                try:
+                    st = entry.stat()
+                except OSError:
+                    metrics.count("errors")
+                    continue
+                finally:
+                    stat_time += clock() - start
+                stats["files"] += 1
+                progress.update()
+                if st.st_nlink > 1 or entry.is_symlink():
+                    first = inodes.setdefault((st.st_dev, st.st_ino), relpath)
+                    if first != relpath:
+                        self.hardlink_aliases.setdefault(first, []).append(relpath)
+                        stats["hardlinks"] += 1
+                        continue
+                index.add(relpath, st, entry.name)
+        except BaseException:
+            index.close()
+            raise
+        stats["total_bytes"] = index.total_bytes
+        metrics.add_time("stat", stat_time)
+        metrics.count("files_stat", stats["files"])
+        return index
+
+    def _find_content_duplicates(self, source_dir, progress):
+        stats = self.scan_stats
+        sample_size = self.PARTIAL_HASH_SAMPLE
+        metrics = self.metrics
+
+        # Stage 1: bucket by size, a file with a unique size cannot have a duplicate.
+        index = self._index_by_size(source_dir, progress)
+        total_files = stats["files"]
+        try:
+            collisions = index.colliding_counts()
+            stage = stats["size"]
+            stage["files_in"] = len(index)
+            stage["files_out"] = sum(collisions.values())
+            stage["bytes_avoided"] = index.total_bytes - sum(size * n for size, n in collisions.items())
+
+            # Stage 2: hash a head/tail sample; small files are fully covered by the sample.
+            # Groups stream out of the index one size at a time and results come back in
+            # submission order, so each size's digests are settled as soon as it ends.
+            stage = stats["partial"]
+            stage["files_in"] = stats["size"]["files_out"]
+            kind_for = lambda st: "full" if st.st_size <= 2 * sample_size else "partial"
+            progress.start_phase("Sampling candidates...", stage["files_in"],
+                                 sum(min(size, 2 * sample_size) * n for size, n in collisions.items()))
+            del collisions
+            candidates = ((record, record.relpath) for _, group in index.colliding() for record in group)
+            duplicates = {}
+            full_candidates = []
+            for size, by_digest in self._group_runs(metrics.timed(
+                    "hashing", self._hash_stage(source_dir, candidates, kind_for, progress)), stage, 2 * sample_size):
+                for digest, group in by_digest.items():
+                    if len(group) < 2:
+                        if size > 2 * sample_size:
+                            stage["bytes_avoided"] += size - 2 * sample_size
+                    elif size <= 2 * sample_size:
+                        self._add_duplicates(duplicates, size, digest, group)
+                    else:
+                        full_candidates.extend(group)
+            stage["files_out"] = len(full_candidates) + sum(len(g) for g in duplicates.values())
+            stats["index_spilled"] = index.spilled
+            metrics.count("index_spilled", index.spilled)
+        finally:
+            index.close()
+
+        # Stage 3: full-content hash only for files that still collide.
+        stage = stats["full"]
+        stage["files_in"] = len(full_candidates)
+        progress.start_phase("Hashing...", len(full_candidates), sum(r.st_size for r in full_candidates))
+        items = [(record, record.relpath) for record in full_candidates]
+        del full_candidates
+        for size, by_digest in self._group_runs(metrics.timed(
+                "hashing", self._hash_stage(source_dir, items, lambda st: "full", progress)), stage, 0):
+            for digest, group in by_digest.items():
+                if len(group) > 1:
+                    self._add_duplicates(duplicates, size, digest, group)
+                    stage["files_out"] += len(group)
+        stats["duplicate_files"] = sum(len(g) for g in duplicates.values())
+
+        progress.finish("Scan complete!", total_files, total_files)
+
+        return duplicates
+
+    def _find_content_duplicates_pipelined(self, source_dir, progress):
+        # The staged scan as a pipeline: a file is sampled as soon as a second file of
+        # its size turns up, and fully hashed as soon as a second sample matches, so
+        # hashing overlaps the walk. The price is one record per distinct size in
+        # memory, instead of the spillable DuplicateIndex.
+        stats = self.scan_stats
+        metrics = self.metrics
+        sample_cap = 2 * self.PARTIAL_HASH_SAMPLE
+        kind_for = lambda st: "full" if st.st_size <= sample_cap else "partial"
+        full_kind = lambda st: "full"
+        first_by_size = {}
+        first_by_sample = {}
+        groups = {}
+        inodes = {}
+        size_stage, sample_stage, full_stage = stats["size"], stats["partial"], stats["full"]
+
+        def stat_entry(item):
+            relpath, entry = item
+            try:
+                return relpath, entry.stat(), entry.is_symlink()
+            except OSError:
+                return None
+
+        def on_stat(item, result):
+            if result is None:
+                metrics.count("errors")
+                return ()
+            relpath, st, is_link = result
+            stats["files"] += 1
+            progress.update()
+            if st.st_nlink > 1 or is_link:
+                first = inodes.setdefault((st.st_dev, st.st_ino), relpath)
+                if first != relpath:
+                    self.hardlink_aliases.setdefault(first, []).append(relpath)
+                    stats["hardlinks"] += 1
+                    return ()
+            size_stage["files_in"] += 1
+            stats["total_bytes"] += st.st_size
+            record = FileRecord(relpath, st.st_size, st.st_dev, st.st_ino, st.st_mtime_ns)
+            ready = self._pair_up(first_by_size, st.st_size, record)
+            size_stage["files_out"] += len(ready)
+            return ready
+
+        def hash_with(kind_of):
+            return lambda record: self._cached_hash(os.path.join(source_dir, record.relpath), record, kind_of(record))
+
+        def on_sample(record, result):
+            _, digest, cached = self._count_hash((record, record.relpath), result, kind_for, progress, 0)
+            if digest is None:
+                return ()
+            size = record.st_size
+            sample_stage["bytes_avoided" if cached else "bytes_read"] += min(size, sample_cap)
+            if size <= sample_cap:
+                groups.setdefault((size, digest), []).append(record)
+                return ()
+            ready = self._pair_up(first_by_sample, (size, digest), record)
+            full_stage["files_in"] += len(ready)
+            return ready
+
+        def on_full(record, result):
+            _, digest, cached = self._count_hash((record, record.relpath), result, full_kind, progress, 0)
+            if digest is not None:
+                full_stage["bytes_avoided" if cached else "bytes_read"] += record.st_size
+                groups.setdefault((record.st_size, digest), []).append(record)
+            return ()
+
+        progress.start_phase("Scanning and hashing...")
+        pipeline = self.new_pipeline()
+        pipeline.add_stage("stat", stat_entry, on_stat)
+        pipeline.add_stage("hashing", hash_with(kind_for), on_sample, limit="hash")
+        pipeline.add_stage("hashing", hash_with(full_kind), on_full, limit="hash")
+        pipeline.run(self.dir_lister(source_dir))
+        metrics.count("files_stat", stats["files"])
+
+        size_stage["bytes_avoided"] = sum(r.st_size for r in first_by_size.values() if r is not None)
+        sample_stage["files_in"] = size_stage["files_out"]
+        sample_stage["bytes_avoided"] += sum(r.st_size - sample_cap for r in first_by_sample.values()
+                                             if r is not None)
+        duplicates = {}
+        for (size, digest), records in sorted(groups.items()):
+            if len(records) > 1:
+                records.sort(key=lambda r: r.relpath)
+                self._add_duplicates(duplicates, size, digest, records)
+                if size > sample_cap:
+                    full_stage["files_out"] += len(records)
+        stats["duplicate_files"] = sum(len(g) for g in duplicates.values())
+        sample_stage["files_out"] = full_stage["files_in"] + stats["duplicate_files"] - full_stage["files_out"]
+        progress.finish("Scan complete!", stats["files"], stats["files"])
+        return duplicates
 
     @staticmethod
-    def calculate_file_hash(filepath):
-        hash_md5 = hashlib.md5()
-        try:
-            with open(filepath, "rb") as f:
-                for chunk in iter(lambda: f.read(4096), b""):
-                    hash_md5.update(chunk)
-            return hash_md5.hexdigest()
-        except Exception:
-            return None
+    def _pair_up(firsts, key, record):
+        # Holds the first record per key; the second releases both, later ones pass straight on.
+        if key not in firsts:
+            firsts[key] = record
+            return ()
+        first = firsts[key]
+        if first is None:
+            return (record,)
+        firsts[key] = None
+        return (first, record)
 
-    def find_duplicates(self, source_dir, method, progress_callback=None):
-        files = [f for f in os.listdir(source_dir) if os.path.isfile(os.path.join(source_dir, f))]
-        total_files = len(files)
-        key_dict = {}
-
-        for i, filename in enumerate(files):
-            filepath = os.path.join(source_dir, filename)
-            
-            if method == 'name':
-                key = filename.lower()
-            elif method == 'content':
-                key = self.calculate_file_hash(filepath)
-                if key is None: continue 
-
-            key_dict.setdefault(key, []).append(filename)
-            
-            if progress_callback:
-                progress_callback(f"Scanning... ({i+1}/{total_files})", i + 1, total_files)
-
-        duplicates = {k: v for k, v in key_dict.items() if len(v) > 1}
-        
-        if progress_callback:
-             progress_callback("Scan complete!", total_files, total_files)
-             
+    @staticmethod
+    def _group_runs(results, stage, sampled_cap):
+        # Yields (size, {digest: [records]}) per run of equal sizes; records arrive sorted into runs.
+        size, by_digest = None, {}
+        for (record, _), digest, cached in results:
+            if record.st_size != size:
+                if by_digest:
+                    yield size, by_digest
+                size, by_digest = record.st_size, {}
+            if digest is None:
+                continue
+            read = min(size, sampled_cap) if sampled_cap else size
+            stage["bytes_avoided" if cached else "bytes_read"] += read
+            by_digest.setdefault(digest, []).append(record)
+        if by_digest:
+            yield size, by_digest
+
+    def _add_duplicates(self, duplicates, size, digest, records):
+        duplicates.setdefault(digest, []).extend(record.relpath for record in records)
+        self.duplicate_sizes[digest] = size
+
+    def write_manifest(self, source_dir, path, progress_callback=None):
+        """Full-hash every file under source_dir into a scan manifest at path.
+
+        Unlike a content scan, files with a unique size are hashed too, since they
+        may match a file on another host; the hash cache keeps rewrites cheap.
+        Returns the local duplicates in find_duplicates() form, so a manifest run
+        can stand in for a content scan.
+        """
+        with self.run_metrics("manifest"):
+            return self._write_manifest(source_dir, path, progress_callback)
+
+    def _write_manifest(self, source_dir, path, progress_callback):
+        self.scan_stats = stats = self._new_scan_stats()
+        self.duplicate_sizes = {}
+        self.hardlink_aliases = {}
+        progress = ProgressReporter(progress_callback, min_items=ProgressReporter.FILE_BATCH)
+        metrics = self.metrics
+        duplicates = {}
+        with self._resumable_hashing("manifest", source_dir):
+            index = self._index_by_size(source_dir, progress)
+            try:
+                stage = stats["full"]
+                stage["files_in"] = len(index)
+                progress.start_phase("Hashing...", len(index), index.total_bytes)
+                items = ((record, record.relpath) for record in index.records())
+                with ManifestWriter(path, self.hash_algorithm, source_dir) as writer:
+                    for size, by_digest in self._group_runs(metrics.timed(
+                            "hashing", self._hash_stage(source_dir, items, lambda st: "full", progress)), stage, 0):
+                        for digest in sorted(by_digest):
+                            group = by_digest[digest]
+                            for record in group:
+                                writer.add(size, digest, record.st_mtime_ns, record.relpath)
+                            if len(group) > 1:
+                                self._add_duplicates(duplicates, size, digest, group)
+                                stage["files_out"] += len(group)
+                stats["index_spilled"] = index.spilled
+                metrics.count("index_spilled", index.spilled)
+                metrics.count("manifest_records", writer.count)
+            finally:
+                index.close()
+        stats["duplicate_files"] = sum(len(g) for g in duplicates.values())
+        progress.finish(f"Wrote {writer.count} files to {path}.", stats["files"], stats["files"])
         return duplicates
 
+    def link_duplicates(self, source_dir, duplicates, mode="auto", progress_callback=None):
+        """Replace every file but the first of each group with a link to the first.
+
+        Each target is checked against the kept file by size and full digest (cached
+        where possible) right before it is replaced. Hardlink aliases of a target
+        found by the last scan are relinked too so their space is actually freed.
+        """
+        if mode not in LINK_MODES:
+            raise ValueError(f"Unknown link mode: {mode}")
+        result = {"hardlinked": 0, "reflinked": 0, "skipped": 0, "failed": 0, "bytes_saved": 0, "linked": []}
+        targets = [(files[0], relpath) for files in duplicates.values() for relpath in files[1:]]
+        progress = ProgressReporter(progress_callback)
+        progress.start_phase("Linking...", len(targets))
+        kind = f"full:{self.hash_algorithm}"
+        keep_digests = {}
+
+        with self.run_metrics("link") as metrics, metrics.phase("link"):
+            try:
+                for keep, relpath in targets:
+                    if self.cancel_event.is_set():
+                        break
+                    src = os.path.join(source_dir, keep)
+                    replaced = False
+                    for alias in [relpath] + self.hardlink_aliases.get(relpath, []):
+                        dst = os.path.join(source_dir, alias)
+                        if os.path.islink(dst):
+                            continue
+                        try:
+                            src_st = os.stat(src)
+                            st = os.stat(dst)
+                            if (st.st_dev, st.st_ino) == (src_st.st_dev, src_st.st_ino):
+                                result["skipped"] += 1
+                                replaced = True
+                                continue
+                            if st.st_size != src_st.st_size:
+                                raise ValueError("size changed since the scan")
+                            if keep not in keep_digests:
+                                keep_digests[keep] = self._cached_hash(src, src_st, "full")[0]
+                            if self._cached_hash(dst, st, "full")[0] != keep_digests[keep]:
+                                raise ValueError("content changed since the scan")
+                            how = replace_with_link(src, dst, mode)
+                        except (OSError, ValueError) as e:
+                            print(f"Failed to link {dst}: {e}")
+                            result["failed"] += 1
+                            continue
+                        result["reflinked" if how == "reflink" else "hardlinked"] += 1
+                        replaced = True
+                        if st.st_nlink == 1 or how == "reflink":
+                            result["bytes_saved"] += st.st_size
+                        if how == "reflink" and self.hash_cache is not None:
+                            # The clone is a new inode; seed its cache entry so rescans skip it.
+                            self.hash_cache.put(os.stat(dst), kind, keep_digests[keep])
+                    if replaced:
+                        result["linked"].append(relpath)
+                    progress.update()
+            finally:
+                if self.hash_cache is not None:
+                    self.hash_cache.flush()
+                metrics.count("files_linked", result["hardlinked"] + result["reflinked"])
+                metrics.count("bytes_saved", result["bytes_saved"])
+                metrics.count("errors", result["failed"])
+
+        progress.finish(
+            f"Linked {result['hardlinked'] + result['reflinked']} files, "
+            f"saved {format_size(result['bytes_saved'])}.",
+            len(result["linked"]), len(targets)
+        )
+        return result
+
+    @staticmethod
+    def compile_rules(active_rules):
+        return RuleSet(active_rules)
+
+    def plan_moves(self, source_dir, dest_dir, active_rules):
+        classify = self.compile_rules(active_rules).classify
+        metrics = self.metrics
+        clock = time.perf_counter
+        spent = 0.0
+        try:
+            for relpath, entry in self.iter_files(source_dir, skip_dirs=(dest_dir,)):
+                start = clock()
+                category = classify(entry.name, entry.stat)
+                if category is None:
+                    plan = relpath, entry, None, None
+                else:
+                    plan = relpath, entry, category, os.path.join(dest_dir, category, entry.name)
+                spent += clock() - start
+                yield plan
+        finally:
+            metrics.add_time("classification", spent)
+
+    def build_plan(self, source_dir, dest_dir, active_rules):
+        """Classify source_dir once into an OrganizePlan that apply_plan() can carry out later."""
+        with self.run_metrics("plan") as metrics:
+            plan = OrganizePlan(source_dir, dest_dir)
+            for relpath, entry, category, dest_path in self.plan_moves(source_dir, dest_dir, active_rules):
+                self.check_cancelled()
+                if category is None:
+                    plan.unmatched += 1
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    metrics.count("errors")
+                    continue
+                plan.add(relpath, os.path.join(category, entry.name), st.st_size, st.st_mtime_ns)
+            metrics.count("files_planned", len(plan))
+            return plan
+
+    def apply_plan(self, plan, progress_callback=None):
+        """Carry out an OrganizePlan; returns the number of planned files handled.
+
+        Moves are grouped by destination directory. Each directory is created
+        once and its moves go to max_workers threads in batches of APPLY_BATCH.
+        A source that is gone or whose size or mtime differs from the plan is
+        left alone and counted as stale. Like organize_files, a cancelled apply
+        resumes from the journal.
+        """
+        with self.run_metrics("organize"):
+            return self._apply_plan(plan, progress_callback)
+
+    def _apply_plan(self, plan, progress_callback):
+        from concurrent.futures import ThreadPoolExecutor
+        engine = self.move_engine
+        metrics = self.metrics
+        journal, records = self._open_journal("organize", plan.source, plan.dest)
+        resumed = MoveEngine.recover(records)
+        done = {record["src"] for record in records if record.get("op") == "move"}
+        # The engine decides rename vs copy from the roots' devices, so dest must exist first.
+        os.makedirs(plan.dest, exist_ok=True)
+        engine.start(plan.source, plan.dest, journal)
+        progress = ProgressReporter(progress_callback)
+        progress.start_phase("Resuming plan..." if resumed else "Applying plan...", len(plan), plan.total_bytes)
+        cancel_event = self.cancel_event
+
+        def apply_batch(batch):
+            # Runs on a worker; returns (files, bytes, stale) for the progress update.
+            handled = nbytes = stale = 0
+            for src_rel, dst_rel, size, mtime_ns in batch:
+                if cancel_event.is_set():
+                    break
+                src = os.path.join(plan.source, src_rel)
+                try:
+                    # Same call as the planner's entry.stat(), so symlinks compare their targets.
+                    st = os.stat(src)
+                except OSError:
+                    st = None
+                if st is None or st.st_size != size or st.st_mtime_ns != mtime_ns:
+                    stale += src not in done
+                else:
+                    engine.move(src, os.path.join(plan.dest, dst_rel), size, inline=True)
+                handled += 1
+                nbytes += size
+            return handled, nbytes, stale
+
+        processed = stale = 0
+        completed = False
+        pending = deque()
+        window = engine.max_workers * 2
+
+        def collect(future):
+            nonlocal processed, stale
+            handled, nbytes, batch_stale = future.result()
+            processed += handled
+            stale += batch_stale
+            progress.update(nbytes, handled)
+
+        try:
+            with metrics.phase("move"), ThreadPoolExecutor(max_workers=engine.max_workers) as pool:
+                try:
+                    for directory, moves in plan.by_directory():
+                        os.makedirs(os.path.join(plan.dest, directory), exist_ok=True)
+                        for start in range(0, len(moves), self.APPLY_BATCH):
+                            self.check_cancelled()
+                            while len(pending) >= window:
+                                collect(pending.popleft())
+                            pending.append(pool.submit(apply_batch, moves[start:start + self.APPLY_BATCH]))
+                    while pending:
+                        collect(pending.popleft())
+                    self.check_cancelled()
+                finally:
+                    # Let batches already running stop at their next file, then count them.
+                    while pending:
+                        collect(pending.popleft())
+            completed = True
+        finally:
+            stats = engine.finish()
+            stats["resumed"] = resumed
+            stats["stale"] = stale
+            self._close_journal(journal, completed)
+            metrics.count("files_moved", stats["files"])
+            metrics.count("bytes_moved", stats["bytes"])
+            metrics.count("files_deduplicated", stats["deduplicated"])
+            metrics.count("bytes_deduplicated", stats["bytes_deduplicated"])
+            metrics.count("files_skipped", stats["skipped"])
+            metrics.count("files_stale", stale)
+            metrics.count("errors", stats["failed"])
+
+        resumed_note = f", {resumed} already done in an earlier run" if resumed else ""
+        stale_note = f"; {stale} changed or missing since planning, left alone" if stale else ""
+        progress.finish(
+            f"Plan applied! Moved {stats['files']} files{resumed_note} "
+            f"({stats['files_per_sec']:.0f} files/s, {stats['mb_per_sec']:.1f} MB/s)"
+            f"{self.collision_summary(stats)}{stale_note}",
+            processed, len(plan)
+        )
+        return processed
+
     def organize_files(self, source_dir, dest_dir, active_rules, progress_callback=None):
+        with self.run_metrics("organize"):
+            return self._organize_files(source_dir, dest_dir, active_rules, progress_callback)
+
+    def _organize_files(self, source_dir, dest_dir, active_rules, progress_callback):
         for category in active_rules.keys():
             os.makedirs(os.path.join(dest_dir, category), exist_ok=True)
         
-        files = [f for f in os.listdir(source_dir) if os.path.isfile(os.path.join(source_dir, f))]
-        total_files = len(files)
         processed = 0
+        engine = self.move_engine
+        journal, records = self._open_journal("organize", source_dir, dest_dir)
+        resumed = MoveEngine.recover(records)
+        engine.start(source_dir, dest_dir, journal)
+        progress = ProgressReporter(progress_callback, min_items=ProgressReporter.FILE_BATCH)
+        progress.start_phase("Resuming..." if resumed else "Processing...")
 
-        for filename in files:
-            filepath = os.path.join(source_dir, filename)
-            _, ext = os.path.splitext(filename)
-            ext = ext.lower()
-            
-            for category, extensions in active_rules.items():
-                if ext in extensions:
-                    dest_folder = os.path.join(dest_dir, category)
-                    try:
-                        shutil.move(filepath, os.path.join(dest_folder, filename))
-                        break
-                    except Exception as e:
-                        print(f"Error moving {filename}: {e}")
-                        break
-            
-            processed += 1
-            if progress_callback:
-                progress_callback(f"Processing... ({processed}/{total_files})", processed, total_files)
+        metrics = self.metrics
+        clock = time.perf_counter
+        stat_time = move_time = 0.0
+        completed = False
+        try:
+            if self.pipelined:
+                processed = self._organize_pipelined(source_dir, dest_dir, active_rules, progress)
+            else:
+                for relpath, entry, category, dest_path in self.plan_moves(source_dir, dest_dir, active_rules):
+                    self.check_cancelled()
+                    size = 0
+                    if category is not None:
+                        start = clock()
+                        try:
+                            size = entry.stat().st_size
+                            stat_time += clock() - start
+                            start = clock()
+                            engine.move(entry.path, dest_path, size)
+                        except OSError as e:
+                            print(f"Error moving {relpath}: {e}")
+                            metrics.count("errors")
+                        move_time += clock() - start
+                
+                    processed += 1
+                    progress.update(size)
+            completed = True
+        finally:
+            start = clock()
+            stats = engine.finish()
+            stats["resumed"] = resumed
+            self._close_journal(journal, completed)
+            metrics.add_time("stat", stat_time)
+            metrics.add_time("move", move_time + clock() - start)
+            metrics.count("files_moved", stats["files"])
+            metrics.count("bytes_moved", stats["bytes"])
+            metrics.count("files_deduplicated", stats["deduplicated"])
+            metrics.count("bytes_deduplicated", stats["bytes_deduplicated"])
+            metrics.count("files_skipped", stats["skipped"])
+            metrics.count("errors", stats["failed"])
+
+        resumed_note = f", {resumed} already done in an earlier run" if resumed else ""
+        progress.finish(
+            f"Organization complete! Moved {stats['files']} files{resumed_note} "
+            f"({stats['files_per_sec']:.0f} files/s, {stats['mb_per_sec']:.1f} MB/s)"
+            f"{self.collision_summary(stats)}",
+            processed, processed
+        )
         
         return processed
 
-class ScanThread(QThread):
-    progress_signal = pyqtSignal(str, int, int)
-    finished = pyqtSignal(dict)
-    
-    def __init__(self, source, method, enabled, file_service):
-        super().__init__()
-        self.source = source
-        self.method = method
-        self.enabled = enabled
-        self.file_service = file_service
+
+    @staticmethod
+    def collision_summary(stats):
+        parts = []
+        if stats.get("deduplicated"):
+            parts.append(f"{stats['deduplicated']} already present ({format_size(stats['bytes_deduplicated'])} not copied)")
+        if stats.get("conflicts_renamed"):
+            parts.append(f"{stats['conflicts_renamed']} renamed on name clash")
+        if stats.get("replaced"):
+            parts.append(f"{stats['replaced']} older copies replaced")
+        if stats.get("skipped"):
+            parts.append(f"{stats['skipped']} left in place")
+        return "; " + ", ".join(parts) if parts else ""
+
+    def _organize_pipelined(self, source_dir, dest_dir, active_rules, progress):
+        # walk -> stat/classify -> move, each stage with its own workers; moves go
+        # through the engine inline since the move stage already runs them in parallel.
+        classify = self.compile_rules(active_rules).classify
+        engine = self.move_engine
+        metrics = self.metrics
+        processed = [0]
+
+        def plan(item):
+            relpath, entry = item
+            try:
+                category = classify(entry.name, entry.stat)
+                if category is None:
+                    return relpath, None, None, 0
+                return relpath, entry.path, os.path.join(dest_dir, category, entry.name), entry.stat().st_size
+            except OSError as e:
+                print(f"Error moving {relpath}: {e}")
+                return relpath, None, None, None
+
+        def on_plan(item, result):
+            relpath, src, dest_path, size = result
+            if src is not None:
+                return (result,)
+            if size is None:
+                metrics.count("errors")
+            processed[0] += 1
+            progress.update()
+            return ()
+
+        def move(item):
+            relpath, src, dest_path, size = item
+            engine.move(src, dest_path, size, inline=True)
+            return size
+
+        def on_move(item, size):
+            processed[0] += 1
+            progress.update(size)
+            return ()
+
+        pipeline = self.new_pipeline()
+        pipeline.add_stage("classification", plan, on_plan, limit="stat")
+        pipeline.add_stage("move", move, on_move)
+        pipeline.run(self.dir_lister(source_dir, skip_dirs=(dest_dir,)))
+        return processed[0]
+
+
+class Inotify:
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE_SELF = 0x00000400
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    FILE_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def add_watch(self, path, mask=FILE_MASK):
+        import ctypes
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def read_events(self, timeout):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    DEFAULT_SETTLE = 2.0
+    DEFAULT_POLL_INTERVAL = 2.0
+
+    def __init__(self, service, source_dir, dest_dir, active_rules, settle=DEFAULT_SETTLE,
+                 poll_interval=DEFAULT_POLL_INTERVAL, use_inotify=True, on_event=None):
+        self.service = service
+        self.source_dir = source_dir
+        self.dest_dir = dest_dir
+        self.rules = service.compile_rules(active_rules)
+        self.categories = list(active_rules)
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.use_inotify = use_inotify and sys.platform.startswith("linux")
+        self.on_event = on_event
+        self.engine = MoveEngine(max_workers=1, verify=service.move_engine.verify,
+                                 collisions=service.move_engine.collisions)
+        self.engine.same_content = service.same_content
+        self.engine.throttle = service.throttle
+        self.metrics = RunMetrics("watch")
+        self.exclude_match = compile_globs(service.exclude_patterns)
+        self.pending = {}
+        self.moved = 0
+        self._stop = threading.Event()
+        self._inotify = None
+        self._watches = {}
+        self._snapshot = {}
+
+    def stop(self):
+        self._stop.set()
+
+    def _log(self, message):
+        if self.on_event:
+            self.on_event(message)
 
     def run(self):
-        if not self.enabled:
-            self.finished.emit({})
+        # Metrics cover the whole session and are re-exported after every batch of moves.
+        with self.service.run_metrics("watch") as self.metrics:
+            for category in self.categories:
+                os.makedirs(os.path.join(self.dest_dir, category), exist_ok=True)
+            self.engine.start(self.source_dir, self.dest_dir)
+            if self.use_inotify:
+                try:
+                    self._inotify = Inotify()
+                    self._watch_tree(self.source_dir, 0)
+                except OSError as e:
+                    self._log(f"inotify unavailable ({e}), falling back to polling")
+                    self._inotify = None
+            mode = "inotify" if self._inotify else f"polling every {self.poll_interval:g}s"
+            self._log(f"Watching {self.source_dir} ({mode})")
+            if self._inotify is None:
+                self._snapshot = self._take_snapshot()
+
+            try:
+                while not self._stop.is_set():
+                    if self._inotify is not None:
+                        self._handle_inotify(min(self.settle, 0.5))
+                    else:
+                        self._stop.wait(self.poll_interval)
+                        self._poll()
+                    self._process_settled()
+            finally:
+                if self._inotify is not None:
+                    self._inotify.close()
+                    self._inotify = None
+                self.engine.finish()
+                self._log(f"Stopped watching. Organized {self.moved} files.")
+            return self.moved
+
+    def _watch_tree(self, path, depth):
+        wd = self._inotify.add_watch(path)
+        self._watches[wd] = (path, depth)
+        max_depth = self.service.max_depth
+        if max_depth is not None and depth >= max_depth:
             return
-        
-        duplicates = self.file_service.find_duplicates(
-            self.source, 
-            self.method, 
-            progress_callback=self.progress_signal.emit
-        )
-        self.finished.emit(duplicates)
+        try:
+            with os.scandir(path) as it:
+                subdirs = [entry.path for entry in it
+                           if entry.is_dir(follow_symlinks=False) and not self._is_excluded(entry.name, entry.path)]
+        except OSError:
+            return
+        for subdir in subdirs:
+            self._watch_tree(subdir, depth + 1)
 
+    def _is_excluded(self, name, path):
+        if os.path.abspath(path) == os.path.abspath(self.dest_dir):
+            return True
+        return bool(self.exclude_match and self.exclude_match(os.path.normcase(name)))
 
-class OrganizeThread(QThread):
-    progress_signal = pyqtSignal(str, int, int)
-    finished = pyqtSignal()
-    
-    def __init__(self, source, dest, active_rules, file_service):
-        super().__init__()
-        self.source = source
-        self.dest = dest
-        self.active_rules = active_rules
-        self.file_service = file_service
+    def _handle_inotify(self, timeout):
+        now = time.monotonic()
+        for wd, mask, name in self._inotify.read_events(timeout):
+            if mask & Inotify.IN_Q_OVERFLOW:
+                # Events were dropped; pick up whatever is in the tree now.
+                for relpath, entry in self.service.iter_files(self.source_dir, skip_dirs=(self.dest_dir,)):
+                    self.pending[entry.path] = now
+                continue
+            if mask & Inotify.IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            if wd not in self._watches or not name:
+                continue
+            directory, depth = self._watches[wd]
+            path = os.path.join(directory, name)
+            if self._is_excluded(name, path):
+                continue
+            if mask & Inotify.IN_ISDIR:
+                max_depth = self.service.max_depth
+                if mask & (Inotify.IN_CREATE | Inotify.IN_MOVED_TO) and (max_depth is None or depth < max_depth):
+                    try:
+                        self._watch_tree(path, depth + 1)
+                    except OSError:
+                        continue
+                    # Files written (or moved in) before the watch existed produce no events.
+                    self._queue_tree(path, depth + 1, now)
+                continue
+            self.pending[path] = now
 
-    def run(self):
-        self.file_service.organize_files(
-            self.source,
-            self.dest,
-            self.active_rules,
-            progress_callback=self.progress_signal.emit
-        )
-        self.finished.emit()
-        
-class DuplicateWindow(QMainWindow):
-    def __init__(self, parent, source_dir, duplicates, file_service):
-        super().__init__(parent)
-        self.source_dir = source_dir
-        self.duplicates_data = duplicates
-        self.file_service = file_service
-        self.parent_app = parent
-        
-        self.setWindowTitle("Duplicate Files Management")
-        self.resize(800, 600)
-        self.central_widget = QWidget()
-        self.setCentralWidget(self.central_widget)
-        
-        self.tab_widget = QTabWidget()
-        self.build_tabs()
-        
-        main_layout = QVBoxLayout(self.central_widget)
-        main_layout.addWidget(self.tab_widget)
-
-    def build_tabs(self):
-        for group_id, (key, files) in enumerate(self.duplicates_data.items()):
-            tab = QWidget()
-            layout = QVBoxLayout(tab)
-            
-            tree = self._create_tree_widget(files)
-            
-            button_layout = QHBoxLayout()
-            
-            delete_all_button = QPushButton("Delete All But First")
-            delete_all_button.clicked.connect(lambda _, f=files: self._delete_duplicates(f, keep_first=True))
-            button_layout.addWidget(delete_all_button)
-            
-            delete_selected_button = QPushButton("Delete Selected")
-            delete_selected_button.clicked.connect(lambda _, t=tree: self._delete_selected_duplicates(t))
-            button_layout.addWidget(delete_selected_button)
-            
-            layout.addWidget(QLabel(f"Key: {key[:10]}..."))
-            layout.addWidget(tree)
-            layout.addLayout(button_layout)
-            
-            self.tab_widget.addTab(tab, f"Group {group_id+1} ({len(files)} files)")
-            
-    def _create_tree_widget(self, files):
-        tree = QTreeWidget()
-        tree.setHeaderLabels(["Filename", "Size", "Modified Date"])
-        tree.setColumnCount(3)
-        tree.setSortingEnabled(True)
-        tree.setSelectionMode(QTreeWidget.ExtendedSelection)
-
-        for filename in files:
-            filepath = os.path.join(self.source_dir, filename)
-            if not os.path.exists(filepath):
-                 continue
-                 
-            size = os.path.getsize(filepath)
-            modified = os.path.getmtime(filepath)
-            modified_str = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(modified))
-            
-            item = QTreeWidgetItem([filename, str(size), modified_str])
-            item.setData(0, Qt.UserRole, filepath)
-            tree.addTopLevelItem(item)
-        
-        tree.expandAll()
-        for i in range(tree.columnCount()):
-             tree.resizeColumnToContents(i)
-        return tree
-
-    def _delete_duplicates(self, files, keep_first=True):
-        to_delete = files[1:] if keep_first else files
-        self._execute_deletion(to_delete)
-
-    def _delete_selected_duplicates(self, tree):
-        selected_items = tree.selectedItems()
-        to_delete = [item.data(0, Qt.UserRole) for item in selected_items]
-        self._execute_deletion(to_delete, is_filepath=True)
-
-    def _execute_deletion(self, file_list, is_filepath=False):
-        if not file_list: return
-        
-        confirm = QMessageBox.question(self, "Confirm Deletion", f"Permanently delete {len(file_list)} files?", QMessageBox.Yes | QMessageBox.No)
-        if confirm != QMessageBox.Yes: return
-        
-        deleted = 0
-        source = self.source_dir
-        
-        for item in file_list:
-            filepath = item if is_filepath else os.path.join(source, item)
+    def _queue_tree(self, path, depth, now):
+        service = self.service
+        max_depth = None if service.max_depth is None else service.max_depth - depth
+        for relpath, entry in walk_files(path, max_depth, service.exclude_patterns,
+                                         service.symlink_policy, (self.dest_dir,)):
+            self.pending[entry.path] = now
+
+    def _take_snapshot(self):
+        snapshot = {}
+        for relpath, entry in self.service.iter_files(self.source_dir, skip_dirs=(self.dest_dir,)):
             try:
-                os.remove(filepath)
-                deleted += 1
-            except Exception as e:
-                print(f"Failed to delete {filepath}: {e}")
-        
-        QMessageBox.information(self, "Success", f"Deleted {deleted} files.")
-        self.parent_app.scan_duplicates()
-        self.close()
+                st = entry.stat()
+            except OSError:
+                continue
+            snapshot[entry.path] = (st.st_size, st.st_mtime_ns)
+        return snapshot
 
+    def _poll(self):
+        now = time.monotonic()
+        snapshot = self._take_snapshot()
+        for path, signature in snapshot.items():
+            if self._snapshot.get(path) != signature:
+                self.pending[path] = now
+        self._snapshot = snapshot
 
-class FileOrganizerApp(QMainWindow):
-    def __init__(self):
-        super().__init__()
-        
-        self.file_types = {
-            "Images": ['.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', '.webp'],
-            "Documents": ['.pdf', '.doc', '.docx', '.txt', '.rtf', '.odt', '.xls', '.xlsx', '.ppt', '.pptx'],
-            "Audio": ['.mp3', '.wav', '.ogg', '.flac', '.aac'],
-            "Video": ['.mp4', '.avi', '.mkv', '.mov', '.wmv'],
-            "Archives": ['.zip', '.rar', '.7z', '.tar', '.gz'],
-            "Executables": ['.exe', '.msi', '.dmg', '.pkg', '.deb'],
-            "Code": ['.py', '.js', '.html', '.css', '.cpp', '.java', '.php', '.json', '.xml']
-        }
-        self.rule_checkboxes = {}
-        self.dark_mode = True
-        self.preview_window = None
-        self.duplicates_window = None
-        
-        self.file_service = FileService(self.file_types) 
-        
-        self.setWindowTitle("File Organizer Pro")
-        self.setWindowIcon(QIcon("icon.png")) 
-        self.resize(1200, 800)
-        
-        self.setup_theme()
-        self.apply_qss()
-        
-        self.central_widget = QWidget()
-        self.setCentralWidget(self.central_widget)
-        self.main_layout = QHBoxLayout(self.central_widget)
-        self.main_layout.setContentsMargins(0, 0, 0, 0)
-        
-        self.create_side_panel()
-        self.create_main_panel()
+    def _process_settled(self):
+        if not self.pending:
+            return
+        now = time.monotonic()
+        ready = [path for path, last in self.pending.items() if now - last >= self.settle]
+        for path in ready:
+            del self.pending[path]
+            self._organize_one(path)
+        if ready:
+            self.service.export_metrics(self.metrics)
 
-    def setup_theme(self):
-        palette = QPalette()
-        ACCENT = QColor(0, 150, 255)
-        
-        if self.dark_mode:
-            BG = QColor(30, 30, 30)
-            FG = Qt.white
-            ALT = QColor(40, 40, 40)
-            BASE = QColor(20, 20, 20)
+    def _organize_one(self, path):
+        name = os.path.basename(path)
+        try:
+            st = os.lstat(path)
+        except OSError:
+            return
+        category = self.rules.classify(name, st)
+        if category is None or not os.path.isfile(path):
+            return
+        dest_path = os.path.join(self.dest_dir, category, name)
+        metrics = self.metrics
+        with metrics.phase("move"):
+            outcome = self.engine.move(path, dest_path, st.st_size)
+        if outcome != "skipped":
+            # A skipped file stays put; keeping its signature means polling only
+            # retries it once it changes.
+            self._snapshot.pop(path, None)
+        if outcome in ("renamed", "copied"):
+            self.moved += 1
+            metrics.count("files_moved")
+            metrics.count("bytes_moved", st.st_size)
+            self._log(f"{name} -> {category}")
+        elif outcome == "deduplicated":
+            metrics.count("files_deduplicated")
+            metrics.count("bytes_deduplicated", st.st_size)
+            self._log(f"{name} already in {category}, removed the new copy")
+        elif outcome == "skipped":
+            metrics.count("files_skipped")
+            self._log(f"{name} left in place, {category} has a different file with that name")
         else:
-            BG = QColor(240, 240, 240)
-            FG = Qt.black
-            ALT = QColor(220, 220, 220)
-            BASE = Qt.white
-
-        palette.setColor(QPalette.Window, BG)
-        palette.setColor(QPalette.WindowText, FG)
-        palette.setColor(QPalette.Base, BASE)
-        palette.setColor(QPalette.AlternateBase, ALT)
-        palette.setColor(QPalette.Text, FG)
-        palette.setColor(QPalette.Button, ALT)
-        palette.setColor(QPalette.ButtonText, FG)
-        palette.setColor(QPalette.Highlight, ACCENT)
-        palette.setColor(QPalette.HighlightedText, Qt.white)
-        
-        QApplication.setPalette(palette)
-
-    def apply_qss(self):
-        qss = """
-        QMainWindow, QWidget {
-            background-color: rgb(30, 30, 30);
-            color: white;
-            font-family: "Segoe UI", sans-serif;
-        }
-        
-        #SidePanel { 
-            background-color: rgb(35, 35, 35); 
-            border-right: 1px solid rgb(50, 50, 50);
-        }
-        QGroupBox {
-            font-weight: bold;
-            font-size: 13px;
-            margin-top: 15px;
-            border: 1px solid rgb(50, 50, 50);
-            border-radius: 8px;
-            padding-top: 20px;
-        }
+            metrics.count("errors")
 
-        QLineEdit {
-            padding: 8px;
-            border: 1px solid rgb(70, 70, 70);
-            border-radius: 4px;
-            background-color: rgb(40, 40, 40);
-        }
-        
-        QPushButton {
-            padding: 10px 15px;
-            border-radius: 5px;
-            background-color: rgb(60, 60, 60);
-            color: white;
-            font-weight: 500;
-        }
-        QPushButton:hover {
-            background-color: rgb(80, 80, 80);
-        }
 
-        #OrganizeButton { 
-            background-color: #4CAF50;
-            font-weight: bold;
-        }
-        #OrganizeButton:hover {
-            background-color: #5cb860;
-        }
-        
-        QProgressBar {
-            text-align: center;
-            border: 1px solid rgb(50, 50, 50);
-            border-radius: 5px;
-            background-color: rgb(40, 40, 40);
-            color: white;
-            font-weight: bold;
-        }
-        QProgressBar::chunk {
-            background-color: rgb(0, 150, 255);
-            border-radius: 5px;
-        }
-        
-        QTreeWidget {
-            background-color: rgb(35, 35, 35);
-            alternate-background-color: rgb(40, 40, 40);
-            border: 1px solid rgb(50, 50, 50);
-        }
-        QTreeWidget::item:selected {
-            background-color: rgb(0, 150, 255);
-        }
-        """
-        self.setStyleSheet(qss)
-        
-    def create_side_panel(self):
-        side_panel = QWidget()
-        side_panel.setObjectName("SidePanel")
-        side_panel.setFixedWidth(400)
-        side_layout = QVBoxLayout(side_panel)
-        side_layout.setContentsMargins(15, 20, 15, 15)
-        side_layout.setSpacing(15)
-
-        self.create_header(side_layout)
-        self.create_folder_selectors(side_layout)
-        self.create_options_section(side_layout)
-        self.create_rules_section(side_layout)
-        
-        self.main_layout.addWidget(side_panel)
-
-    def create_main_panel(self):
-        main_panel = QWidget()
-        main_layout = QVBoxLayout(main_panel)
-        main_layout.setContentsMargins(20, 20, 20, 20)
-        main_layout.setSpacing(20)
-
-        status_group = QGroupBox("Operation Status & Progress")
-        status_layout = QVBoxLayout(status_group)
-        self.create_progress_bar(status_layout)
-        status_group.setLayout(status_layout)
-        main_layout.addWidget(status_group)
-        
-        self.tab_widget = QTabWidget()
-        self.tab_widget.addTab(QWidget(), "Organization Log")
-        main_layout.addWidget(self.tab_widget, 1)
+EXIT_OK = 0
+EXIT_FAILURE = 1
+EXIT_USAGE = 2
+EXIT_CANCELLED = 130
 
-        self.create_action_buttons(main_layout)
-        
-        self.main_layout.addWidget(main_panel, 1)
-
-    def create_header(self, parent_layout):
-        header = QLabel("File Organizer Pro")
-        header.setFont(QFont("Segoe UI", 20, QFont.ExtraBold))
-        header.setAlignment(Qt.AlignCenter)
-        header.setStyleSheet("color: rgb(0, 150, 255); margin-bottom: 5px;")
-        parent_layout.addWidget(header)
-        
-        tagline = QLabel("Smartly sort and manage your digital workspace.")
-        tagline.setAlignment(Qt.AlignCenter)
-        tagline.setStyleSheet("color: rgb(180, 180, 180); font-size: 10pt; margin-bottom: 10px;")
-        parent_layout.addWidget(tagline)
-        
-    def create_folder_selectors(self, parent_layout):
-        source_group = QGroupBox("Source Folder")
-        source_layout = QHBoxLayout()
-        self.source_entry = QLineEdit()
-        self.source_entry.setPlaceholderText("Select folder to organize...")
-        source_layout.addWidget(self.source_entry, 1)
-        source_button = QPushButton("Browse")
-        source_button.clicked.connect(self.select_source)
-        source_layout.addWidget(source_button)
-        source_group.setLayout(source_layout)
-        parent_layout.addWidget(source_group)
-        
-        dest_group = QGroupBox("Destination Root")
-        dest_layout = QHBoxLayout()
-        self.dest_entry = QLineEdit()
-        self.dest_entry.setPlaceholderText("Select root folder for categorized files...")
-        dest_layout.addWidget(self.dest_entry, 1)
-        dest_button = QPushButton("Browse")
-        dest_button.clicked.connect(self.select_destination)
-        dest_layout.addWidget(dest_button)
-        dest_group.setLayout(dest_layout)
-        parent_layout.addWidget(dest_group)
-
-    def create_options_section(self, parent_layout):
-        options_group = QGroupBox("Optimization & Duplicate Options")
-        options_layout = QVBoxLayout()
-        
-        self.dup_check = QCheckBox("Enable duplicate detection (Recommended)")
-        self.dup_check.setChecked(True)
-        options_layout.addWidget(self.dup_check)
-        
-        method_group = QButtonGroup(self)
-        self.dup_name_radio = QRadioButton("Filename Only (Fast)")
-        self.dup_content_radio = QRadioButton("File Content (Accurate)")
-        self.dup_content_radio.setChecked(True)
-        method_group.addButton(self.dup_name_radio)
-        method_group.addButton(self.dup_content_radio)
-        
-        method_layout = QHBoxLayout()
-        method_layout.addWidget(self.dup_name_radio)
-        method_layout.addWidget(self.dup_content_radio)
-        method_layout.addStretch()
-        
-        options_layout.addLayout(method_layout)
-        options_group.setLayout(options_layout)
-        parent_layout.addWidget(options_group)
 
-    def create_rules_section(self, parent_layout):
-        rules_group = QGroupBox("Active Organization Rules")
-        parent_layout.addWidget(rules_group, 1)
-        
-        scroll = QScrollArea()
-        scroll.setWidgetResizable(True)
-        scroll.setFrameShape(QScrollArea.NoFrame)
-        
-        rules_content = QWidget()
-        self.rules_layout = QVBoxLayout(rules_content)
-        self.rules_layout.setAlignment(Qt.AlignTop)
-        
-        for category, extensions in self.file_types.items():
-            cb = QCheckBox(f"**{category}** ({', '.join(extensions)})")
-            cb.setChecked(True)
-            self.rules_layout.addWidget(cb)
-            self.rule_checkboxes[category] = cb
-        
-        custom_group = QGroupBox("Add Custom Rule")
-        custom_layout = QHBoxLayout()
-        self.custom_category = QLineEdit()
-        self.custom_category.setPlaceholderText("New Category Name")
-        self.custom_extensions = QLineEdit()
-        self.custom_extensions.setPlaceholderText(".ext1, .ext2, ...")
-        add_button = QPushButton("Add")
-        add_button.clicked.connect(self.add_custom_rule)
-        
-        custom_layout.addWidget(self.custom_category)
-        custom_layout.addWidget(self.custom_extensions)
-        custom_layout.addWidget(add_button)
-        
-        custom_group.setLayout(custom_layout)
-        self.rules_layout.addWidget(custom_group)
-        
-        self.rules_layout.addStretch()
-        scroll.setWidget(rules_content)
-        rules_group.setLayout(QVBoxLayout())
-        rules_group.layout().addWidget(scroll)
+# argparse type= callables, so malformed values are usage errors (exit 2) reported
+# by the parser rather than failures of the run.
+
+def _rule_arg(text):
+    import argparse
+    category, _, patterns = text.partition("=")
+    category = category.strip()
+    if not category or not patterns:
+        raise argparse.ArgumentTypeError(f"invalid rule {text!r}, expected CATEGORY=PATTERN,PATTERN")
+    patterns = split_patterns(patterns)
+    try:
+        RuleSet({category: patterns})
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+    return category, patterns
 
-    def create_action_buttons(self, parent_layout):
-        button_layout = QHBoxLayout()
-        
-        self.scan_dup_button = QPushButton("🔍 Scan for Duplicates")
-        self.scan_dup_button.clicked.connect(self.scan_duplicates)
-        button_layout.addWidget(self.scan_dup_button)
-        
-        self.preview_button = QPushButton("📊 Preview Changes")
-        self.preview_button.clicked.connect(self.preview_changes)
-        button_layout.addWidget(self.preview_button)
-        
-        self.organize_button = QPushButton("🚀 Organize Files")
-        self.organize_button.setObjectName("OrganizeButton")
-        self.organize_button.clicked.connect(self.start_organization)
-        button_layout.addWidget(self.organize_button)
-        
-        parent_layout.addLayout(button_layout)
-        
-    def create_progress_bar(self, parent_layout):
-        self.progress_label = QLabel("Ready. Select your source folder to begin.")
-        self.progress_label.setAlignment(Qt.AlignCenter)
-        self.progress_label.setFont(QFont("Segoe UI", 10))
-        parent_layout.addWidget(self.progress_label)
-        
-        self.progress_bar = QProgressBar()
-        self.progress_bar.setRange(0, 100)
-        self.progress_bar.setValue(0)
-        self.progress_bar.setTextVisible(True)
-        parent_layout.addWidget(self.progress_bar)
-
-    def select_source(self):
-        folder = QFileDialog.getExistingDirectory(self, "Select Source Folder")
-        if folder:
-            self.source_entry.setText(folder)
-            self.update_file_count(folder)
-
-    def update_file_count(self, source_folder):
-        if not os.path.exists(source_folder):
-            self.progress_label.setText("Source folder not found.")
-            return
 
+def _distance_arg(text):
+    import argparse
+    if not text.isdigit() or int(text) > MAX_PHASH_DISTANCE:
+        raise argparse.ArgumentTypeError(f"invalid distance {text!r}, expected 0 to {MAX_PHASH_DISTANCE}")
+    return int(text)
+
+
+def _stage_limit_arg(text):
+    import argparse
+    stage, _, workers = text.partition("=")
+    if stage not in Pipeline.DEFAULT_LIMITS or not workers.isdigit() or int(workers) < 1:
+        raise argparse.ArgumentTypeError(f"invalid stage limit {text!r}, expected one of "
+                                         f"{', '.join(Pipeline.DEFAULT_LIMITS)}=N with N >= 1")
+    return stage, int(workers)
+
+
+def _rate_arg(units=None):
+    # Returns the text unchanged, so "off" stays distinguishable from an option not given.
+    def check(text):
+        import argparse
         try:
-            file_count = sum(1 for entry in os.scandir(source_folder) if entry.is_file())
-            self.progress_label.setText(f"**Ready.** Found **{file_count}** files in source directory.")
-        except Exception:
-            self.progress_label.setText("Error reading file count.")
+            parse_rate(text, units)
+        except ValueError as e:
+            raise argparse.ArgumentTypeError(str(e)) from None
+        return text
+    return check
 
-    def select_destination(self):
-        folder = QFileDialog.getExistingDirectory(self, "Select Destination Folder")
-        if folder:
-            self.dest_entry.setText(folder)
 
-    def add_custom_rule(self):
-        category = self.custom_category.text().strip()
-        extensions = [ext.strip().lower() for ext in self.custom_extensions.text().split(',') if ext.strip()]
-        
-        if not category or not extensions:
-            QMessageBox.critical(self, "Error", "Please enter both category name and extensions.")
-            return
-        
-        self.file_types[category] = extensions
-        cb = QCheckBox(f"**{category}** ({', '.join(extensions)})")
-        cb.setChecked(True)
-        self.rules_layout.insertWidget(self.rules_layout.count() - 2, cb) 
-        self.rule_checkboxes[category] = cb
-        
-        self.custom_category.clear()
-        self.custom_extensions.clear()
-        QMessageBox.information(self, "Success", f"Custom rule '{category}' added.")
+def _parse_rules(args):
+    rules = {cat: list(exts) for cat, exts in DEFAULT_FILE_TYPES.items()}
+    if args.rules_file:
+        with open(args.rules_file) as f:
+            rules = json.load(f)
+    for category, patterns in args.rule:
+        rules[category] = patterns
+    for category in args.disable:
+        rules.pop(category, None)
+    RuleSet(rules)
+    return rules
 
 
-    def validate_inputs(self, require_dest=True):
-        source = self.source_entry.text()
-        dest = self.dest_entry.text()
-        
-        if not source or (require_dest and not dest):
-            QMessageBox.critical(self, "Error", "Please select both source and destination folders.")
-            return False
-        
-        if require_dest and source == dest:
-            QMessageBox.critical(self, "Error", "Source and destination folders cannot be the same.")
-            return False
-            
-        return True
+def _build_service(args, rules):
+    hash_cache = None
+    if not getattr(args, "no_cache", True):
+        hash_cache = HashCache(args.cache_path, args.cache_entries)
+        if args.clear_cache:
+            hash_cache.clear()
+    service = FileService(rules, hash_cache)
+    if hasattr(args, "source"):
+        service.max_depth = None if args.recursive and args.max_depth is None else (args.max_depth or 0)
+        service.exclude_patterns = args.exclude
+        service.symlink_policy = args.symlinks
+    if getattr(args, "workers", None):
+        service.max_workers = args.workers
+    if getattr(args, "hash", None):
+        service.hash_algorithm = args.hash
+    if getattr(args, "chunk_size", None):
+        service.hash_chunk_size = args.chunk_size
+    if getattr(args, "distance", None) is not None:
+        service.phash_distance = args.distance
+    if getattr(args, "memory_budget", None):
+        service.memory_budget = args.memory_budget * 1024 * 1024
+    if getattr(args, "on_conflict", None):
+        service.move_engine.collisions = args.on_conflict
+    if getattr(args, "verify", None):
+        service.move_engine.verify = args.verify
+    service.pipelined = getattr(args, "pipeline", False)
+    for stage, workers in getattr(args, "stage_limit", []):
+        service.pipeline_limits[stage] = workers
+    if hasattr(args, "io_limit"):
+        # Limits come from the flags only; a control file, when given, lets
+        # `throttle` change them while the run is going on.
+        throttle = service.throttle
+        throttle.set_limits(parse_rate(args.io_limit) if args.io_limit else None,
+                            parse_rate(args.ops_limit, _COUNT_UNITS) if args.ops_limit else None)
+        if args.throttle_control:
+            throttle.watch_control(args.throttle_control)
+        if args.drop_cache:
+            throttle.drop_cache = True
+        service.low_priority = args.low_priority
+    service.metrics_path = args.metrics
+    return service
 
-    def scan_duplicates(self):
-        if not self.validate_inputs(require_dest=False): return
-        
-        source = self.source_entry.text()
-        method = "content" if self.dup_content_radio.isChecked() else "name"
-        
-        self.set_buttons_enabled(False)
-        self.progress_label.setText("Starting duplicate scan...")
-        
-        self.scan_thread = ScanThread(source, method, self.dup_check.isChecked(), self.file_service)
-        self.scan_thread.progress_signal.connect(self.update_progress)
-        self.scan_thread.finished.connect(self.on_scan_complete)
-        self.scan_thread.start()
 
-    def on_scan_complete(self, duplicates):
-        self.set_buttons_enabled(True)
-        
-        if not duplicates:
-            QMessageBox.information(self, "Scan Complete", "No duplicate files found!")
-            self.progress_label.setText("Scan complete! No duplicates found.")
-            return
-        
-        self.duplicates_window = DuplicateWindow(self, self.source_entry.text(), duplicates, self.file_service)
-        self.duplicates_window.show()
-        self.progress_label.setText(f"Scan complete! Found {len(duplicates)} groups of duplicates.")
+def _progress_printer(args):
+    if args.quiet or args.json or not sys.stderr.isatty():
+        return None
+    def report(message, value, maximum):
+        print(f"\r{message:<70}", end="", file=sys.stderr, flush=True)
+    return report
 
-    def preview_changes(self):
-        if not self.validate_inputs(): return
-        
-        active_rules = {cat: exts for cat, exts in self.file_types.items() 
-                         if self.rule_checkboxes.get(cat) and self.rule_checkboxes[cat].isChecked()}
-                         
-        source = self.source_entry.text()
-        dest = self.dest_entry.text()
-        file_mapping = {}
-        other_files = []
-        
-        for filename in os.listdir(source):
-            filepath = os.path.join(source, filename)
-            if os.path.isfile(filepath):
-                _, ext = os.path.splitext(filename)
-                ext = ext.lower()
-                
-                moved = False
-                for category, extensions in active_rules.items():
-                    if ext in extensions:
-                        dest_folder = os.path.join(dest, category)
-                        file_mapping[filename] = os.path.join(dest_folder, filename)
-                        moved = True
-                        break
-                
-                if not moved:
-                    other_files.append(filename)
-        
-        if self.preview_window: self.preview_window.close()
-        
-        self.preview_window = QMainWindow(self)
-        self.preview_window.setWindowTitle("Organization Preview")
-        self.preview_window.resize(800, 600)
-        
-        tab_widget = QTabWidget()
-        org_tree = QTreeWidget()
-        org_tree.setHeaderLabels(["Filename", "New Location"])
-        
-        for filename, new_path in file_mapping.items():
-            QTreeWidgetItem(org_tree, [filename, new_path])
-        
-        tab_widget.addTab(org_tree, f"Files to be Organized ({len(file_mapping)})")
-        self.preview_window.setCentralWidget(tab_widget)
-        self.preview_window.show()
 
+def _emit(args, payload, lines):
+    if args.json:
+        json.dump(payload, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        if _progress_printer(args):
+            print(file=sys.stderr)
+        for line in lines:
+            print(line)
+
+
+def cmd_scan(args):
+    if args.link and args.method != "content":
+        raise ValueError("--link requires --method content")
+    if args.manifest and args.method != "content":
+        raise ValueError("--manifest requires --method content")
+    service = _build_service(args, {})
+    links = None
+    try:
+        if args.manifest:
+            duplicates = service.write_manifest(args.source, args.manifest, _progress_printer(args))
+        else:
+            duplicates = service.find_duplicates(args.source, args.method, _progress_printer(args))
+        if args.link:
+            links = service.link_duplicates(args.source, duplicates, args.link, _progress_printer(args))
+    finally:
+        if service.hash_cache is not None:
+            service.hash_cache.close()
+    lines = []
+    for key, files in duplicates.items():
+        lines.append(f"{key}:")
+        lines.extend(f"    {filename}" for filename in files)
+    lines.append(f"{len(duplicates)} duplicate groups.")
+    if service.scan_stats["hardlinks"]:
+        lines.append(f"{service.scan_stats['hardlinks']} paths were links to an already scanned file.")
+    result = {"source": args.source, "method": args.method, "duplicates": duplicates,
+              "stats": service.scan_stats, "metrics": service.metrics.snapshot()}
+    if args.manifest:
+        lines.append(f"Wrote manifest {args.manifest}.")
+        result["manifest"] = args.manifest
+    if links is not None:
+        lines.append(f"Hardlinked {links['hardlinked']}, reflinked {links['reflinked']}, "
+                     f"{links['skipped']} already linked, {links['failed']} failed; "
+                     f"saved {format_size(links['bytes_saved'])}.")
+        result["links"] = links
+    _emit(args, result, lines)
+    return EXIT_FAILURE if links and links["failed"] else EXIT_OK
+
+
+def cmd_merge(args):
+    manifests = []
+    try:
+        for path in args.manifests:
+            manifests.append(ScanManifest(path))
+        groups = []
+        lines = []
+        reclaimable = 0
+        for size, digest, members in merge_manifests(manifests, args.cross_only):
+            files = [{"host": manifests[n].host, "root": manifests[n].root, "path": relpath}
+                     for n, relpath in members]
+            groups.append({"size": size, "digest": digest, "files": files})
+            reclaimable += size * (len(files) - 1)
+            lines.append(f"{digest} ({format_size(size)}):")
+            lines.extend(f"    {f['host']}:{os.path.join(f['root'], f['path'])}" for f in files)
+    finally:
+        for manifest in manifests:
+            manifest.close()
+    lines.append(f"{len(groups)} duplicate groups across {len(manifests)} manifests, "
+                 f"{format_size(reclaimable)} reclaimable.")
+    _emit(args, {"manifests": [{"path": m.path, "host": m.host, "root": m.root, "files": len(m)} for m in manifests],
+                 "duplicates": groups, "reclaimable_bytes": reclaimable}, lines)
+    return EXIT_OK
+
+
+def _format_limits(settings):
+    rate = settings.get("bytes_per_sec")
+    ops = settings.get("ops_per_sec")
+    return [f"I/O limit: {format_size(rate) + '/s' if rate else 'unlimited'}",
+            f"Ops limit: {f'{ops:g}/s' if ops else 'unlimited'}",
+            f"Drop page cache after reads: {'yes' if settings.get('drop_cache') else 'no'}"]
+
+
+def cmd_throttle(args):
+    path = args.control
+    settings = {}
+    if args.io_limit is not None:
+        settings["bytes_per_sec"] = parse_rate(args.io_limit)
+    if args.ops_limit is not None:
+        settings["ops_per_sec"] = parse_rate(args.ops_limit, _COUNT_UNITS)
+    if args.drop_cache is not None:
+        settings["drop_cache"] = args.drop_cache
+    if settings:
+        current = write_throttle_control(path, **settings)
+    else:
+        try:
+            with open(path, encoding="utf-8") as f:
+                current = json.load(f)
+        except FileNotFoundError:
+            current = {}
+    if args.json:
+        json.dump({"control": path, **current}, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        print("\n".join(_format_limits(current)))
+    return EXIT_OK
+
+
+def cmd_cache(args):
+    cache = HashCache(args.cache_path)
+    if not cache.enabled:
+        return EXIT_FAILURE
+    try:
+        if args.clear:
+            cache.clear()
+        stats = cache.stats()
+    finally:
+        cache.close()
+    try:
+        stats["bytes"] = os.path.getsize(cache.path)
+    except OSError:
+        stats["bytes"] = 0
+    lines = [f"{cache.path}: {stats['entries']} of at most {stats['max_entries']} entries, "
+             f"{format_size(stats['bytes'])} on disk."]
+    if args.clear:
+        lines.insert(0, "Hash cache cleared.")
+    if args.json:
+        json.dump(stats, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        print("\n".join(lines))
+    return EXIT_OK
+
+
+def cmd_preview(args):
+    rules = _parse_rules(args)
+    service = _build_service(args, rules)
+    if args.save_plan:
+        plan = service.build_plan(args.source, args.dest, rules)
+        plan.save(args.save_plan)
+        _emit(args, {"source": plan.source, "dest": plan.dest, "plan": args.save_plan, "files": len(plan),
+                     "bytes": plan.total_bytes, "unmatched": plan.unmatched, "metrics": service.metrics.snapshot()},
+              [f"Saved a plan for {len(plan)} files ({format_size(plan.total_bytes)}) to {args.save_plan}, "
+               f"{plan.unmatched} unmatched. Review it, then run: apply {args.save_plan}"])
+        return EXIT_OK
+    mapping = {}
+    unmatched = []
+    with service.run_metrics("preview"):
+        for relpath, entry, category, dest_path in service.plan_moves(args.source, args.dest, rules):
+            if category is None:
+                unmatched.append(relpath)
+            else:
+                mapping[relpath] = dest_path
+    lines = [f"{relpath} -> {dest_path}" for relpath, dest_path in mapping.items()]
+    lines.append(f"{len(mapping)} files to organize, {len(unmatched)} unmatched.")
+    _emit(args, {"source": args.source, "dest": args.dest, "moves": mapping, "unmatched": unmatched,
+                 "metrics": service.metrics.snapshot()}, lines)
+    return EXIT_OK
+
+
+def cmd_apply(args):
+    plan = OrganizePlan.load(args.plan)
+    if not os.path.isdir(plan.source):
+        print(f"Error: source folder of the plan not found: {plan.source}", file=sys.stderr)
+        return EXIT_USAGE
+    service = _build_service(args, {})
+    if args.workers:
+        service.move_engine.max_workers = args.workers
+    processed = service.apply_plan(plan, _progress_printer(args))
+    stats = service.move_engine.stats
+    lines = [f"Applied {processed} of {len(plan)} planned moves, moved {stats['files']} "
+             f"({stats['files_per_sec']:.0f} files/s, {stats['mb_per_sec']:.1f} MB/s), {stats['failed']} failed"
+             f"{service.collision_summary(stats)}"
+             + (f", {stats['stale']} changed or missing since planning." if stats["stale"] else ".")]
+    _emit(args, {"plan": args.plan, "source": plan.source, "dest": plan.dest, "processed": processed,
+                 "stats": stats, "metrics": service.metrics.snapshot()}, lines)
+    return EXIT_FAILURE if stats["failed"] else EXIT_OK
+
+
+def cmd_organize(args):
+    rules = _parse_rules(args)
+    service = _build_service(args, rules)
+    processed = service.organize_files(args.source, args.dest, rules, _progress_printer(args))
+    stats = service.move_engine.stats
+    lines = [f"Processed {processed} files, moved {stats['files']} "
+             f"({stats['files_per_sec']:.0f} files/s, {stats['mb_per_sec']:.1f} MB/s), {stats['failed']} failed"
+             f"{service.collision_summary(stats)}."]
+    _emit(args, {"source": args.source, "dest": args.dest, "processed": processed, "stats": stats,
+                 "metrics": service.metrics.snapshot()}, lines)
+    return EXIT_FAILURE if stats["failed"] else EXIT_OK
+
+
+def cmd_watch(args):
+    rules = _parse_rules(args)
+    service = _build_service(args, rules)
+    log = None if args.json else (lambda message: print(message, flush=True))
+    watcher = FolderWatcher(service, args.source, args.dest, rules, settle=args.settle,
+                            poll_interval=args.poll_interval, use_inotify=not args.poll, on_event=log)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.stop()
+    stats = watcher.engine.stats
+    if args.json:
+        _emit(args, {"source": args.source, "dest": args.dest, "moved": watcher.moved, "stats": stats,
+                     "metrics": service.metrics.snapshot()}, [])
+    return EXIT_FAILURE if stats["failed"] else EXIT_OK
+
+
+def build_parser():
+    import argparse
+    parser = argparse.ArgumentParser(
+        prog="file_organizer",
+        description="File Organizer Pro. Run without a command to open the GUI."
+    )
+    subparsers = parser.add_subparsers(dest="command")
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("source", help="Folder to scan or organize")
+    common.add_argument("-r", "--recursive", action="store_true", help="Descend into subfolders")
+    common.add_argument("--max-depth", type=int, help="Maximum subfolder depth (implies --recursive)")
+    common.add_argument("--exclude", action="append", default=[], metavar="GLOB", help="Skip matching entries")
+    common.add_argument("--symlinks", choices=("skip", "files", "follow"), default="files")
+    common.add_argument("--json", action="store_true", help="Print machine-readable JSON")
+    common.add_argument("-q", "--quiet", action="store_true", help="Do not print progress")
+    common.add_argument("--metrics", metavar="PATH",
+                        help="Write run metrics to PATH (Prometheus textfile if it ends in .prom, else JSON)")
+
+    rules = argparse.ArgumentParser(add_help=False)
+    rules.add_argument("dest", help="Destination root for categorized files")
+    rules.add_argument("--rules-file", help="JSON file mapping categories to extension lists")
+    rules.add_argument("--rule", action="append", default=[], type=_rule_arg, metavar="CATEGORY=PATTERN,...",
+                       help="Add or replace a category. Patterns: .ext, a glob such as 'IMG_*.jpg', "
+                            "'re:REGEX', and size/age terms such as 'size>100M' or '*.log age>30d'")
+    rules.add_argument("--disable", action="append", default=[], metavar="CATEGORY",
+                       help="Disable a category")
+    rules.add_argument("--on-conflict", choices=COLLISION_POLICIES, default="rename",
+                       help="When the destination name is taken by a different file: rename to 'name (1).ext', "
+                            "skip (leave the source), newest (keep the newer file) or overwrite. "
+                            "Identical files are never copied again; the source is just removed")
+    rules.add_argument("--verify", choices=VERIFY_MODES, default="hash",
+                       help="How copies across devices are checked before the source is deleted: "
+                            "full digest (default), head/tail sample digest, or size only")
+
+    io = argparse.ArgumentParser(add_help=False)
+    io.add_argument("--io-limit", type=_rate_arg(), metavar="RATE",
+                    help="Cap reads and copies at RATE bytes/s, e.g. 50M (shared with every worker)")
+    io.add_argument("--ops-limit", type=_rate_arg(_COUNT_UNITS), metavar="N", help="Cap file reads, copies and renames at N per second")
+    io.add_argument("--drop-cache", action="store_true",
+                    help="Drop hashed and copied files from the page cache so the run does not evict other data")
+    io.add_argument("--low-priority", action="store_true",
+                    help="Run with nice +10 and the idle disk I/O class (Linux)")
+    io.add_argument("--throttle-control", metavar="PATH",
+                    help="Follow changes that `throttle PATH` makes while this runs; "
+                         "the file's current contents are not applied")
+
+    pipeline = argparse.ArgumentParser(add_help=False)
+    pipeline.add_argument("--pipeline", action="store_true",
+                          help="Overlap listing, stat, hashing and moves (helps most on network mounts)")
+    pipeline.add_argument("--stage-limit", action="append", default=[], type=_stage_limit_arg, metavar="STAGE=N",
+                          help="Concurrent workers for a pipeline stage: "
+                               + ", ".join(f"{stage} (default {n})" for stage, n in Pipeline.DEFAULT_LIMITS.items())
+                               + "; hash follows --workers")
+
+    scan = subparsers.add_parser("scan", parents=[common, pipeline, io], help="Find duplicate files")
+    scan.add_argument("--method", choices=("content", "name", "perceptual"), default="content",
+                      help="perceptual finds re-encoded or resized copies of images (needs Pillow and NumPy)")
+    scan.add_argument("--distance", type=_distance_arg, default=DEFAULT_PHASH_DISTANCE,
+                      help=f"Maximum differing bits (of 64) for perceptual matches, at most {MAX_PHASH_DISTANCE}")
+    scan.add_argument("--workers", type=int, help="Parallel hash workers")
+    scan.add_argument("--hash", default=DEFAULT_HASH_ALGORITHM,
+                      help="Digest algorithm: " + ", ".join(sorted(HASH_ALGORITHMS)) + " (xxh3_128, xxh64 and blake3 when installed)")
+    scan.add_argument("--chunk-size", type=int,
+                      help="Read size in bytes for full-content hashing, for every algorithm and for both the "
+                           "buffered and mmap readers (default: per algorithm, 1 MiB for hashlib digests, "
+                           "4 MiB for xxhash and blake3)")
+    scan.add_argument("--no-cache", action="store_true", help="Do not use the persistent hash cache")
+    scan.add_argument("--cache-path", help="Location of the hash cache database")
+    scan.add_argument("--cache-entries", type=int, default=HashCache.DEFAULT_MAX_ENTRIES, metavar="N",
+                      help="Keep at most N cached digests; an entry count, not bytes, with the least recently "
+                           f"used evicted first (default {HashCache.DEFAULT_MAX_ENTRIES:,})")
+    scan.add_argument("--clear-cache", action="store_true",
+                      help="Empty the hash cache before scanning, so every file is read again")
+    scan.add_argument("--memory-budget", type=int, metavar="MB",
+                      help="Memory for the file index before it spills to a temporary database "
+                           f"(default {FileService.DEFAULT_MEMORY_BUDGET // (1024 * 1024)})")
+    scan.add_argument("--link", choices=LINK_MODES,
+                      help="Replace every duplicate but the first of each group with a link to it "
+                           "(auto: reflink where supported, else hardlink)")
+    scan.add_argument("--manifest", metavar="PATH",
+                      help="Hash every file and write a scan manifest to PATH for the merge command")
+    scan.set_defaults(func=cmd_scan)
+
+    merge = subparsers.add_parser("merge", help="Find duplicates across scan manifests from several hosts")
+    merge.add_argument("manifests", nargs="+", metavar="MANIFEST", help="Manifests written by scan --manifest")
+    merge.add_argument("--cross-only", action="store_true",
+                       help="Only report groups that span more than one manifest")
+    merge.add_argument("--json", action="store_true", help="Print machine-readable JSON")
+    merge.add_argument("-q", "--quiet", action="store_true", help="Do not print progress")
+    merge.set_defaults(func=cmd_merge)
+
+    preview = subparsers.add_parser("preview", parents=[common, rules], help="Show planned moves")
+    preview.add_argument("--save-plan", metavar="PATH",
+                         help="Write the planned moves to PATH (JSON lines) for review and the apply command")
+    preview.set_defaults(func=cmd_preview)
+
+    organize = subparsers.add_parser("organize", parents=[common, rules, pipeline, io],
+                                     help="Move files into categories")
+    organize.set_defaults(func=cmd_organize)
+
+    watch = subparsers.add_parser("watch", parents=[common, rules, io],
+                                  help="Organize new files as they arrive")
+    watch.add_argument("--settle", type=float, default=FolderWatcher.DEFAULT_SETTLE,
+                       help="Seconds a file must be quiet before it is moved")
+    watch.add_argument("--poll", action="store_true", help="Poll instead of using inotify")
+    watch.add_argument("--poll-interval", type=float, default=FolderWatcher.DEFAULT_POLL_INTERVAL)
+    watch.set_defaults(func=cmd_watch)
+
+    apply = subparsers.add_parser("apply", parents=[io], help="Carry out a plan saved by preview --save-plan")
+    apply.add_argument("plan", help="Plan file")
+    apply.add_argument("--workers", type=int,
+                       help=f"Destination directories moved in parallel (default {MoveEngine.DEFAULT_COPY_WORKERS})")
+    apply.add_argument("--on-conflict", choices=COLLISION_POLICIES, default="rename",
+                       help="When a destination name is taken by a different file (see organize)")
+    apply.add_argument("--verify", choices=VERIFY_MODES, default="hash",
+                       help="How copies across devices are checked before the source is deleted: "
+                            "full digest (default), head/tail sample digest, or size only")
+    apply.add_argument("--json", action="store_true", help="Print machine-readable JSON")
+    apply.add_argument("-q", "--quiet", action="store_true", help="Do not print progress")
+    apply.add_argument("--metrics", metavar="PATH", help="Write run metrics to PATH")
+    apply.set_defaults(func=cmd_apply)
+
+    throttle = subparsers.add_parser("throttle", help="Show or change the I/O limits of runs in progress")
+    throttle.add_argument("--io-limit", type=_rate_arg(), metavar="RATE", help="Bytes per second, e.g. 20M; 'off' removes the limit")
+    throttle.add_argument("--ops-limit", type=_rate_arg(_COUNT_UNITS), metavar="N", help="Operations per second; 'off' removes the limit")
+    cache = throttle.add_mutually_exclusive_group()
+    cache.add_argument("--drop-cache", dest="drop_cache", action="store_true", default=None,
+                       help="Drop read files from the page cache")
+    cache.add_argument("--keep-cache", dest="drop_cache", action="store_false",
+                       help="Leave the page cache alone")
+    throttle.add_argument("control", metavar="PATH",
+                          help="Control file given to the running jobs with --throttle-control")
+    throttle.add_argument("--json", action="store_true", help="Print machine-readable JSON")
+    throttle.set_defaults(func=cmd_throttle)
+
+    hash_cache = subparsers.add_parser("cache", help="Show or clear the persistent hash cache")
+    hash_cache.add_argument("--clear", action="store_true", help="Delete every cached digest")
+    hash_cache.add_argument("--cache-path", help="Location of the hash cache database")
+    hash_cache.add_argument("--json", action="store_true", help="Print machine-readable JSON")
+    hash_cache.set_defaults(func=cmd_cache)
+    return parser
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv:
+        from file_organizer_gui import run_gui
+        return run_gui()
+
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return EXIT_USAGE
+    if hasattr(args, "source") and not os.path.isdir(args.source):
+        print(f"Error: source folder not found: {args.source}", file=sys.stderr)
+        return EXIT_USAGE
+    try:
+        return args.func(args)
+    except (OperationCancelled, KeyboardInterrupt):
+        print("\nCancelled. Run the same command again to resume.", file=sys.stderr)
+        return EXIT_CANCELLED
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return EXIT_FAILURE
 
-    def start_organization(self):
-        if not self.validate_inputs(): return
-        
-        self.set_buttons_enabled(False)
-        self.progress_label.setText("Starting file organization...")
-        
-        active_rules = {cat: exts for cat, exts in self.file_types.items() 
-                         if self.rule_checkboxes.get(cat) and self.rule_checkboxes[cat].isChecked()}
-
-        self.organize_thread = OrganizeThread(
-            self.source_entry.text(),
-            self.dest_entry.text(),
-            active_rules,
-            self.file_service
-        )
-        self.organize_thread.progress_signal.connect(self.update_progress)
-        self.organize_thread.finished.connect(self.on_organization_complete)
-        self.organize_thread.start()
-
-    def on_organization_complete(self):
-        self.set_buttons_enabled(True)
-        QMessageBox.information(self, "Complete", "File organization finished!")
-        self.update_file_count(self.source_entry.text())
-
-    def set_buttons_enabled(self, enabled):
-        self.scan_dup_button.setEnabled(enabled)
-        self.preview_button.setEnabled(enabled)
-        self.organize_button.setEnabled(enabled)
-
-    def update_progress(self, message, value, maximum):
-        self.progress_label.setText(message)
-        self.progress_bar.setMaximum(maximum)
-        self.progress_bar.setValue(value)
-
-    def closeEvent(self, event):
-        if hasattr(self, 'scan_thread') and self.scan_thread.isRunning():
-            self.scan_thread.terminate()
-        if hasattr(self, 'organize_thread') and self.organize_thread.isRunning():
-            self.organize_thread.terminate()
-        event.accept()
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    
-    app.setStyle("Fusion") 
-    
-    window = FileOrganizerApp()
-    window.show()
-    
-    sys.exit(app.exec_())
\ No newline at end of file
+    sys.exit(main())
@@ -0,0 +1,1435 @@
+import os
+import sys
+import time
+from PyQt5.QtWidgets import (
+    QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, 
+    QLineEdit, QPushButton, QProgressBar,
+    QCheckBox, QRadioButton, QButtonGroup, QTabWidget, QFileDialog,
+    QMessageBox, QGroupBox, QScrollArea, QSizePolicy, QSpinBox, QTreeView,
+    QAbstractItemView, QComboBox
+)
+from PyQt5.QtCore import (
+    Qt, QThread, pyqtSignal, QAbstractItemModel, QAbstractTableModel, QModelIndex
+)
+from PyQt5.QtGui import QFont, QIcon, QPalette, QColor
+
+from file_organizer import (
+    FileService, HashCache, FolderWatcher, OperationCancelled, DEFAULT_FILE_TYPES, format_size,
+    RuleSet, split_patterns, available_hash_algorithms, perceptual_hash_available, LINK_MODES, DEFAULT_PHASH_DISTANCE,
+    MAX_PHASH_DISTANCE, COLLISION_POLICIES, VERIFY_MODES, OrganizePlan
+)
+
+
+class ScanThread(QThread):
+    progress_signal = pyqtSignal(str, int, int)
+    finished = pyqtSignal(dict)
+    
+    def __init__(self, source, method, enabled, file_service):
+        super().__init__()
+        self.source = source
+        self.method = method
+        self.enabled = enabled
+        self.file_service = file_service
+        self.file_service.cancel_event.clear()
+        self.cancelled = False
+
+    def run(self):
+        if not self.enabled:
+            self.finished.emit({})
+            return
+        
+        try:
+            duplicates = self.file_service.find_duplicates(
+                self.source, 
+                self.method, 
+                progress_callback=self.progress_signal.emit
+            )
+        except OperationCancelled:
+            self.cancelled = True
+            duplicates = {}
+        self.finished.emit(duplicates)
+
+
+class OrganizeThread(QThread):
+    progress_signal = pyqtSignal(str, int, int)
+    finished = pyqtSignal()
+    
+    def __init__(self, source, dest, active_rules, file_service, plan=None):
+        super().__init__()
+        self.source = source
+        self.dest = dest
+        self.active_rules = active_rules
+        self.file_service = file_service
+        self.plan = plan
+        self.file_service.cancel_event.clear()
+        self.cancelled = False
+
+    def run(self):
+        try:
+            if self.plan is not None:
+                self.file_service.apply_plan(self.plan, progress_callback=self.progress_signal.emit)
+            else:
+                self.file_service.organize_files(
+                    self.source,
+                    self.dest,
+                    self.active_rules,
+                    progress_callback=self.progress_signal.emit
+                )
+        except OperationCancelled:
+            self.cancelled = True
+        self.finished.emit()
+
+
+class DeleteThread(QThread):
+    progress_signal = pyqtSignal(str, int, int)
+    finished = pyqtSignal(list)
+
+    def __init__(self, source, relpaths, file_service):
+        super().__init__()
+        self.source = source
+        self.relpaths = relpaths
+        self.file_service = file_service
+        self.file_service.cancel_event.clear()
+
+    def run(self):
+        deleted = self.file_service.delete_files(
+            self.source,
+            self.relpaths,
+            progress_callback=self.progress_signal.emit
+        )
+        self.finished.emit(deleted)
+
+
+class LinkThread(QThread):
+    progress_signal = pyqtSignal(str, int, int)
+    finished = pyqtSignal(dict)
+
+    def __init__(self, source, duplicates, mode, file_service):
+        super().__init__()
+        self.source = source
+        self.duplicates = duplicates
+        self.mode = mode
+        self.file_service = file_service
+        self.file_service.cancel_event.clear()
+
+    def run(self):
+        result = self.file_service.link_duplicates(
+            self.source,
+            self.duplicates,
+            self.mode,
+            progress_callback=self.progress_signal.emit
+        )
+        self.finished.emit(result)
+
+
+class PreviewThread(QThread):
+    batch_signal = pyqtSignal(list, int)
+    finished = pyqtSignal()
+    BATCH_SIZE = 2000
+    BATCH_INTERVAL = 0.1
+
+    def __init__(self, source, dest, active_rules, file_service):
+        super().__init__()
+        self.source = source
+        self.dest = dest
+        self.active_rules = active_rules
+        self.file_service = file_service
+        self.file_service.cancel_event.clear()
+        self.cancelled = False
+        # Kept so the reviewed preview can be saved or applied without classifying again.
+        self.plan = OrganizePlan(source, dest)
+
+    def run(self):
+        rows = []
+        unmatched = 0
+        last_emit = time.monotonic()
+        try:
+            with self.file_service.run_metrics("preview"):
+                for relpath, entry, category, dest_path in self.file_service.plan_moves(
+                        self.source, self.dest, self.active_rules):
+                    self.file_service.check_cancelled()
+                    if category is None:
+                        unmatched += 1
+                        self.plan.unmatched += 1
+                    else:
+                        try:
+                            st = entry.stat()
+                        except OSError:
+                            size = 0
+                        else:
+                            size = st.st_size
+                            self.plan.add(relpath, os.path.join(category, entry.name), size, st.st_mtime_ns)
+                        rows.append((relpath, category, size, dest_path))
+                    now = time.monotonic()
+                    if len(rows) >= self.BATCH_SIZE or now - last_emit >= self.BATCH_INTERVAL:
+                        self.batch_signal.emit(rows, unmatched)
+                        rows, unmatched, last_emit = [], 0, now
+        except OperationCancelled:
+            self.cancelled = True
+        if rows or unmatched:
+            self.batch_signal.emit(rows, unmatched)
+        self.finished.emit()
+
+
+class WatchThread(QThread):
+    event_signal = pyqtSignal(str)
+
+    def __init__(self, source, dest, active_rules, file_service):
+        super().__init__()
+        self.watcher = FolderWatcher(file_service, source, dest, active_rules, on_event=self.event_signal.emit)
+
+    def run(self):
+        self.watcher.run()
+
+    def stop(self):
+        self.watcher.stop()
+
+
+class DuplicateGroupModel(QAbstractItemModel):
+    HEADERS = ["Name", "Size", "Modified Date", "Wasted"]
+    NAME, SIZE, MODIFIED, WASTED = range(4)
+    FETCH_BATCH = 200
+
+    # Top-level rows are groups (internalId 0); file rows carry their group's index + 1.
+    def __init__(self, source_dir, duplicates, group_sizes=None, parent=None):
+        super().__init__(parent)
+        self.source_dir = source_dir
+        # Private copies so deletions can be applied here under begin/endRemoveRows.
+        self.groups = [(key, list(files)) for key, files in duplicates.items()]
+        self.group_sizes = dict(group_sizes or {})
+        # Only content scans report sizes, and only their groups are identical files that can
+        # be linked. Fixed here: a later scan replaces the service's sizes, group_size() adds more.
+        self.linkable = bool(self.group_sizes)
+        self._stat_cache = {}
+        self._filter = ""
+        self._sort = None
+        self.visible = list(range(len(self.groups)))
+        self._loaded = min(self.FETCH_BATCH, len(self.visible))
+        self._row_of = None
+
+    def filepath(self, group, row):
+        return os.path.join(self.source_dir, self.groups[group][1][row])
+
+    def file_stat(self, filepath):
+        if filepath not in self._stat_cache:
+            try:
+                st = os.stat(filepath)
+                self._stat_cache[filepath] = (st.st_size, st.st_mtime)
+            except OSError:
+                self._stat_cache[filepath] = None
+        return self._stat_cache[filepath]
+
+    def group_size(self, group):
+        key, files = self.groups[group]
+        if key not in self.group_sizes:
+            st = self.file_stat(os.path.join(self.source_dir, files[0]))
+            self.group_sizes[key] = st[0] if st else 0
+        return self.group_sizes[key]
+
+    def wasted_bytes(self, group):
+        return self.group_size(group) * (len(self.groups[group][1]) - 1)
+
+    def group_of(self, index):
+        if index.internalId() == 0:
+            return self.visible[index.row()]
+        return index.internalId() - 1
+
+    def index(self, row, column, parent=QModelIndex()):
+        if not self.hasIndex(row, column, parent):
+            return QModelIndex()
+        if not parent.isValid():
+            return self.createIndex(row, column, 0)
+        if parent.internalId() == 0:
+            return self.createIndex(row, column, self.visible[parent.row()] + 1)
+        return QModelIndex()
+
+    def parent(self, index):
+        if not index.isValid() or index.internalId() == 0:
+            return QModelIndex()
+        if self._row_of is None:
+            self._row_of = {group: row for row, group in enumerate(self.visible)}
+        return self.createIndex(self._row_of[index.internalId() - 1], 0, 0)
+
+    def rowCount(self, parent=QModelIndex()):
+        if not parent.isValid():
+            return self._loaded
+        if parent.internalId() == 0 and parent.column() == 0:
+            return len(self.groups[self.visible[parent.row()]][1])
+        return 0
+
+    def canFetchMore(self, parent):
+        return not parent.isValid() and self._loaded < len(self.visible)
+
+    def fetchMore(self, parent):
+        if parent.isValid():
+            return
+        count = min(self.FETCH_BATCH, len(self.visible) - self._loaded)
+        self.beginInsertRows(QModelIndex(), self._loaded, self._loaded + count - 1)
+        self._loaded += count
+        self.endInsertRows()
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        column = index.column()
+        if index.internalId() == 0:
+            group = self.visible[index.row()]
+            key, files = self.groups[group]
+            if role == Qt.DisplayRole:
+                if column == self.NAME:
+                    return f"{key[:16]}... ({len(files)} files)" if len(key) > 16 else f"{key} ({len(files)} files)"
+                if column == self.SIZE:
+                    return format_size(self.group_size(group))
+                if column == self.WASTED:
+                    return format_size(self.wasted_bytes(group))
+            return None
+
+        group = index.internalId() - 1
+        filepath = self.filepath(group, index.row())
+        if role == Qt.UserRole:
+            return filepath
+        if role == Qt.DisplayRole:
+            if column == self.NAME:
+                return self.groups[group][1][index.row()]
+            st = self.file_stat(filepath)
+            if st is None:
+                return "(missing)" if column == self.SIZE else None
+            if column == self.SIZE:
+                return format_size(st[0])
+            if column == self.MODIFIED:
+                return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(st[1]))
+        return None
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self._sort = (column, order)
+        self.beginResetModel()
+        self._apply_sort()
+        self._loaded = min(self.FETCH_BATCH, len(self.visible))
+        self.endResetModel()
+
+    def _apply_sort(self):
+        if self._sort is None:
+            return
+        column, order = self._sort
+        if column == self.WASTED:
+            key = self.wasted_bytes
+        elif column == self.SIZE:
+            key = self.group_size
+        elif column == self.NAME:
+            key = lambda group: self.groups[group][0]
+        else:
+            key = lambda group: len(self.groups[group][1])
+        self.visible.sort(key=key, reverse=order == Qt.DescendingOrder)
+        self._row_of = None
+
+    def set_filter(self, text):
+        self._filter = text.strip().lower()
+        self.beginResetModel()
+        if self._filter:
+            needle = self._filter
+            self.visible = [
+                group for group, (key, files) in enumerate(self.groups)
+                if len(files) > 1 and (needle in key.lower() or any(needle in f.lower() for f in files))
+            ]
+        else:
+            self.visible = [group for group, (_, files) in enumerate(self.groups) if len(files) > 1]
+        self._apply_sort()
+        self._loaded = min(self.FETCH_BATCH, len(self.visible))
+        self._row_of = None
+        self.endResetModel()
+
+    def remove_files(self, removed):
+        # removed maps group index -> set of relpaths; only those groups' rows are touched.
+        row_of = {group: row for row, group in enumerate(self.visible)}
+        dissolved = []
+        for group, gone in removed.items():
+            files = self.groups[group][1]
+            row = row_of.get(group)
+            if row is not None and row < self._loaded:
+                parent = self.createIndex(row, 0, 0)
+                for i in reversed(range(len(files))):
+                    if files[i] in gone:
+                        self.beginRemoveRows(parent, i, i)
+                        del files[i]
+                        self.endRemoveRows()
+                self.dataChanged.emit(parent, self.createIndex(row, self.WASTED, 0))
+            else:
+                files[:] = [f for f in files if f not in gone]
+            for relpath in gone:
+                self._stat_cache.pop(os.path.join(self.source_dir, relpath), None)
+            if len(files) < 2 and row is not None:
+                dissolved.append(row)
+
+        if len(dissolved) > self.FETCH_BATCH:
+            # Row-by-row removal would rebuild the parent map each time; a reset is cheaper.
+            self.beginResetModel()
+            self.visible = [group for group in self.visible if len(self.groups[group][1]) > 1]
+            self._loaded = min(max(self._loaded, self.FETCH_BATCH), len(self.visible))
+            self._row_of = None
+            self.endResetModel()
+            return
+        for row in sorted(dissolved, reverse=True):
+            if row < self._loaded:
+                self.beginRemoveRows(QModelIndex(), row, row)
+                del self.visible[row]
+                self._loaded -= 1
+                self._row_of = None
+                self.endRemoveRows()
+            else:
+                del self.visible[row]
+                self._row_of = None
+
+
+class PreviewModel(QAbstractTableModel):
+    HEADERS = ["Filename", "Category", "Size", "New Location"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+        value = self.rows[index.row()][index.column()]
+        return format_size(value) if index.column() == 2 else value
+
+    def append_rows(self, rows):
+        if not rows:
+            return
+        start = len(self.rows)
+        self.beginInsertRows(QModelIndex(), start, start + len(rows) - 1)
+        self.rows.extend(rows)
+        self.endInsertRows()
+
+
+class PreviewWindow(QMainWindow):
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.parent_app = parent
+        self.category_counts = {}
+        self.total_bytes = 0
+        self.unmatched = 0
+        self.running = True
+
+        self.setWindowTitle("Organization Preview")
+        self.resize(900, 600)
+
+        central = QWidget()
+        layout = QVBoxLayout(central)
+        self.summary_label = QLabel("Scanning...")
+        self.summary_label.setWordWrap(True)
+        layout.addWidget(self.summary_label)
+
+        self.model = PreviewModel(self)
+        self.view = QTreeView()
+        self.view.setRootIsDecorated(False)
+        self.view.setUniformRowHeights(True)
+        self.view.setModel(self.model)
+        self.view.header().resizeSection(0, 260)
+
+        self.tab_widget = QTabWidget()
+        self.tab_widget.addTab(self.view, "Files to be Organized (0)")
+        layout.addWidget(self.tab_widget, 1)
+
+        self.plan = None
+        plan_layout = QHBoxLayout()
+        plan_layout.addStretch()
+        self.save_plan_button = QPushButton("Save Plan...")
+        self.save_plan_button.setToolTip("Save these moves as a JSON lines file to review, diff or apply later")
+        self.save_plan_button.clicked.connect(self.save_plan)
+        self.save_plan_button.setEnabled(False)
+        plan_layout.addWidget(self.save_plan_button)
+        self.apply_plan_button = QPushButton("Apply Plan")
+        self.apply_plan_button.setToolTip("Carry out exactly these moves")
+        self.apply_plan_button.clicked.connect(self.apply_plan)
+        self.apply_plan_button.setEnabled(False)
+        plan_layout.addWidget(self.apply_plan_button)
+        layout.addLayout(plan_layout)
+        self.setCentralWidget(central)
+
+    def add_batch(self, rows, unmatched):
+        self.model.append_rows(rows)
+        for _, category, size, _ in rows:
+            self.category_counts[category] = self.category_counts.get(category, 0) + 1
+            self.total_bytes += size
+        self.unmatched += unmatched
+        self.tab_widget.setTabText(0, f"Files to be Organized ({len(self.model.rows)})")
+        self._update_summary()
+
+    def finish(self, cancelled, plan=None):
+        self.running = False
+        self._update_summary("Preview cancelled. " if cancelled else "")
+        if not cancelled and plan is not None and len(plan):
+            self.plan = plan
+            self.save_plan_button.setEnabled(True)
+            self.apply_plan_button.setEnabled(True)
+
+    def save_plan(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Save Plan", "organize-plan.jsonl", "Organize plan (*.jsonl)")
+        if not path:
+            return
+        try:
+            self.plan.save(path)
+        except OSError as e:
+            QMessageBox.critical(self, "Error", f"Could not save the plan: {e}")
+
+    def apply_plan(self):
+        self.parent_app.apply_plan(self.plan)
+        self.close()
+
+    def _update_summary(self, prefix=""):
+        categories = ", ".join(f"{cat}: {count}" for cat, count in sorted(self.category_counts.items()))
+        status = "Scanning... " if self.running else prefix
+        self.summary_label.setText(
+            f"{status}{len(self.model.rows)} files ({format_size(self.total_bytes)}) to organize, "
+            f"{self.unmatched} unmatched. {categories}"
+        )
+
+    def closeEvent(self, event):
+        if self.running:
+            self.parent_app.file_service.cancel()
+        event.accept()
+
+
+class DuplicateWindow(QMainWindow):
+    def __init__(self, parent, source_dir, duplicates, file_service):
+        super().__init__(parent)
+        self.source_dir = source_dir
+        self.duplicates_data = duplicates
+        self.file_service = file_service
+        self.parent_app = parent
+        self.busy = False
+        self._worker = None
+        self._pending_groups = {}
+        
+        self.setWindowTitle("Duplicate Files Management")
+        self.resize(900, 650)
+        self.central_widget = QWidget()
+        self.setCentralWidget(self.central_widget)
+        main_layout = QVBoxLayout(self.central_widget)
+
+        self.summary_label = QLabel(f"{len(duplicates)} duplicate groups")
+        main_layout.addWidget(self.summary_label)
+
+        self.filter_entry = QLineEdit()
+        self.filter_entry.setPlaceholderText("Filter by filename or hash...")
+        self.filter_entry.textChanged.connect(self._apply_filter)
+        main_layout.addWidget(self.filter_entry)
+        
+        self.model = DuplicateGroupModel(source_dir, duplicates, file_service.duplicate_sizes, self)
+        self.view = QTreeView()
+        self.view.setUniformRowHeights(True)
+        self.view.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.view.setModel(self.model)
+        self.view.header().resizeSection(DuplicateGroupModel.NAME, 420)
+        if self.model.linkable:
+            self.view.header().setSortIndicator(DuplicateGroupModel.WASTED, Qt.DescendingOrder)
+        else:
+            self.view.header().setSortIndicator(DuplicateGroupModel.NAME, Qt.AscendingOrder)
+        self.view.setSortingEnabled(True)
+        main_layout.addWidget(self.view, 1)
+
+        button_layout = QHBoxLayout()
+        self.delete_all_button = QPushButton("Delete All But First")
+        self.delete_all_button.setToolTip("Keep the first file of each selected group and delete the rest")
+        self.delete_all_button.clicked.connect(self._delete_duplicates_in_selected_groups)
+        button_layout.addWidget(self.delete_all_button)
+
+        self.delete_selected_button = QPushButton("Delete Selected")
+        self.delete_selected_button.clicked.connect(self._delete_selected_duplicates)
+        button_layout.addWidget(self.delete_selected_button)
+
+        # Linking is only offered for content scans: name matches are not identical files.
+        self.link_mode_combo = QComboBox()
+        self.link_mode_combo.addItems(LINK_MODES)
+        self.link_mode_combo.setToolTip("auto: reflink (copy-on-write) where the filesystem supports it, else hardlink")
+        self.link_button = QPushButton("Replace With Links")
+        self.link_button.setToolTip("Keep the first file of each selected group and turn the rest into links to it")
+        self.link_button.clicked.connect(self._link_duplicates_in_selected_groups)
+        self.link_mode_combo.setEnabled(self.model.linkable)
+        self.link_button.setEnabled(self.model.linkable)
+        button_layout.addWidget(self.link_mode_combo)
+        button_layout.addWidget(self.link_button)
+        main_layout.addLayout(button_layout)
+
+    def _apply_filter(self, text):
+        self.model.set_filter(text)
+        self._update_summary()
+
+    def _update_summary(self):
+        self.summary_label.setText(f"{len(self.model.visible)} of {len(self.duplicates_data)} duplicate groups")
+
+    def _selected_groups(self):
+        return sorted({self.model.group_of(index) for index in self.view.selectionModel().selectedRows()})
+
+    def _delete_duplicates_in_selected_groups(self):
+        to_delete = []
+        for group in self._selected_groups():
+            to_delete.extend((group, relpath) for relpath in self.model.groups[group][1][1:])
+        self._execute_deletion(to_delete)
+
+    def _delete_selected_duplicates(self):
+        to_delete = []
+        for index in self.view.selectionModel().selectedRows():
+            if index.internalId() != 0:
+                group = index.internalId() - 1
+                to_delete.append((group, self.model.groups[group][1][index.row()]))
+        self._execute_deletion(to_delete)
+
+    def _execute_deletion(self, file_list):
+        if not file_list: return
+        
+        confirm = QMessageBox.question(self, "Confirm Deletion", f"Permanently delete {len(file_list)} files?", QMessageBox.Yes | QMessageBox.No)
+        if confirm != QMessageBox.Yes: return
+
+        self._pending_groups = {relpath: group for group, relpath in file_list}
+        app = self.parent_app
+        app.delete_thread = DeleteThread(self.source_dir, [relpath for _, relpath in file_list], self.file_service)
+        app.delete_thread.finished.connect(self._on_deletion_complete)
+        self._start_worker(app.delete_thread)
+
+    def _link_duplicates_in_selected_groups(self):
+        groups = self._selected_groups()
+        selected = {self.model.groups[group][0]: list(self.model.groups[group][1]) for group in groups}
+        count = sum(len(files) - 1 for files in selected.values())
+        if not count: return
+
+        mode = self.link_mode_combo.currentText()
+        confirm = QMessageBox.question(
+            self, "Confirm Linking",
+            f"Replace {count} files with {mode} links to the first file of their group?\n"
+            "Hardlinked paths share one copy, so editing one changes all of them.",
+            QMessageBox.Yes | QMessageBox.No
+        )
+        if confirm != QMessageBox.Yes: return
+
+        self._pending_groups = {relpath: group for group in groups for relpath in self.model.groups[group][1]}
+        app = self.parent_app
+        app.link_thread = LinkThread(self.source_dir, selected, mode, self.file_service)
+        app.link_thread.finished.connect(self._on_link_complete)
+        self._start_worker(app.link_thread)
+
+    def _start_worker(self, thread):
+        app = self.parent_app
+        self._set_busy(True)
+        app.set_buttons_enabled(False)
+        thread.progress_signal.connect(app.update_progress)
+        self._worker = thread
+        thread.start()
+
+    def _set_busy(self, busy):
+        self.busy = busy
+        idle = not busy and not self.parent_app.is_watching()
+        self.delete_all_button.setEnabled(idle)
+        self.delete_selected_button.setEnabled(idle)
+        self.link_button.setEnabled(idle and self.model.linkable)
+
+    def _remove_from_view(self, relpaths):
+        # Apply the result to the open groups instead of rescanning the whole tree.
+        removed = {}
+        for relpath in relpaths:
+            removed.setdefault(self._pending_groups[relpath], set()).add(relpath)
+        self._pending_groups = {}
+        self.view.selectionModel().clear()
+        self.model.remove_files(removed)
+        self.file_service.prune_duplicates(
+            self.duplicates_data, {self.model.groups[group][0]: gone for group, gone in removed.items()}
+        )
+        self._set_busy(False)
+        self._update_summary()
+        self.parent_app.set_buttons_enabled(True)
+
+    def _on_deletion_complete(self, deleted):
+        self._remove_from_view(deleted)
+        requested = len(self._worker.relpaths)
+        note = f"Deleted {len(deleted)} of {requested} files." if len(deleted) < requested else f"Deleted {len(deleted)} files."
+        self.parent_app.progress_label.setText(f"{note} {len(self.duplicates_data)} duplicate groups remain.")
+
+    def _on_link_complete(self, result):
+        # Linked files no longer waste space, so they leave their group like deleted ones.
+        self._remove_from_view(result["linked"])
+        failed = f", {result['failed']} failed" if result["failed"] else ""
+        self.parent_app.progress_label.setText(
+            f"Hardlinked {result['hardlinked']}, reflinked {result['reflinked']}{failed}; "
+            f"saved {format_size(result['bytes_saved'])}. {len(self.duplicates_data)} duplicate groups remain."
+        )
+
+    def closeEvent(self, event):
+        if self.busy:
+            self.file_service.cancel()
+            self._worker.wait()
+        event.accept()
+
+
+class FileOrganizerApp(QMainWindow):
+    def __init__(self):
+        super().__init__()
+        
+        self.file_types = {cat: list(exts) for cat, exts in DEFAULT_FILE_TYPES.items()}
+        self.rule_checkboxes = {}
+        self.dark_mode = True
+        self.preview_window = None
+        self.duplicates_window = None
+        
+        self.hash_cache = HashCache()
+        self.file_service = FileService(self.file_types, self.hash_cache) 
+        
+        self.setWindowTitle("File Organizer Pro")
+        self.setWindowIcon(QIcon("icon.png")) 
+        self.resize(1200, 800)
+        
+        self.setup_theme()
+        self.apply_qss()
+        
+        self.central_widget = QWidget()
+        self.setCentralWidget(self.central_widget)
+        self.main_layout = QHBoxLayout(self.central_widget)
+        self.main_layout.setContentsMargins(0, 0, 0, 0)
+        
+        self.create_side_panel()
+        self.create_main_panel()
+
+    def setup_theme(self):
+        palette = QPalette()
+        ACCENT = QColor(0, 150, 255)
+        
+        if self.dark_mode:
+            BG = QColor(30, 30, 30)
+            FG = Qt.white
+            ALT = QColor(40, 40, 40)
+            BASE = QColor(20, 20, 20)
+        else:
+            BG = QColor(240, 240, 240)
+            FG = Qt.black
+            ALT = QColor(220, 220, 220)
+            BASE = Qt.white
+
+        palette.setColor(QPalette.Window, BG)
+        palette.setColor(QPalette.WindowText, FG)
+        palette.setColor(QPalette.Base, BASE)
+        palette.setColor(QPalette.AlternateBase, ALT)
+        palette.setColor(QPalette.Text, FG)
+        palette.setColor(QPalette.Button, ALT)
+        palette.setColor(QPalette.ButtonText, FG)
+        palette.setColor(QPalette.Highlight, ACCENT)
+        palette.setColor(QPalette.HighlightedText, Qt.white)
+        
+        QApplication.setPalette(palette)
+
+    def apply_qss(self):
+        qss = """
+        QMainWindow, QWidget {
+            background-color: rgb(30, 30, 30);
+            color: white;
+            font-family: "Segoe UI", sans-serif;
+        }
+        
+        #SidePanel { 
+            background-color: rgb(35, 35, 35); 
+            border-right: 1px solid rgb(50, 50, 50);
+        }
+        QGroupBox {
+            font-weight: bold;
+            font-size: 13px;
+            margin-top: 15px;
+            border: 1px solid rgb(50, 50, 50);
+            border-radius: 8px;
+            padding-top: 20px;
+        }
+
+        QLineEdit {
+            padding: 8px;
+            border: 1px solid rgb(70, 70, 70);
+            border-radius: 4px;
+            background-color: rgb(40, 40, 40);
+        }
+        
+        QPushButton {
+            padding: 10px 15px;
+            border-radius: 5px;
+            background-color: rgb(60, 60, 60);
+            color: white;
+            font-weight: 500;
+        }
+        QPushButton:hover {
+            background-color: rgb(80, 80, 80);
+        }
+
+        #OrganizeButton { 
+            background-color: #4CAF50;
+            font-weight: bold;
+        }
+        #OrganizeButton:hover {
+            background-color: #5cb860;
+        }
+        
+        QProgressBar {
+            text-align: center;
+            border: 1px solid rgb(50, 50, 50);
+            border-radius: 5px;
+            background-color: rgb(40, 40, 40);
+            color: white;
+            font-weight: bold;
+        }
+        QProgressBar::chunk {
+            background-color: rgb(0, 150, 255);
+            border-radius: 5px;
+        }
+        
+        QTreeView {
+            background-color: rgb(35, 35, 35);
+            alternate-background-color: rgb(40, 40, 40);
+            border: 1px solid rgb(50, 50, 50);
+        }
+        QTreeView::item:selected {
+            background-color: rgb(0, 150, 255);
+        }
+        """
+        self.setStyleSheet(qss)
+        
+    def create_side_panel(self):
+        side_panel = QWidget()
+        side_panel.setObjectName("SidePanel")
+        side_panel.setFixedWidth(400)
+        side_layout = QVBoxLayout(side_panel)
+        side_layout.setContentsMargins(15, 20, 15, 15)
+        side_layout.setSpacing(15)
+
+        self.create_header(side_layout)
+        self.create_folder_selectors(side_layout)
+        self.create_options_section(side_layout)
+        self.create_rules_section(side_layout)
+        
+        self.main_layout.addWidget(side_panel)
+
+    def create_main_panel(self):
+        main_panel = QWidget()
+        main_layout = QVBoxLayout(main_panel)
+        main_layout.setContentsMargins(20, 20, 20, 20)
+        main_layout.setSpacing(20)
+
+        status_group = QGroupBox("Operation Status & Progress")
+        status_layout = QVBoxLayout(status_group)
+        self.create_progress_bar(status_layout)
+        status_group.setLayout(status_layout)
+        main_layout.addWidget(status_group)
+        
+        self.tab_widget = QTabWidget()
+        self.tab_widget.addTab(QWidget(), "Organization Log")
+        main_layout.addWidget(self.tab_widget, 1)
+
+        self.create_action_buttons(main_layout)
+        
+        self.main_layout.addWidget(main_panel, 1)
+
+    def create_header(self, parent_layout):
+        header = QLabel("File Organizer Pro")
+        header.setFont(QFont("Segoe UI", 20, QFont.ExtraBold))
+        header.setAlignment(Qt.AlignCenter)
+        header.setStyleSheet("color: rgb(0, 150, 255); margin-bottom: 5px;")
+        parent_layout.addWidget(header)
+        
+        tagline = QLabel("Smartly sort and manage your digital workspace.")
+        tagline.setAlignment(Qt.AlignCenter)
+        tagline.setStyleSheet("color: rgb(180, 180, 180); font-size: 10pt; margin-bottom: 10px;")
+        parent_layout.addWidget(tagline)
+        
+    def create_folder_selectors(self, parent_layout):
+        source_group = QGroupBox("Source Folder")
+        source_layout = QHBoxLayout()
+        self.source_entry = QLineEdit()
+        self.source_entry.setPlaceholderText("Select folder to organize...")
+        source_layout.addWidget(self.source_entry, 1)
+        source_button = QPushButton("Browse")
+        source_button.clicked.connect(self.select_source)
+        source_layout.addWidget(source_button)
+        source_group.setLayout(source_layout)
+        parent_layout.addWidget(source_group)
+        
+        dest_group = QGroupBox("Destination Root")
+        dest_layout = QHBoxLayout()
+        self.dest_entry = QLineEdit()
+        self.dest_entry.setPlaceholderText("Select root folder for categorized files...")
+        dest_layout.addWidget(self.dest_entry, 1)
+        dest_button = QPushButton("Browse")
+        dest_button.clicked.connect(self.select_destination)
+        dest_layout.addWidget(dest_button)
+        dest_group.setLayout(dest_layout)
+        parent_layout.addWidget(dest_group)
+
+    def create_options_section(self, parent_layout):
+        options_group = QGroupBox("Optimization & Duplicate Options")
+        options_layout = QVBoxLayout()
+        
+        self.dup_check = QCheckBox("Enable duplicate detection (Recommended)")
+        self.dup_check.setChecked(True)
+        options_layout.addWidget(self.dup_check)
+        
+        method_group = QButtonGroup(self)
+        self.dup_name_radio = QRadioButton("Filename Only (Fast)")
+        self.dup_content_radio = QRadioButton("File Content (Accurate)")
+        self.dup_image_radio = QRadioButton("Similar Images, max difference:")
+        self.dup_content_radio.setChecked(True)
+        method_group.addButton(self.dup_name_radio)
+        method_group.addButton(self.dup_content_radio)
+        method_group.addButton(self.dup_image_radio)
+        self.phash_spin = QSpinBox()
+        self.phash_spin.setRange(0, MAX_PHASH_DISTANCE)
+        self.phash_spin.setValue(DEFAULT_PHASH_DISTANCE)
+        self.phash_spin.setSuffix(" bits")
+        self.phash_spin.setToolTip("How many of the 64 perceptual-hash bits may differ between re-encoded or resized copies")
+        if not perceptual_hash_available():
+            self.dup_image_radio.setEnabled(False)
+            self.dup_image_radio.setToolTip("Install Pillow and NumPy to find re-encoded or resized copies of images")
+            self.phash_spin.setEnabled(False)
+        
+        method_layout = QHBoxLayout()
+        method_layout.addWidget(self.dup_name_radio)
+        method_layout.addWidget(self.dup_content_radio)
+        method_layout.addWidget(self.dup_image_radio)
+        method_layout.addWidget(self.phash_spin)
+        method_layout.addStretch()
+        
+        options_layout.addLayout(method_layout)
+
+        walk_layout = QHBoxLayout()
+        self.recursive_check = QCheckBox("Include subfolders, depth:")
+        walk_layout.addWidget(self.recursive_check)
+        self.depth_spin = QSpinBox()
+        self.depth_spin.setRange(0, 999)
+        self.depth_spin.setSpecialValueText("Unlimited")
+        walk_layout.addWidget(self.depth_spin)
+        self.follow_links_check = QCheckBox("Follow symlinks")
+        walk_layout.addWidget(self.follow_links_check)
+        self.pipeline_check = QCheckBox("Pipelined I/O")
+        self.pipeline_check.setToolTip("Overlap folder listing, stat, hashing and moves; "
+                                       "much faster on network shares")
+        walk_layout.addWidget(self.pipeline_check)
+        walk_layout.addWidget(QLabel("If a file exists:"))
+        self.collision_combo = QComboBox()
+        self.collision_combo.addItems(COLLISION_POLICIES)
+        self.collision_combo.setCurrentText(self.file_service.move_engine.collisions)
+        self.collision_combo.setToolTip("Identical files are never copied again; this decides what "
+                                        "happens when a different file already has the same name")
+        walk_layout.addWidget(self.collision_combo)
+        walk_layout.addWidget(QLabel("Verify copies:"))
+        self.verify_combo = QComboBox()
+        self.verify_combo.addItems(VERIFY_MODES)
+        self.verify_combo.setCurrentText(self.file_service.move_engine.verify)
+        self.verify_combo.setToolTip("How a copy to another drive is checked before the original is deleted: "
+                                     "full digest, head/tail sample digest, or size only")
+        walk_layout.addWidget(self.verify_combo)
+        walk_layout.addStretch()
+        options_layout.addLayout(walk_layout)
+
+        self.exclude_entry = QLineEdit()
+        self.exclude_entry.setPlaceholderText("Exclude patterns: *.tmp, .git, node_modules, ...")
+        options_layout.addWidget(self.exclude_entry)
+
+        workers_layout = QHBoxLayout()
+        workers_layout.addWidget(QLabel("Parallel hash workers:"))
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, 64)
+        self.workers_spin.setValue(self.file_service.max_workers)
+        workers_layout.addWidget(self.workers_spin)
+        workers_layout.addWidget(QLabel("Hash:"))
+        self.hash_combo = QComboBox()
+        self.hash_combo.addItems(available_hash_algorithms())
+        self.hash_combo.setCurrentText(self.file_service.hash_algorithm)
+        workers_layout.addWidget(self.hash_combo)
+        workers_layout.addStretch()
+        options_layout.addLayout(workers_layout)
+
+        # These apply immediately, also to a scan or organize run already in progress.
+        io_layout = QHBoxLayout()
+        io_layout.addWidget(QLabel("I/O limit:"))
+        self.io_limit_spin = QSpinBox()
+        self.io_limit_spin.setRange(0, 100000)
+        self.io_limit_spin.setSuffix(" MB/s")
+        self.io_limit_spin.setSpecialValueText("Unlimited")
+        self.io_limit_spin.valueChanged.connect(self.apply_io_limits)
+        io_layout.addWidget(self.io_limit_spin)
+        self.ops_limit_spin = QSpinBox()
+        self.ops_limit_spin.setRange(0, 1000000)
+        self.ops_limit_spin.setSuffix(" ops/s")
+        self.ops_limit_spin.setSpecialValueText("Unlimited")
+        self.ops_limit_spin.valueChanged.connect(self.apply_io_limits)
+        io_layout.addWidget(self.ops_limit_spin)
+        self.drop_cache_check = QCheckBox("Keep page cache clean")
+        self.drop_cache_check.setToolTip("Drop hashed and copied files from the OS page cache after reading them")
+        self.drop_cache_check.toggled.connect(self.apply_io_limits)
+        io_layout.addWidget(self.drop_cache_check)
+        self.low_priority_check = QCheckBox("Low priority")
+        self.low_priority_check.setToolTip("Run scans and moves with lower CPU and disk priority (Linux); "
+                                           "takes effect from the next run")
+        io_layout.addWidget(self.low_priority_check)
+        io_layout.addStretch()
+        options_layout.addLayout(io_layout)
+
+        cache_layout = QHBoxLayout()
+        self.cache_label = QLabel()
+        cache_layout.addWidget(self.cache_label, 1)
+        clear_cache_button = QPushButton("Clear Hash Cache")
+        clear_cache_button.clicked.connect(self.clear_hash_cache)
+        cache_layout.addWidget(clear_cache_button)
+        options_layout.addLayout(cache_layout)
+        self.update_cache_label()
+
+        options_group.setLayout(options_layout)
+        parent_layout.addWidget(options_group)
+
+    def apply_walk_options(self):
+        if self.recursive_check.isChecked():
+            self.file_service.max_depth = self.depth_spin.value() or None
+        else:
+            self.file_service.max_depth = 0
+        self.file_service.symlink_policy = "follow" if self.follow_links_check.isChecked() else "files"
+        self.file_service.exclude_patterns = [p.strip() for p in self.exclude_entry.text().split(',') if p.strip()]
+        self.file_service.pipelined = self.pipeline_check.isChecked()
+        self.file_service.move_engine.collisions = self.collision_combo.currentText()
+        self.file_service.move_engine.verify = self.verify_combo.currentText()
+        self.file_service.low_priority = self.low_priority_check.isChecked()
+
+    def apply_io_limits(self):
+        throttle = self.file_service.throttle
+        throttle.set_limits(self.io_limit_spin.value() * 1024 * 1024, self.ops_limit_spin.value())
+        throttle.drop_cache = self.drop_cache_check.isChecked()
+
+    def update_cache_label(self):
+        if not self.hash_cache.enabled:
+            self.cache_label.setText("Hash cache unavailable")
+            return
+        stats = self.hash_cache.stats()
+        self.cache_label.setText(f"Hash cache: {stats['entries']} entries, {stats['hit_rate']:.0%} hit rate")
+
+    def clear_hash_cache(self):
+        self.hash_cache.clear()
+        self.update_cache_label()
+        self.progress_label.setText("Hash cache cleared.")
+
+    def create_rules_section(self, parent_layout):
+        rules_group = QGroupBox("Active Organization Rules")
+        parent_layout.addWidget(rules_group, 1)
+        
+        scroll = QScrollArea()
+        scroll.setWidgetResizable(True)
+        scroll.setFrameShape(QScrollArea.NoFrame)
+        
+        rules_content = QWidget()
+        self.rules_layout = QVBoxLayout(rules_content)
+        self.rules_layout.setAlignment(Qt.AlignTop)
+        
+        for category, extensions in self.file_types.items():
+            cb = QCheckBox(f"**{category}** ({', '.join(extensions)})")
+            cb.setChecked(True)
+            self.rules_layout.addWidget(cb)
+            self.rule_checkboxes[category] = cb
+        
+        custom_group = QGroupBox("Add Custom Rule")
+        custom_layout = QHBoxLayout()
+        self.custom_category = QLineEdit()
+        self.custom_category.setPlaceholderText("New Category Name")
+        self.custom_extensions = QLineEdit()
+        self.custom_extensions.setPlaceholderText(".ext, IMG_*.jpg, re:^\\d{8}, *.log age>30d, size>1G")
+        add_button = QPushButton("Add")
+        add_button.clicked.connect(self.add_custom_rule)
+        
+        custom_layout.addWidget(self.custom_category)
+        custom_layout.addWidget(self.custom_extensions)
+        custom_layout.addWidget(add_button)
+        
+        custom_group.setLayout(custom_layout)
+        self.rules_layout.addWidget(custom_group)
+        
+        self.rules_layout.addStretch()
+        scroll.setWidget(rules_content)
+        rules_group.setLayout(QVBoxLayout())
+        rules_group.layout().addWidget(scroll)
+
+    def create_action_buttons(self, parent_layout):
+        button_layout = QHBoxLayout()
+        
+        self.scan_dup_button = QPushButton("🔍 Scan for Duplicates")
+        self.scan_dup_button.clicked.connect(self.scan_duplicates)
+        button_layout.addWidget(self.scan_dup_button)
+        
+        self.preview_button = QPushButton("📊 Preview Changes")
+        self.preview_button.clicked.connect(self.preview_changes)
+        button_layout.addWidget(self.preview_button)
+        
+        self.organize_button = QPushButton("🚀 Organize Files")
+        self.organize_button.setObjectName("OrganizeButton")
+        self.organize_button.clicked.connect(self.start_organization)
+        button_layout.addWidget(self.organize_button)
+
+        self.apply_plan_button = QPushButton("📋 Apply Saved Plan...")
+        self.apply_plan_button.setToolTip("Carry out a plan saved from the preview window")
+        self.apply_plan_button.clicked.connect(self.apply_saved_plan)
+        button_layout.addWidget(self.apply_plan_button)
+
+        self.watch_button = QPushButton("👁 Watch Folder")
+        self.watch_button.setCheckable(True)
+        self.watch_button.toggled.connect(self.toggle_watch)
+        button_layout.addWidget(self.watch_button)
+
+        self.cancel_button = QPushButton("✖ Cancel")
+        self.cancel_button.setEnabled(False)
+        self.cancel_button.clicked.connect(self.cancel_operation)
+        button_layout.addWidget(self.cancel_button)
+        
+        parent_layout.addLayout(button_layout)
+        
+    def create_progress_bar(self, parent_layout):
+        self.progress_label = QLabel("Ready. Select your source folder to begin.")
+        self.progress_label.setAlignment(Qt.AlignCenter)
+        self.progress_label.setFont(QFont("Segoe UI", 10))
+        parent_layout.addWidget(self.progress_label)
+        
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setTextVisible(True)
+        parent_layout.addWidget(self.progress_bar)
+
+        metrics_layout = QHBoxLayout()
+        self.metrics_label = QLabel("")
+        self.metrics_label.setWordWrap(True)
+        metrics_layout.addWidget(self.metrics_label, 1)
+        self.export_metrics_button = QPushButton("Export Metrics...")
+        self.export_metrics_button.setToolTip("Save the last run's timings and counters as JSON or a Prometheus textfile (.prom)")
+        self.export_metrics_button.clicked.connect(self.export_metrics)
+        self.export_metrics_button.setEnabled(False)
+        metrics_layout.addWidget(self.export_metrics_button)
+        parent_layout.addLayout(metrics_layout)
+
+    def select_source(self):
+        folder = QFileDialog.getExistingDirectory(self, "Select Source Folder")
+        if folder:
+            self.source_entry.setText(folder)
+            self.update_file_count(folder)
+
+    def update_file_count(self, source_folder):
+        if not os.path.exists(source_folder):
+            self.progress_label.setText("Source folder not found.")
+            return
+
+        try:
+            file_count = sum(1 for entry in os.scandir(source_folder) if entry.is_file())
+            self.progress_label.setText(f"**Ready.** Found **{file_count}** files in source directory.")
+        except Exception:
+            self.progress_label.setText("Error reading file count.")
+
+    def select_destination(self):
+        folder = QFileDialog.getExistingDirectory(self, "Select Destination Folder")
+        if folder:
+            self.dest_entry.setText(folder)
+
+    def add_custom_rule(self):
+        category = self.custom_category.text().strip()
+        extensions = split_patterns(self.custom_extensions.text())
+        
+        if not category or not extensions:
+            QMessageBox.critical(self, "Error", "Please enter both category name and extensions.")
+            return
+        try:
+            RuleSet({category: extensions})
+        except ValueError as e:
+            QMessageBox.critical(self, "Error", str(e))
+            return
+        
+        self.file_types[category] = extensions
+        cb = QCheckBox(f"**{category}** ({', '.join(extensions)})")
+        cb.setChecked(True)
+        self.rules_layout.insertWidget(self.rules_layout.count() - 2, cb) 
+        self.rule_checkboxes[category] = cb
+        
+        self.custom_category.clear()
+        self.custom_extensions.clear()
+        QMessageBox.information(self, "Success", f"Custom rule '{category}' added.")
+
+
+    def get_active_rules(self):
+        return {cat: exts for cat, exts in self.file_types.items() 
+                if self.rule_checkboxes.get(cat) and self.rule_checkboxes[cat].isChecked()}
+
+    def validate_inputs(self, require_dest=True):
+        source = self.source_entry.text()
+        dest = self.dest_entry.text()
+        
+        if not source or (require_dest and not dest):
+            QMessageBox.critical(self, "Error", "Please select both source and destination folders.")
+            return False
+        
+        if require_dest and source == dest:
+            QMessageBox.critical(self, "Error", "Source and destination folders cannot be the same.")
+            return False
+            
+        return True
+
+    def scan_duplicates(self):
+        if not self.validate_inputs(require_dest=False): return
+        
+        source = self.source_entry.text()
+        if self.dup_image_radio.isChecked():
+            method = "perceptual"
+        else:
+            method = "content" if self.dup_content_radio.isChecked() else "name"
+        self.file_service.phash_distance = self.phash_spin.value()
+        self.file_service.max_workers = self.workers_spin.value()
+        self.file_service.hash_algorithm = self.hash_combo.currentText()
+        self.apply_walk_options()
+        
+        self.set_buttons_enabled(False)
+        self.progress_label.setText("Starting duplicate scan...")
+        
+        self.scan_thread = ScanThread(source, method, self.dup_check.isChecked(), self.file_service)
+        self.scan_thread.progress_signal.connect(self.update_progress)
+        self.scan_thread.finished.connect(self.on_scan_complete)
+        self.scan_thread.start()
+
+    def on_scan_complete(self, duplicates):
+        self.set_buttons_enabled(True)
+        if self.scan_thread.cancelled:
+            self.progress_label.setText("Scan cancelled. Hashes computed so far will be reused on the next scan.")
+            return
+        stats = self.file_service.scan_stats
+        avoided = sum(stats[stage]["bytes_avoided"] for stage in ("size", "partial", "full"))
+        skipped = f" Skipped reading {avoided / (1024 * 1024):.1f} MB." if avoided else ""
+        self.update_cache_label()
+        
+        if not duplicates:
+            QMessageBox.information(self, "Scan Complete", "No duplicate files found!")
+            self.progress_label.setText(f"Scan complete! No duplicates found.{skipped}")
+            return
+        
+        self.duplicates_window = DuplicateWindow(self, self.source_entry.text(), duplicates, self.file_service)
+        self.duplicates_window.show()
+        self.progress_label.setText(f"Scan complete! Found {len(duplicates)} groups of duplicates.{skipped}")
+
+    def preview_changes(self):
+        if not self.validate_inputs(): return
+        
+        if self.preview_window: self.preview_window.close()
+        
+        self.set_buttons_enabled(False)
+        self.progress_label.setText("Building preview...")
+        self.apply_walk_options()
+        
+        self.preview_window = PreviewWindow(self)
+        self.preview_window.show()
+        
+        self.preview_thread = PreviewThread(
+            self.source_entry.text(),
+            self.dest_entry.text(),
+            self.get_active_rules(),
+            self.file_service
+        )
+        self.preview_thread.batch_signal.connect(self.preview_window.add_batch)
+        self.preview_thread.finished.connect(self.on_preview_complete)
+        self.preview_thread.start()
+
+    def on_preview_complete(self):
+        self.set_buttons_enabled(True)
+        window = self.preview_window
+        window.finish(self.preview_thread.cancelled, self.preview_thread.plan)
+        self.progress_label.setText(
+            "Preview cancelled." if self.preview_thread.cancelled
+            else f"Preview ready: {len(window.model.rows)} files to organize."
+        )
+
+    def start_organization(self):
+        if not self.validate_inputs(): return
+        
+        self.set_buttons_enabled(False)
+        self.progress_label.setText("Starting file organization...")
+        self.apply_walk_options()
+        
+        active_rules = self.get_active_rules()
+
+        self.organize_thread = OrganizeThread(
+            self.source_entry.text(),
+            self.dest_entry.text(),
+            active_rules,
+            self.file_service
+        )
+        self.organize_thread.progress_signal.connect(self.update_progress)
+        self.organize_thread.finished.connect(self.on_organization_complete)
+        self.organize_thread.start()
+
+    def apply_saved_plan(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Apply Plan", "", "Organize plan (*.jsonl);;All files (*)")
+        if not path:
+            return
+        try:
+            plan = OrganizePlan.load(path)
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self, "Error", f"Could not read the plan: {e}")
+            return
+        answer = QMessageBox.question(
+            self, "Apply Plan",
+            f"Move {len(plan)} files ({format_size(plan.total_bytes)}) from\n{plan.source}\ninto\n{plan.dest}?"
+        )
+        if answer == QMessageBox.Yes:
+            self.apply_plan(plan)
+
+    def apply_plan(self, plan):
+        self.set_buttons_enabled(False)
+        self.progress_label.setText("Applying plan...")
+        self.apply_walk_options()
+        self.organize_thread = OrganizeThread(plan.source, plan.dest, {}, self.file_service, plan=plan)
+        self.organize_thread.progress_signal.connect(self.update_progress)
+        self.organize_thread.finished.connect(self.on_organization_complete)
+        self.organize_thread.start()
+
+    def on_organization_complete(self):
+        self.set_buttons_enabled(True)
+        stats = self.file_service.move_engine.stats
+        if self.organize_thread.cancelled:
+            self.progress_label.setText(
+                f"Organization cancelled after moving {stats['files']} files. Organize again to resume."
+            )
+            return
+        QMessageBox.information(
+            self, "Complete",
+            f"File organization finished!\n\nMoved {stats['files']} files "
+            f"({stats['bytes'] / (1024 * 1024):.1f} MB) in {stats['seconds']:.1f}s: "
+            f"{stats['files_per_sec']:.0f} files/s, {stats['mb_per_sec']:.1f} MB/s"
+            f"{self.file_service.collision_summary(stats)}."
+            + (f"\n\n{stats['stale']} files changed or disappeared since the plan was made and were left alone."
+               if stats.get("stale") else "")
+        )
+        self.update_file_count(self.source_entry.text())
+
+    def toggle_watch(self, checked):
+        if not checked:
+            if self.is_watching():
+                # Re-enabled by on_watch_finished once the watcher has stopped.
+                self.watch_button.setEnabled(False)
+                self.watch_thread.stop()
+            self.watch_button.setText("👁 Watch Folder")
+            return
+
+        if not self.validate_inputs():
+            self.watch_button.setChecked(False)
+            return
+
+        self.apply_walk_options()
+        self.watch_thread = WatchThread(
+            self.source_entry.text(),
+            self.dest_entry.text(),
+            self.get_active_rules(),
+            self.file_service
+        )
+        self.watch_thread.event_signal.connect(self.progress_label.setText)
+        self.watch_thread.event_signal.connect(self.update_metrics_label)
+        self.watch_thread.finished.connect(self.on_watch_finished)
+        self.watch_thread.start()
+        self.watch_button.setText("⏹ Stop Watching")
+        self.set_buttons_enabled(True)
+
+    def on_watch_finished(self):
+        self.watch_button.setChecked(False)
+        self.set_buttons_enabled(True)
+
+    def is_watching(self):
+        thread = getattr(self, 'watch_thread', None)
+        return thread is not None and thread.isRunning()
+
+    def set_buttons_enabled(self, enabled):
+        # The watcher shares the service's metrics, journal and cancel event, so it
+        # never runs alongside another operation.
+        idle = enabled and not self.is_watching()
+        self.scan_dup_button.setEnabled(idle)
+        self.preview_button.setEnabled(idle)
+        self.organize_button.setEnabled(idle)
+        self.apply_plan_button.setEnabled(idle)
+        self.watch_button.setEnabled(enabled)
+        self.cancel_button.setEnabled(not enabled)
+        window = self.duplicates_window
+        if window is not None and not window.busy:
+            window._set_busy(False)
+        if enabled:
+            # Every operation re-enables the buttons when it ends, so show its final numbers here.
+            self.update_metrics_label()
+            self.export_metrics_button.setEnabled(bool(self.file_service.metrics.operation))
+
+    def cancel_operation(self):
+        self.file_service.cancel()
+        self.cancel_button.setEnabled(False)
+        self.progress_label.setText("Cancelling...")
+
+    def update_progress(self, message, value, maximum):
+        self.progress_label.setText(message)
+        self.progress_bar.setMaximum(maximum)
+        self.progress_bar.setValue(value)
+        self.update_metrics_label()
+
+    def update_metrics_label(self, *_):
+        metrics = self.file_service.metrics
+        if metrics.operation:
+            self.metrics_label.setText(metrics.summary())
+
+    def export_metrics(self):
+        path, _ = QFileDialog.getSaveFileName(
+            self, "Export Metrics", "file_organizer.prom", "Prometheus textfile (*.prom);;JSON (*.json)"
+        )
+        if not path:
+            return
+        try:
+            self.file_service.metrics.write(path)
+        except OSError as e:
+            QMessageBox.critical(self, "Error", f"Could not write metrics: {e}")
+
+    def closeEvent(self, event):
+        # Workers stop at the next file boundary, so in-flight moves are never torn.
+        self.file_service.cancel()
+        if hasattr(self, 'scan_thread') and self.scan_thread.isRunning():
+            self.scan_thread.wait()
+        if hasattr(self, 'organize_thread') and self.organize_thread.isRunning():
+            self.organize_thread.wait()
+        if hasattr(self, 'preview_thread') and self.preview_thread.isRunning():
+            self.preview_thread.wait()
+        if hasattr(self, 'delete_thread') and self.delete_thread.isRunning():
+            self.delete_thread.wait()
+        if hasattr(self, 'link_thread') and self.link_thread.isRunning():
+            self.link_thread.wait()
+        if hasattr(self, 'watch_thread') and self.watch_thread.isRunning():
+            self.watch_thread.stop()
+            self.watch_thread.wait()
+        self.hash_cache.close()
+        event.accept()
+
+
+def run_gui(argv=None):
+    app = QApplication(sys.argv if argv is None else argv)
+    
+    app.setStyle("Fusion") 
+    
+    window = FileOrganizerApp()
+    window.show()
+    
+    return app.exec_()
+
+
+if __name__ == "__main__":
+    sys.exit(run_gui())
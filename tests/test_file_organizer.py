@@ -0,0 +1,427 @@
+import hashlib
+import json
+import os
+import random
+import sys
+
+import pytest
+
+import file_organizer
+from file_organizer import (
+    DEFAULT_FILE_TYPES, FileService, FolderWatcher, HashCache, Inotify, MoveEngine, OperationCancelled,
+    OrganizePlan, ProgressReporter, RunJournal, RunMetrics, group_near_duplicates, main,
+)
+
+
+def write(path, data, mtime=None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return path
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+# Run metrics
+
+def test_prometheus_export_types_counters_and_gauges():
+    metrics = RunMetrics("scan")
+    metrics.count("files_hashed", 3)
+    metrics.count("cache_hits")
+    metrics.count("cache_misses")
+    metrics.add_time("hashing", 0.5)
+    metrics.finish()
+    lines = metrics.to_prometheus().splitlines()
+    types = dict(line.split()[2:4] for line in lines if line.startswith("# TYPE"))
+    helps = {line.split()[2] for line in lines if line.startswith("# HELP")}
+    assert set(types) == helps
+    assert types["file_organizer_files_hashed_total"] == "counter"
+    assert types["file_organizer_phase_seconds_total"] == "counter"
+    assert types["file_organizer_cache_hit_ratio"] == "gauge"
+    assert types["file_organizer_run_duration_seconds"] == "gauge"
+    assert all(name.endswith("_total") for name, kind in types.items() if kind == "counter")
+    assert 'file_organizer_files_hashed_total{operation="scan"} 3' in lines
+
+
+# Hash cache
+
+def test_hash_cache_evicts_down_to_its_entry_limit(tmp_path):
+    cache = HashCache(str(tmp_path / "hashes.sqlite3"), max_entries=3)
+    for i in range(5):
+        path = write(str(tmp_path / f"f{i}"), f"{i}".encode())
+        cache.put(os.stat(path), "full:blake2b", f"digest{i}")
+    cache.flush()
+    assert cache.stats()["entries"] == 3
+    cache.close()
+
+
+def test_cache_command_clears_the_cache(tmp_path, capsys):
+    path = str(tmp_path / "hashes.sqlite3")
+    cache = HashCache(path)
+    cache.put(os.stat(write(str(tmp_path / "a"), b"a")), "full:blake2b", "digest")
+    cache.close()
+    assert main(["cache", "--cache-path", path, "--clear", "--json"]) == 0
+    assert json.loads(capsys.readouterr().out)["entries"] == 0
+
+
+# Hash window (regression: zip() over the window dropped one candidate per stage)
+
+@pytest.mark.parametrize("workers", [1, 2, 3, 8])
+def test_hash_stage_yields_every_item_in_order(tmp_path, workers):
+    service = FileService({}, max_workers=workers)
+    names = []
+    for i in range(workers * 4 + 7):
+        names.append(f"f{i}")
+        write(str(tmp_path / f"f{i}"), f"content {i}".encode())
+    items = [(os.stat(tmp_path / name), name) for name in names]
+    results = list(service._hash_stage(str(tmp_path), items, lambda st: "full", ProgressReporter(None)))
+    assert [item[1] for item, digest, cached in results] == names
+    assert all(digest for item, digest, cached in results)
+
+
+def test_content_scan_finds_the_same_groups_with_any_worker_count(tmp_path):
+    for i in range(40):
+        write(str(tmp_path / f"a{i}.bin"), b"same" * (i % 5 + 1))
+    found = []
+    for workers in (1, 4):
+        service = FileService({}, max_workers=workers)
+        groups = service.find_duplicates(str(tmp_path), "content")
+        found.append(sorted(sorted(files) for files in groups.values()))
+    assert found[0] == found[1]
+    assert sum(len(group) for group in found[0]) == 40
+
+
+
+
+# Hash readers
+
+def test_mapped_and_buffered_reads_give_the_same_digest(tmp_path, monkeypatch):
+    path = write(str(tmp_path / "big.bin"), bytes(range(256)) * 4000)
+    buffered = FileService.calculate_file_hash(path, chunk_size=4096)
+    monkeypatch.setattr(file_organizer, "MMAP_THRESHOLD", 1)
+    assert FileService.calculate_file_hash(path, chunk_size=4096) == buffered
+    assert buffered == hashlib.blake2b(read(path), digest_size=16).hexdigest()
+
+
+def test_file_truncated_while_mapped_is_not_hashed(tmp_path, monkeypatch):
+    path = write(str(tmp_path / "big.bin"), b"x" * 64 * 1024)
+    monkeypatch.setattr(file_organizer, "MMAP_THRESHOLD", 1)
+
+    class Throttle:
+        drop_cache = False
+
+        def acquire(self, nbytes, ops=1):
+            # Runs just before each mapped chunk is read.
+            os.truncate(path, 4096)
+
+    assert FileService.calculate_file_hash(path, chunk_size=8192, throttle=Throttle()) is None
+
+
+# Progress coalescing
+
+def test_progress_reads_the_clock_once_per_batch():
+    messages = []
+    progress = ProgressReporter(lambda message, done, total: messages.append(done), interval=0, min_items=10)
+    progress.start_phase("Scanning...")
+    for _ in range(25):
+        progress.update()
+    assert messages == [0, 10, 20]
+
+
+def test_progress_batches_end_early_on_bytes():
+    messages = []
+    progress = ProgressReporter(lambda message, done, total: messages.append(done), interval=0, min_items=10,
+                                min_bytes=100)
+    progress.start_phase("Hashing...")
+    progress.update(150)
+    assert messages == [0, 1]
+
+
+
+# Perceptual matching
+
+def brute_force_groups(hashes, max_distance):
+    parent = list(range(len(hashes)))
+
+    def root(i):
+        while parent[i] != i:
+            i = parent[i]
+        return i
+
+    for i in range(len(hashes)):
+        for j in range(i + 1, len(hashes)):
+            if bin(hashes[i] ^ hashes[j]).count("1") <= max_distance:
+                a, b = root(i), root(j)
+                parent[max(a, b)] = min(a, b)
+    groups = {}
+    for i in range(len(hashes)):
+        groups.setdefault(root(i), []).append(i)
+    return sorted(members for members in groups.values() if len(members) > 1)
+
+
+@pytest.mark.parametrize("max_distance", [0, 3, 6, 10, 16])
+def test_near_duplicate_groups_match_brute_force(max_distance):
+    pytest.importorskip("numpy")
+    rng = random.Random(max_distance)
+    hashes = []
+    for _ in range(150):
+        base = rng.getrandbits(64)
+        hashes.append(base)
+        for _ in range(2):
+            flipped = base
+            for bit in rng.sample(range(64), rng.randrange(14)):
+                flipped ^= 1 << bit
+            hashes.append(flipped)
+    groups = sorted(sorted(members) for members in group_near_duplicates(hashes, max_distance))
+    assert groups == brute_force_groups(hashes, max_distance)
+
+
+# Collision policies
+
+@pytest.fixture(params=[True, False], ids=["rename", "copy"])
+def engine(request, tmp_path):
+    src_dir, dst_dir = tmp_path / "src", tmp_path / "dst"
+    src_dir.mkdir()
+    dst_dir.mkdir()
+    service = FileService(DEFAULT_FILE_TYPES)
+    engine = service.move_engine
+    engine.max_workers = 1
+    engine.start(str(src_dir), str(dst_dir))
+    # Forcing the copy path exercises cross-device moves on a single filesystem.
+    engine.same_device = request.param
+    yield engine, src_dir, dst_dir
+    engine.finish()
+
+
+def test_identical_file_is_deduplicated(engine):
+    engine, src_dir, dst_dir = engine
+    src = write(str(src_dir / "a.txt"), b"same")
+    dst = write(str(dst_dir / "a.txt"), b"same")
+    assert engine.move(src, dst, 4) == "deduplicated"
+    assert not os.path.exists(src)
+    assert read(dst) == b"same"
+    assert engine.stats["deduplicated"] == 1
+
+
+def test_rename_policy_keeps_both_files(engine):
+    engine, src_dir, dst_dir = engine
+    src = write(str(src_dir / "a.txt"), b"new")
+    dst = write(str(dst_dir / "a.txt"), b"old")
+    assert engine.move(src, dst, 3) in ("renamed", "copied")
+    assert read(dst) == b"old"
+    assert read(str(dst_dir / "a (1).txt")) == b"new"
+
+
+def test_skip_policy_leaves_the_source(engine):
+    engine, src_dir, dst_dir = engine
+    engine.collisions = "skip"
+    src = write(str(src_dir / "a.txt"), b"new")
+    dst = write(str(dst_dir / "a.txt"), b"old")
+    assert engine.move(src, dst, 3) == "skipped"
+    assert read(src) == b"new"
+    assert read(dst) == b"old"
+
+
+@pytest.mark.parametrize("src_mtime,replaced", [(2_000_000_000, True), (1_000_000_000, False)])
+def test_newest_policy_replaces_only_older_destinations(engine, src_mtime, replaced):
+    engine, src_dir, dst_dir = engine
+    engine.collisions = "newest"
+    src = write(str(src_dir / "a.txt"), b"new", mtime=src_mtime)
+    dst = write(str(dst_dir / "a.txt"), b"old", mtime=1_500_000_000)
+    outcome = engine.move(src, dst, 3)
+    assert read(dst) == (b"new" if replaced else b"old")
+    assert os.path.exists(src) is not replaced
+    assert outcome != "skipped" if replaced else outcome == "skipped"
+    assert not os.path.exists(dst + MoveEngine.TMP_SUFFIX)
+
+
+def test_overwrite_policy_replaces_the_destination(engine):
+    engine, src_dir, dst_dir = engine
+    engine.collisions = "overwrite"
+    src = write(str(src_dir / "a.txt"), b"new")
+    dst = write(str(dst_dir / "a.txt"), b"old")
+    assert engine.move(src, dst, 3) in ("renamed", "copied")
+    assert read(dst) == b"new"
+    assert not os.path.exists(src)
+
+
+def test_failed_verification_keeps_the_source(tmp_path, monkeypatch):
+    src = write(str(tmp_path / "src" / "a.txt"), b"new")
+    dst = str(tmp_path / "dst" / "a.txt")
+    os.makedirs(os.path.dirname(dst))
+    engine = MoveEngine(max_workers=1)
+    engine.start(str(tmp_path / "src"), str(tmp_path / "dst"))
+    engine.same_device = False
+    monkeypatch.setattr(engine, "_verify_copy", lambda src, dst, size: False)
+    assert engine.move(src, dst, 3) == "failed"
+    assert engine.finish()["failed"] == 1
+    assert read(src) == b"new"
+    assert not os.path.exists(dst)
+    assert not os.path.exists(dst + MoveEngine.TMP_SUFFIX)
+
+
+# Journal recovery
+
+def test_recover_removes_partial_copies_but_not_existing_destinations(tmp_path):
+    src = write(str(tmp_path / "src" / "a.jpg"), b"source")
+    existing = write(str(tmp_path / "dst" / "a.jpg"), b"user data")
+    tmp = write(existing + MoveEngine.TMP_SUFFIX, b"partial")
+    partial_src = write(str(tmp_path / "src" / "b.jpg"), b"source b")
+    partial = write(str(tmp_path / "dst" / "b.jpg"), b"sour")
+    moved_dst = write(str(tmp_path / "dst" / "c.jpg"), b"done")
+    records = [
+        {"op": "copy", "src": src, "dst": tmp},
+        {"op": "copy", "src": partial_src, "dst": partial},
+        {"op": "copy", "src": str(tmp_path / "src" / "c.jpg"), "dst": moved_dst},
+        {"op": "move", "src": str(tmp_path / "src" / "c.jpg"), "dst": moved_dst},
+    ]
+    assert MoveEngine.recover(records) == 1
+    assert read(existing) == b"user data"
+    assert not os.path.exists(tmp)
+    assert not os.path.exists(partial)
+    assert read(partial_src) == b"source b"
+    assert read(moved_dst) == b"done"
+
+
+def test_replacing_copy_is_journaled_under_its_temporary_name(tmp_path):
+    src = write(str(tmp_path / "src" / "a.txt"), b"new", mtime=2_000_000_000)
+    dst = write(str(tmp_path / "dst" / "a.txt"), b"old", mtime=1_000_000_000)
+
+    class Journal:
+        def __init__(self):
+            self.records = []
+
+        def record(self, **entry):
+            self.records.append(entry)
+
+    journal = Journal()
+    engine = MoveEngine(max_workers=1, collisions="newest")
+    engine.start(str(tmp_path / "src"), str(tmp_path / "dst"), journal)
+    engine.same_device = False
+    assert engine.move(src, dst, 3) == "copied"
+    engine.finish()
+    copies = [record for record in journal.records if record["op"] == "copy"]
+    assert copies == [{"op": "copy", "src": src, "dst": dst + MoveEngine.TMP_SUFFIX}]
+
+
+# Cancellation and resume
+
+def test_cancelled_organize_resumes_from_its_journal(tmp_path):
+    source, dest = tmp_path / "src", tmp_path / "dst"
+    for i in range(6):
+        write(str(source / f"note{i}.txt"), f"note {i}".encode())
+    service = FileService(DEFAULT_FILE_TYPES, max_workers=1)
+    engine = service.move_engine
+    move = engine.move
+    moved = []
+
+    def cancel_after_two(src, dst, size, inline=False):
+        moved.append(src)
+        if len(moved) == 2:
+            service.cancel()
+        return move(src, dst, size, inline)
+
+    engine.move = cancel_after_two
+    with pytest.raises(OperationCancelled):
+        service.organize_files(str(source), str(dest), DEFAULT_FILE_TYPES)
+    journal = RunJournal.for_run("organize", str(source), str(dest))
+    assert os.path.exists(journal.path)
+    assert len(os.listdir(dest / "Documents")) == 2
+
+    engine.move = move
+    service.cancel_event.clear()
+    messages = []
+    service.organize_files(str(source), str(dest), DEFAULT_FILE_TYPES,
+                           lambda message, done, total: messages.append(message))
+    assert "2 already done in an earlier run" in messages[-1]
+    assert sorted(os.listdir(dest / "Documents")) == [f"note{i}.txt" for i in range(6)]
+    assert not os.path.exists(journal.path)
+
+
+# Watch mode
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is Linux only")
+def test_watcher_queues_files_written_before_a_new_directory_is_watched(tmp_path):
+    source, dest = tmp_path / "src", tmp_path / "dst"
+    source.mkdir()
+    service = FileService(DEFAULT_FILE_TYPES)
+    service.max_depth = None
+    watcher = FolderWatcher(service, str(source), str(dest), DEFAULT_FILE_TYPES)
+    watcher._inotify = Inotify()
+    try:
+        watcher._watch_tree(str(source), 0)
+        # Both files exist before the watcher sees the directory events.
+        write(str(source / "new" / "a.txt"), b"a")
+        write(str(source / "new" / "deeper" / "b.jpg"), b"b")
+        watcher._handle_inotify(0.5)
+    finally:
+        watcher._inotify.close()
+    assert sorted(watcher.pending) == [str(source / "new" / "a.txt"), str(source / "new" / "deeper" / "b.jpg")]
+
+
+# Organize plans
+
+@pytest.fixture
+def tree(tmp_path):
+    source = tmp_path / "src"
+    write(str(source / "notes.txt"), b"notes")
+    write(str(source / "sub" / "photo.jpg"), b"jpeg")
+    write(str(source / "unknown.xyz"), b"?")
+    return source, tmp_path / "dst"
+
+
+def plan_for(source, dest):
+    service = FileService(DEFAULT_FILE_TYPES)
+    service.max_depth = None
+    return service, service.build_plan(str(source), str(dest), DEFAULT_FILE_TYPES)
+
+
+def test_plan_round_trips_and_applies(tree, tmp_path):
+    source, dest = tree
+    service, plan = plan_for(source, dest)
+    assert plan.unmatched == 1
+    path = str(tmp_path / "plan.jsonl")
+    plan.save(path)
+    loaded = OrganizePlan.load(path)
+    assert loaded.moves == plan.sorted_moves()
+    assert [directory for directory, moves in loaded.by_directory()] == ["Documents", "Images"]
+
+    assert service.apply_plan(loaded) == 2
+    assert read(str(dest / "Documents" / "notes.txt")) == b"notes"
+    assert read(str(dest / "Images" / "photo.jpg")) == b"jpeg"
+    assert not os.path.exists(source / "notes.txt")
+    assert os.path.exists(source / "unknown.xyz")
+
+
+def test_apply_leaves_files_changed_since_planning(tree):
+    source, dest = tree
+    service, plan = plan_for(source, dest)
+    write(str(source / "notes.txt"), b"edited after review", mtime=1_000_000_000)
+    service.apply_plan(plan)
+    assert service.move_engine.stats["stale"] == 1
+    assert read(str(source / "notes.txt")) == b"edited after review"
+    assert os.path.exists(dest / "Images" / "photo.jpg")
+
+
+def test_apply_moves_symlinked_files(tree, tmp_path):
+    source, dest = tree
+    target = write(str(tmp_path / "elsewhere" / "real.jpg"), b"target")
+    os.symlink(target, str(source / "link.jpg"))
+    service, plan = plan_for(source, dest)
+    service.apply_plan(plan)
+    assert service.move_engine.stats["stale"] == 0
+    assert os.path.islink(dest / "Images" / "link.jpg")
+
+
+def test_plan_entries_outside_the_roots_are_rejected(tmp_path):
+    plan = OrganizePlan(str(tmp_path / "src"), str(tmp_path / "dst"))
+    plan.add("a.txt", os.path.join(os.pardir, "escape.txt"), 1, 0)
+    path = str(tmp_path / "plan.jsonl")
+    plan.save(path)
+    with pytest.raises(ValueError):
+        OrganizePlan.load(path)